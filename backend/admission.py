@@ -0,0 +1,200 @@
+import math
+import threading
+from collections import deque
+from datetime import datetime
+from time import monotonic
+
+from flask import g, request
+
+from utils import APIError, utc_now
+
+QUEUE_TIME_SAMPLES = 1000  # recent queue times kept per class for the percentiles
+
+def classify_by_method():
+    """Default request class: reads for GET/HEAD, writes for everything else"""
+    return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+class EndTimes:
+    """In-process map of auction end times, for classing bids by how soon the auction closes
+
+    A miss costs one `lookup(auction_id)`, which returns the end time or
+    None. Entries are reused for `ttl` seconds, so soft-close extensions made
+    by other workers show up within that time; `extended()` applies those
+    made in this process at once. At most `max_entries` auctions are kept,
+    the oldest lookups are dropped first.
+    """
+    def __init__(self, lookup, ttl=10, max_entries=10000):
+        self.lookup = lookup
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # auction id -> (end_time, monotonic expiry)
+        self._lock = threading.Lock()
+
+    def get(self, auction_id):
+        key = str(auction_id)
+        entry = self._entries.get(key)
+        now = monotonic()
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        end_time = self.lookup(key)
+        with self._lock:
+            self._entries.pop(key, None)
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key] = (end_time, now + self.ttl)
+        return end_time
+
+    def closes_within(self, auction_id, seconds):
+        """True if the auction is still open and ends in at most `seconds`"""
+        end_time = self.get(auction_id)
+        if not isinstance(end_time, datetime):  # unknown auction or legacy string end time
+            return False
+        return 0 < (end_time - utc_now(end_time)).total_seconds() <= seconds
+
+    def extended(self, auction_id, end_time):
+        """Deadline listener: a soft-close extension made in this process"""
+        key = str(auction_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and isinstance(entry[0], datetime) and end_time > entry[0]:
+                self._entries[key] = (end_time, entry[1])
+
+    def __len__(self):
+        return len(self._entries)
+
+class _Ticket:
+    __slots__ = ('admitted', 'enqueued')
+
+    def __init__(self):
+        self.admitted = False
+        self.enqueued = monotonic()
+
+class _RequestClass:
+    """Queue, limits and counters of one priority class"""
+    def __init__(self, name, priority, limit, shed_after=None):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.shed_after = shed_after
+        self.active = 0
+        self.waiting = deque()
+        self.admitted = 0
+        self.shed = 0
+        self.queue_times = deque(maxlen=QUEUE_TIME_SAMPLES)
+
+    def stats(self):
+        times = sorted(self.queue_times)
+        def percentile(p):
+            return round(times[min(len(times) - 1, int(len(times) * p))] * 1000, 3) if times else 0
+        return {
+            'active': self.active,
+            'waiting': len(self.waiting),
+            'limit': self.limit,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'queue_ms': {'p50': percentile(0.5), 'p99': percentile(0.99), 'max': percentile(1)}
+        }
+
+class AdmissionControl:
+    """Priority admission for requests, configured through ADMISSION_CLASSES
+
+    Every request is put in a class by `classify()`. A class runs at most
+    `limit` requests at once and all classes together at most
+    ADMISSION_MAX_ACTIVE. When a slot frees up, the waiting request of the
+    class with the lowest `priority` number goes first. A request that has
+    queued for `shed_after` seconds is refused with 503 and Retry-After, so
+    overload sheds low-priority traffic instead of delaying everything.
+    Limits apply per worker process.
+    """
+    def __init__(self, app=None, classify=None):
+        self.classify = classify or classify_by_method
+        self._cond = threading.Condition()
+        self._classes = None
+        self._active = 0
+        if app is not None:
+            self.init_app(app, classify)
+
+    def init_app(self, app, classify=None):
+        self.app = app
+        if classify is not None:
+            self.classify = classify
+        app.before_request(self.admit)
+        app.teardown_request(self.release_request)
+
+    def _configure(self):
+        if self._classes is None:
+            self._classes = {
+                name: _RequestClass(name, **options)
+                for name, options in self.app.config['ADMISSION_CLASSES'].items()
+            }
+        return self._classes
+
+    def _can_run(self, request_class):
+        return self._active < self.app.config['ADMISSION_MAX_ACTIVE'] and request_class.active < request_class.limit
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests, most urgent class first"""
+        admitted = False
+        for request_class in sorted(self._classes.values(), key=lambda c: c.priority):
+            while request_class.waiting and self._can_run(request_class):
+                ticket = request_class.waiting.popleft()
+                ticket.admitted = True
+                self._start(request_class, ticket)
+                admitted = True
+        if admitted:
+            self._cond.notify_all()
+
+    def _start(self, request_class, ticket):
+        self._active += 1
+        request_class.active += 1
+        request_class.admitted += 1
+        request_class.queue_times.append(monotonic() - ticket.enqueued)
+
+    def acquire(self, name):
+        """Block until a request of class `name` may run; raises 503 if it waited too long"""
+        with self._cond:
+            request_class = self._configure()[name]
+            ticket = _Ticket()
+            # Queue up and let _dispatch decide, so a free slot still goes to
+            # more urgent requests already waiting for it
+            request_class.waiting.append(ticket)
+            self._dispatch()
+            deadline = None if request_class.shed_after is None else ticket.enqueued + request_class.shed_after
+            while not ticket.admitted:
+                timeout = None if deadline is None else deadline - monotonic()
+                if timeout is not None and timeout <= 0:
+                    request_class.waiting.remove(ticket)
+                    request_class.shed += 1
+                    raise APIError('Server is busy, please retry', 503, {
+                        'Retry-After': str(max(1, math.ceil(request_class.shed_after)))
+                    })
+                self._cond.wait(timeout)
+
+    def release(self, name):
+        with self._cond:
+            request_class = self._classes[name]
+            request_class.active -= 1
+            self._active -= 1
+            self._dispatch()
+
+    def admit(self):
+        """before_request hook: wait for a slot in the request's class"""
+        if not self.app.config.get('ADMISSION_ENABLED', True):
+            return
+        if request.method == 'OPTIONS' or request.endpoint in self.app.config['ADMISSION_EXEMPT']:
+            return
+        name = self.classify()
+        self.acquire(name)
+        g.admission_class = name
+
+    def release_request(self, exc=None):
+        name = g.pop('admission_class', None)
+        if name is not None:
+            self.release(name)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active': self._active,
+                'classes': {name: c.stats() for name, c in self._configure().items()}
+            }
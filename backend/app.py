@@ -1,18 +1,41 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, redirect, request, jsonify, send_file, stream_with_context, url_for
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from pymongo import MongoClient
 from bson import ObjectId
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+import atexit
+import base64
+import binascii
+import io
+import re
 import os
 import bcrypt
+import click
 
+from config import get_config
 from models import User, Auction, Bid
+from admission import AdmissionControl, EndTimes, classify_by_method
+from ratelimit import RateLimiter, MemoryBucketStore, MongoBucketStore
+from export import EXPORT_FORMATS, export_lines, export_to_file
+from importer import import_auctions, iter_import_file
+from idempotency import Idempotency
+from compression import Compress
+from bidbook import BidBook
+from events import create_event_bus
+from summaries import AuctionSummaries, rebuild_summaries
+from counters import Counters, COUNTER_FIELDS
+from history import record_bids, get_history, backfill_history, parse_resolution
+from sync import next_update_seq, current_cursor, record_tombstone, sync_changes
+from uploads import parse_auction_upload, store_image, stored_image_path
+import storage
 from utils import (
-    APIError, handle_api_error, serialize_mongo_doc,
+    APIError, handle_api_error, serialize_mongo_doc, parse_time_range, parse_compact_args,
     validate_auction_data, validate_bid_data, validate_user_data,
-    find_user_by_email, find_auction_by_id, get_user_auctions, get_user_bids
+    find_user_by_email, find_auction_by_id, get_user_auctions, get_user_bids, is_admin,
+    soft_close_deadline, utc_now, parse_user_id, SingleFlight, single_flight_stats,
+    user_auctions_flight, user_bids_flight,
+    watchlist_collection, add_to_watchlist, remove_from_watchlist, get_user_watchlist
 )
 
 # Load environment variables
@@ -20,7 +43,8 @@ load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app)
+app.config.from_object(get_config())
+CORS(app, expose_headers=['X-Sync-Cursor'])
 
 # Configure maximum request size (16MB)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
@@ -31,13 +55,116 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)  # Increase token ex
 app.config['JWT_ERROR_MESSAGE_KEY'] = 'msg'  # Make sure error messages use 'msg' key
 jwt = JWTManager(app)
 
-# Connect to MongoDB
-client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
-db = client.auction_system
+# Connect to MongoDB (or an in-process database with STORAGE_BACKEND=memory)
+app.config['MONGODB_URI'] = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', app.config['STORAGE_BACKEND'])
+db = storage.connect(app.config)
 
 # Register error handler
 app.register_error_handler(APIError, handle_api_error)
 
+# Admission control (classes and limits are configured in config.py). Registered
+# before the other request hooks so queued requests do no work until admitted
+def find_end_time(auction_id):
+    try:
+        auction = db.auctions.find_one({'_id': ObjectId(auction_id)}, {'end_time': 1})
+    except Exception:
+        return None
+    return auction and auction.get('end_time')
+
+# Whether a bid is urgent does not depend on which worker holds the auction's
+# bid book (or on there being one: it is off with several workers)
+end_times = EndTimes(find_end_time)
+
+def admission_class():
+    """Bids on auctions in their closing window first, then other writes, then reads"""
+    if request.endpoint == 'place_bid':
+        book = bid_book.get(request.view_args['id'])
+        if book is not None:
+            if not book.has_ended():
+                return 'urgent'
+        elif end_times.closes_within(request.view_args['id'], app.config['BIDBOOK_WINDOW']):
+            return 'urgent'
+    return classify_by_method()
+
+admission = AdmissionControl(app, admission_class)
+
+# Rate limiting (limits per route are configured in config.py)
+if app.config['RATE_LIMIT_STORE'] == 'mongo':
+    rate_limiter = RateLimiter(app, MongoBucketStore(db.rate_limits))
+else:
+    rate_limiter = RateLimiter(app, MemoryBucketStore())
+
+# Idempotency-Key support for auction creation and bids
+idempotent = Idempotency(app, lambda: db)
+
+# gzip/brotli response compression
+compress = Compress(app)
+
+# In-memory bid book for auctions close to their end time
+bid_book = BidBook(app, lambda: db)
+atexit.register(bid_book.stop)
+
+# Materialized listing view (auction_summaries)
+summaries = AuctionSummaries(app, lambda: db)
+bid_book.flush_listeners.append(lambda batch: summaries.changed(list(batch)))
+
+# Bid history rollups for price charts
+def record_flushed_bids(batch):
+    record_bids(db, {
+        auction_id: [bid.to_dict() for _, bid, _ in entries] for auction_id, entries in batch.items()
+    }, app.config['HISTORY_RESOLUTIONS'])
+
+bid_book.flush_listeners.append(record_flushed_bids)
+bid_book.deadline_listeners.append(end_times.extended)
+atexit.register(summaries.stop)
+
+# View and watcher counts, written to MongoDB in batches
+counters = Counters(app, lambda: db)
+counters.flush_listeners.append(summaries.counted)
+atexit.register(counters.stop)
+
+# Concurrent GET /api/auctions/<id> for the same auction share one fetch and body
+auction_reads = SingleFlight('get_auction')
+
+def forget_auction_read(payload):
+    if payload['auction_id']:
+        auction_reads.forget(payload['auction_id'])
+
+def forget_bidder_reads(payload):
+    user_bids_flight.forget_scope(payload['user_id'])
+
+def forget_seller_reads(payload):
+    user_auctions_flight.forget_scope(payload['seller_id'])
+
+# Event bus shared with the other worker processes (see serve.py)
+event_bus = create_event_bus(app.config['EVENT_BUS'], lambda: db)
+event_bus.subscribe('bid', forget_auction_read)
+event_bus.subscribe('bid', forget_bidder_reads)
+event_bus.subscribe('auction.changed', forget_auction_read)
+event_bus.subscribe('auction.changed', forget_seller_reads)
+event_bus.start()
+atexit.register(event_bus.stop)
+
+def publish_bid(auction_id, bid, end_time=None):
+    """Tell every worker about an accepted bid (and any soft-close extension)"""
+    event_bus.publish('bid', {
+        'auction_id': str(auction_id),
+        'user_id': str(bid.user_id),
+        'current_bid': bid.amount,
+        'end_time': end_time.isoformat() if end_time else None
+    })
+
+def publish_auction_changed(auction_id, seller_id):
+    """Tell every worker to drop anything cached for this auction and its seller
+
+    `auction_id` is None when only the seller's listing changed (bulk import).
+    """
+    event_bus.publish('auction.changed', {
+        'auction_id': str(auction_id) if auction_id else None,
+        'seller_id': str(seller_id)
+    })
+
 # User Routes
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -93,21 +220,142 @@ def login():
         raise APIError(str(e), 500)
 
 # Auction Routes
+def delta_response(collection, query, projection, epoch, tombstone_query=None):
+    """Changes after the client's `since` cursor, see sync.sync_changes"""
+    return jsonify(sync_changes(
+        db, collection, query, request.args['since'], app.config,
+        projection=projection, epoch=epoch, tombstone_query=tombstone_query
+    ))
+
+def with_sync_cursor(response):
+    """Attach the cursor a client passes as `since` on its next poll"""
+    response.headers['X-Sync-Cursor'] = current_cursor(app.config['SYNC_SETTLE'])
+    return response
+
 @app.route('/api/auctions', methods=['GET'])
 def get_auctions():
     try:
-        auctions = list(db.auctions.find())
-        return jsonify(serialize_mongo_doc(auctions))
+        projection, epoch = parse_compact_args(request.args)
+        query = {}
+        if request.args.get('category'):
+            query['category'] = request.args.get('category', type=int)
+            if query['category'] is None:
+                raise APIError("Category must be a valid number", 422)
+        if request.args.get('q'):
+            query['title'] = {'$regex': re.escape(request.args['q']), '$options': 'i'}
+        order = [('_id', 1)]
+        if request.args.get('sort') == 'ending':
+            # Open auctions closing first; extensions made by hot bids reach
+            # the summaries with the bid book's next flush
+            query['end_time'] = {'$gt': datetime.utcnow()}
+            order = [('end_time', 1), ('_id', 1)]
+        elif request.args.get('sort'):
+            # Most popular first
+            field = {'views': 'view_count', 'watchers': 'watcher_count'}.get(request.args['sort'])
+            if field is None:
+                raise APIError("sort must be 'views', 'watchers' or 'ending'", 422)
+            order = [(field, -1), ('_id', 1)]
+        if 'since' in request.args:
+            return delta_response(summaries.collection(), query, projection, epoch, tombstone_query={})
+        auctions = [counters.overlay(auction) for auction in summaries.collection().find(query, projection).sort(order)]
+        return with_sync_cursor(jsonify(serialize_mongo_doc(auctions, epoch)))
+    except APIError as e:
+        raise e
     except Exception as e:
         raise APIError(str(e), 500)
 
+def _auction_body(id):
+    auction = find_auction_by_id(db, id)
+    if not auction:
+        raise APIError('Auction not found', 404)
+    if bid_book.enabled:
+        auction = bid_book.overlay(auction)
+    for field in COUNTER_FIELDS:
+        auction.setdefault(field, 0)
+    auction = counters.overlay(auction)
+    return jsonify(serialize_mongo_doc(auction)).get_data()
+
 @app.route('/api/auctions/<id>', methods=['GET'])
 def get_auction(id):
     try:
-        auction = find_auction_by_id(db, id)
-        if not auction:
-            raise APIError('Auction not found', 404)
-        return jsonify(serialize_mongo_doc(auction))
+        body = auction_reads.do(id, _auction_body, id)
+        counters.incr(ObjectId(id), 'view_count')
+        return Response(body, mimetype='application/json')
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
+@app.route('/api/auctions/<id>/image', methods=['GET'])
+def get_auction_image(id):
+    try:
+        if not ObjectId.is_valid(id):
+            raise APIError("Invalid auction ID", 404)
+        auction = db.auctions.find_one({'_id': ObjectId(id)}, {'image_url': 1, 'image': 1})
+        if not auction or not auction.get('image_url'):
+            raise APIError('Image not found', 404)
+        if auction.get('image'):
+            return send_uploaded_image(auction['image']['name'])
+        image_url = auction['image_url']
+        if image_url.startswith(('http://', 'https://')):
+            # Hosted elsewhere: send the client there
+            return redirect(image_url)
+        if not image_url.startswith('data:'):
+            raise APIError('Image not found', 404)
+        # Inline images are stored as data:image/...;base64 URLs
+        header, _, encoded = image_url.partition(',')
+        mimetype = header[len('data:'):].split(';')[0] or 'application/octet-stream'
+        try:
+            image = base64.b64decode(encoded)
+        except (binascii.Error, ValueError):
+            raise APIError('Stored image is not valid base64', 500)
+        response = Response(image, mimetype=mimetype)
+        response.cache_control.public = True
+        response.cache_control.max_age = 60 * 60
+        response.add_etag()
+        return response.make_conditional(request)
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
+def send_uploaded_image(name):
+    path = stored_image_path(app.config['UPLOAD_DIR'], name)
+    if path is None or not os.path.isfile(path):
+        raise APIError('Image not found', 404)
+    # Stored images are named by their content hash, so they never change
+    response = send_file(
+        os.path.abspath(path), etag=name.partition('.')[0], max_age=365 * 24 * 60 * 60
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/api/images/<name>', methods=['GET'])
+def get_uploaded_image(name):
+    try:
+        return send_uploaded_image(name)
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
+@app.route('/api/auctions/<id>/history', methods=['GET'])
+def get_auction_history(id):
+    try:
+        if not ObjectId.is_valid(id):
+            raise APIError("Invalid auction ID", 404)
+        resolution = parse_resolution(request.args.get('resolution', '1h'))
+        since, until = parse_time_range(request.args)
+        _, epoch = parse_compact_args(request.args)
+        buckets = get_history(
+            db, ObjectId(id), resolution, app.config['HISTORY_RESOLUTIONS'], since, until
+        )
+        return jsonify({
+            'auction_id': id,
+            'resolution': resolution,
+            'buckets': serialize_mongo_doc(buckets, epoch)
+        })
     except APIError as e:
         raise e
     except Exception as e:
@@ -115,6 +363,8 @@ def get_auction(id):
 
 @app.route('/api/auctions', methods=['POST'])
 @jwt_required()
+@rate_limiter.per_user
+@idempotent
 def create_auction():
     try:
         # First check if we have a valid Authorization header
@@ -123,13 +373,27 @@ def create_auction():
             print("Missing or invalid Authorization header")
             raise APIError("Missing or invalid authorization", 401)
             
-        data = request.get_json()
+        spool = None
+        if request.mimetype == 'multipart/form-data':
+            # Metadata arrives as a small JSON part; the image is streamed to disk
+            data, spool = parse_auction_upload(request.environ, app.config)
+        else:
+            data = request.get_json()
         # Detailed logging for debugging
         print("Received auction data:")
         for k, v in data.items():
             print(f"{k}: {v}")
         
-        validate_auction_data(data)
+        image = None
+        try:
+            fields = validate_auction_data(data)
+            if spool is not None:
+                image = store_image(spool, app.config['UPLOAD_DIR'])
+                fields['image_url'] = url_for('get_uploaded_image', name=image['name'], _external=True)
+        except BaseException:
+            if spool is not None:
+                spool.discard()
+            raise
         
         try:
             user_id = get_jwt_identity()
@@ -145,17 +409,10 @@ def create_auction():
             if not ObjectId.is_valid(user_id):
                 raise APIError("Invalid user ID format", 422)
                 
-            # Create auction with base data first
-            auction = Auction(
-                data['title'],
-                data['description'],
-                float(data['startingPrice']),
-                float(data['minimumIncrement']),
-                datetime.fromisoformat(data['endTime'].replace('Z', '+00:00')),
-                user_id,
-                data.get('imageUrl'),  # Image URL (can be None)
-                data.get('category', 1)  # Default to category 1 if not provided
-            )
+            # Fields were parsed once by validate_auction_data
+            auction = Auction(seller_id=user_id, **fields)
+        except APIError as e:
+            raise e
         except (TypeError, ValueError) as e:
             print(f"Error creating auction object: {str(e)}")
             print(f"Received data: {data}")
@@ -167,8 +424,14 @@ def create_auction():
             print(f"User ID: {user_id}")
             raise APIError(f"Error creating auction: {str(e)}", 500)
         
-        result = db.auctions.insert_one(auction.to_dict())
-        created_auction = find_auction_by_id(db, result.inserted_id)
+        # insert_one sets _id on the document, so it can be returned without a re-read
+        created_auction = auction.to_dict()
+        if image is not None:
+            created_auction['image'] = image
+        created_auction['update_seq'] = next_update_seq()
+        db.auctions.insert_one(created_auction)
+        summaries.created([created_auction])
+        publish_auction_changed(created_auction['_id'], user_id)
         return jsonify(serialize_mongo_doc(created_auction)), 201
         
     except APIError as e:
@@ -176,6 +439,33 @@ def create_auction():
     except Exception as e:
         raise APIError(str(e), 500)
 
+@app.route('/api/auctions/bulk', methods=['POST'])
+@jwt_required()
+@idempotent
+def bulk_create_auctions():
+    try:
+        user_id = get_jwt_identity()
+        if request.mimetype == 'application/x-ndjson':
+            rows = iter_import_file(io.TextIOWrapper(request.stream, encoding='utf-8'))
+        else:
+            rows = request.get_json()
+            if not isinstance(rows, list):
+                raise APIError("Expected a JSON array of auctions", 400)
+
+        result = import_auctions(
+            db, rows, user_id,
+            batch_size=app.config['IMPORT_BATCH_SIZE'],
+            sync_summaries=summaries.sync_on_write
+        )
+        if result['inserted']:
+            publish_auction_changed(None, user_id)
+        return jsonify(result), 201 if result['inserted'] else 400
+
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
 @app.route('/api/auctions/<id>', methods=['PUT'])
 @jwt_required()
 def update_auction(id):
@@ -196,15 +486,20 @@ def update_auction(id):
             'title': data.get('title', auction['title']),
             'description': data.get('description', auction['description']),
             'minimum_increment': float(data.get('minimumIncrement', auction['minimum_increment'])),
-            'image_url': data.get('imageUrl', auction['image_url'])
+            'image_url': data.get('imageUrl', auction['image_url']),
+            'update_seq': next_update_seq()
         }
         
+        update = {'$set': update_fields}
+        if auction.get('image') and update_fields['image_url'] != auction['image_url']:
+            # A replaced image is no longer the uploaded file
+            update['$unset'] = {'image': ''}
+        
         # Update the auction
-        db.auctions.update_one(
-            {'_id': auction['_id']},
-            {'$set': update_fields}
-        )
+        db.auctions.update_one({'_id': auction['_id']}, update)
         
+        summaries.changed([auction['_id']])
+        publish_auction_changed(auction['_id'], auction['seller_id'])
         return jsonify({'message': 'Auction updated successfully'}), 200
         
     except APIError as e:
@@ -214,36 +509,122 @@ def update_auction(id):
     except Exception as e:
         raise APIError(str(e), 500)
 
+@app.route('/api/auctions/<id>', methods=['DELETE'])
+@jwt_required()
+def delete_auction(id):
+    try:
+        user_id = get_jwt_identity()
+        auction = find_auction_by_id(db, id)
+        if not auction:
+            raise APIError('Auction not found', 404)
+        if str(auction['seller_id']) != str(user_id):
+            raise APIError('Not authorized to delete this auction', 403)
+        if auction.get('bids') or bid_book.get(auction['_id']):
+            raise APIError('Cannot delete an auction that has bids', 400)
+
+        # Only delete if no bid slipped in since the read above
+        result = db.auctions.delete_one({'_id': auction['_id'], 'bids.0': {'$exists': False}})
+        if not result.deleted_count:
+            raise APIError('Cannot delete an auction that has bids', 400)
+        record_tombstone(db, auction, app.config['SYNC_TOMBSTONE_TTL'])
+        watchlist_collection(db).delete_many({'auction_id': auction['_id']})
+        summaries.changed([auction['_id']])
+        publish_auction_changed(auction['_id'], auction['seller_id'])
+        return jsonify({'message': 'Auction deleted successfully'}), 200
+
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
+@app.route('/api/auctions/<id>/watch', methods=['POST', 'DELETE'])
+@jwt_required()
+def watch_auction(id):
+    try:
+        user_id = parse_user_id(get_jwt_identity())
+        if not ObjectId.is_valid(id):
+            raise APIError("Invalid auction ID", 404)
+        auction = db.auctions.find_one({'_id': ObjectId(id)}, {'_id': 1})
+        if not auction:
+            raise APIError('Auction not found', 404)
+        if request.method == 'POST':
+            watching = True
+            if add_to_watchlist(db, user_id, auction['_id']):
+                counters.incr(auction['_id'], 'watcher_count')
+        else:
+            watching = False
+            if remove_from_watchlist(db, user_id, auction['_id']):
+                counters.incr(auction['_id'], 'watcher_count', -1)
+        return jsonify({'auction_id': id, 'watching': watching})
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
 @app.route('/api/auctions/<id>/bid', methods=['POST'])
 @jwt_required()
+@rate_limiter.per_user
+@idempotent
 def place_bid(id):
     try:
         data = request.get_json()
         user_id = get_jwt_identity()
         
-        auction = find_auction_by_id(db, id)
-        if not auction:
-            raise APIError('Auction not found', 404)
+        # Auctions in their final minutes are served from memory
+        book = bid_book.get(id) if bid_book.enabled else None
+        if book is None:
+            auction = find_auction_by_id(db, id)
+            if not auction:
+                raise APIError('Auction not found', 404)
+            if bid_book.enabled and bid_book.is_hot(auction):
+                book = bid_book.promote(auction)
+        
+        if book is not None:
+            bid = bid_book.place(book, user_id, data)
+            publish_bid(book.auction_id, bid, book.end_time)
+            return jsonify({'message': 'Bid placed successfully'}), 200
             
         auction_end_time = auction['end_time']
         if isinstance(auction_end_time, str):
             auction_end_time = datetime.fromisoformat(auction_end_time.replace('Z', '+00:00'))
-        current_time = datetime.now(auction_end_time.tzinfo)
+        current_time = utc_now(auction_end_time)
         
         if auction_end_time < current_time:
             raise APIError('Auction has ended', 400)
             
-        validate_bid_data(data, auction['current_bid'])
-        
-        bid = Bid(user_id, data['amount'])
+        amount = validate_bid_data(data, auction['current_bid'])
         
-        db.auctions.update_one(
-            {'_id': auction['_id']},
-            {
-                '$push': {'bids': bid.to_dict()},
-                '$set': {'current_bid': bid.amount}
-            }
+        bid = Bid(user_id, amount)
+        update_seq = next_update_seq()
+        update = {
+            '$push': {'bids': bid.to_dict()},
+            '$set': {'current_bid': bid.amount, 'update_seq': update_seq}
+        }
+        new_end_time = soft_close_deadline(
+            auction_end_time, current_time,
+            app.config['SOFT_CLOSE_WINDOW'], app.config['SOFT_CLOSE_EXTENSION']
         )
+        if new_end_time:
+            update['$max'] = {'end_time': new_end_time}
+        
+        # Apply the bid only if it still beats current_bid and the auction is
+        # still open, so concurrent bids and the soft-close extension stay atomic
+        query = {'_id': auction['_id'], 'current_bid': {'$not': {'$gte': bid.amount}}}
+        if isinstance(auction['end_time'], datetime):
+            query['end_time'] = {'$gte': current_time}
+        result = db.auctions.update_one(query, update)
+        
+        if not result.matched_count:
+            auction = find_auction_by_id(db, id)
+            end_time = auction['end_time']
+            if isinstance(end_time, datetime) and end_time < utc_now(end_time):
+                raise APIError('Auction has ended', 400)
+            raise APIError(f"Bid must be higher than current bid (${auction['current_bid']})")
+        if new_end_time:
+            bid_book.deadline_extended(auction['_id'], new_end_time)
+        summaries.bid_placed(auction['_id'], bid.amount, update_seq, new_end_time)
+        record_bids(db, {auction['_id']: [bid.to_dict()]}, app.config['HISTORY_RESOLUTIONS'])
+        publish_bid(auction['_id'], bid, new_end_time)
         
         return jsonify({'message': 'Bid placed successfully'}), 200
         
@@ -256,8 +637,15 @@ def place_bid(id):
 @jwt_required()
 def get_user_auctions_route(id):
     try:
-        auctions = get_user_auctions(db, id)
-        return jsonify(auctions)
+        projection, epoch = parse_compact_args(request.args)
+        if 'since' in request.args:
+            seller_id = parse_user_id(id)
+            return delta_response(
+                summaries.collection(), {'seller_id': seller_id}, projection, epoch,
+                tombstone_query={'seller_id': seller_id}
+            )
+        auctions = get_user_auctions(db, id, projection, epoch)
+        return with_sync_cursor(jsonify(auctions))
     except APIError as e:
         raise e
     except Exception as e:
@@ -267,12 +655,123 @@ def get_user_auctions_route(id):
 @jwt_required()
 def get_user_bids_route(id):
     try:
-        bids = get_user_bids(db, id)
-        return jsonify(bids)
+        projection, epoch = parse_compact_args(request.args)
+        if 'since' in request.args:
+            # Auctions with bids cannot be deleted, so there are no tombstones here
+            return delta_response(db.auctions, {'bids.user_id': parse_user_id(id)}, projection, epoch)
+        bids = get_user_bids(db, id, projection, epoch)
+        return with_sync_cursor(jsonify(bids))
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
+@app.route('/api/users/<id>/watchlist', methods=['GET'])
+@jwt_required()
+def get_user_watchlist_route(id):
+    try:
+        if id != get_jwt_identity():
+            raise APIError('Not authorized to view this watchlist', 403)
+        projection, epoch = parse_compact_args(request.args)
+        return jsonify(get_user_watchlist(db, parse_user_id(id), projection, epoch))
     except APIError as e:
         raise e
     except Exception as e:
         raise APIError(str(e), 500)
 
+def require_admin():
+    """Operator endpoints are limited to users with role 'admin' (see `flask set-role`)"""
+    if not is_admin(db, get_jwt_identity()):
+        raise APIError('Admin access required', 403)
+
+@app.route('/api/metrics', methods=['GET'])
+@jwt_required()
+def metrics():
+    # Queue depths and read patterns are operational detail, not for clients
+    require_admin()
+    return jsonify({'single_flight': single_flight_stats(), 'admission': admission.stats()})
+
+# Export Routes
+@app.route('/api/export/<kind>', methods=['GET'])
+@jwt_required()
+def export_route(kind):
+    try:
+        # Exports contain every auction and bid, including bidder ids
+        require_admin()
+        fmt = request.args.get('format', 'ndjson')
+        since, until = parse_time_range(request.args)
+        batch_size = request.args.get('batch_size', app.config['EXPORT_BATCH_SIZE'], type=int)
+        lines = export_lines(
+            db, kind, fmt, since, until,
+            after=request.args.get('after'),
+            batch_size=max(1, batch_size)
+        )
+        return Response(
+            stream_with_context(line for _, line in lines),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'}
+        )
+    except APIError as e:
+        raise e
+    except Exception as e:
+        raise APIError(str(e), 500)
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(['auctions', 'bids']))
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson')
+@click.option('--since', help='ISO timestamp, inclusive')
+@click.option('--until', help='ISO timestamp, exclusive')
+@click.option('--batch-size', default=None, type=int)
+@click.option('--checkpoint', 'checkpoint_path', help='Checkpoint file used to resume an interrupted export')
+def export_command(kind, path, fmt, since, until, batch_size, checkpoint_path):
+    """Export auctions or bids to PATH as NDJSON or CSV"""
+    since, until = parse_time_range({'since': since, 'until': until})
+    count = export_to_file(
+        db, kind, fmt, path, since, until,
+        batch_size=batch_size or app.config['EXPORT_BATCH_SIZE'],
+        checkpoint_path=checkpoint_path
+    )
+    click.echo(f"Exported {count} {kind} to {path}")
+
+@app.cli.command('import-auctions')
+@click.argument('path', type=click.File('r'))
+@click.option('--seller-id', required=True, help='User ID that will own the imported auctions')
+@click.option('--batch-size', default=None, type=int)
+def import_auctions_command(path, seller_id, batch_size):
+    """Bulk import auctions from a JSON array or NDJSON file"""
+    result = import_auctions(
+        db, iter_import_file(path), seller_id,
+        batch_size=batch_size or app.config['IMPORT_BATCH_SIZE'],
+        sync_summaries=summaries.sync_on_write
+    )
+    for error in result['errors']:
+        click.echo(f"Row {error['row']}: {error['error']}", err=True)
+    click.echo(f"Imported {result['inserted']} auctions, {len(result['errors'])} rows failed")
+
+@app.cli.command('set-role')
+@click.argument('email')
+@click.argument('role', type=click.Choice(['admin', 'user']))
+def set_role_command(email, role):
+    """Grant a user the admin role, or take it away with 'user'"""
+    update = {'$set': {'role': 'admin'}} if role == 'admin' else {'$unset': {'role': ''}}
+    if not db.users.update_one({'email': email}, update).matched_count:
+        raise click.ClickException(f"No user with email {email}")
+    click.echo(f"{email} is now {role}")
+
+@app.cli.command('rebuild-summaries')
+@click.option('--batch-size', default=1000, type=int)
+def rebuild_summaries_command(batch_size):
+    """Rebuild the auction_summaries listing view from the auctions collection"""
+    count = rebuild_summaries(db, batch_size=batch_size, settle=app.config['SYNC_SETTLE'])
+    click.echo(f"Rebuilt {count} auction summaries")
+
+@app.cli.command('backfill-history')
+@click.option('--batch-size', default=500, type=int)
+def backfill_history_command(batch_size):
+    """Recompute bid history buckets from the bids embedded in auctions"""
+    count = backfill_history(db, app.config['HISTORY_RESOLUTIONS'], batch_size=batch_size)
+    click.echo(f"Backfilled bid history for {count} auctions")
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
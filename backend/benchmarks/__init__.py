@@ -0,0 +1,2 @@
+# Micro-benchmarks for hot paths. Run from backend/, e.g.:
+#     python -m benchmarks.bench_ratelimit
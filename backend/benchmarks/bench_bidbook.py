@@ -0,0 +1,94 @@
+"""Bids/sec and latency percentiles: direct MongoDB bid path vs the hot bid book
+
+Runs POST /api/auctions/<id>/bid through the Flask test client against the
+database in MONGODB_URI when it is reachable, otherwise (or with
+STORAGE_BACKEND=memory) against the memory backend, whose numbers say nothing about
+the real cost of MongoDB queries and round trips.
+"""
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from time import perf_counter
+from unittest import mock
+
+from bson import ObjectId
+from flask import json
+from flask_jwt_extended import create_access_token
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from app import app, bid_book
+from storage import connect
+
+def memory_database():
+    return connect({'STORAGE_BACKEND': 'memory', 'DATABASE_NAME': 'auction_benchmark'})
+
+def get_database():
+    if os.getenv('STORAGE_BACKEND') == 'memory':
+        return memory_database(), 'memory'
+    try:
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'), serverSelectionTimeoutMS=500)
+        client.admin.command('ping')
+        return client.auction_benchmark, 'mongodb'
+    except PyMongoError:
+        return memory_database(), 'memory'
+
+def run(db, headers, seconds_left, bidders, bids_per_bidder):
+    auction_id = str(db.auctions.insert_one({
+        'title': 'Benchmark auction',
+        'current_bid': 1.0,
+        'end_time': datetime.utcnow() + timedelta(seconds=seconds_left),
+        'bids': []
+    }).inserted_id)
+    latencies = []
+    lock = threading.Lock()
+    next_amount = [1.0]
+
+    def bidder():
+        client = app.test_client()
+        local = []
+        for _ in range(bids_per_bidder):
+            with lock:
+                next_amount[0] += 1
+                amount = next_amount[0]
+            start = perf_counter()
+            client.post(f'/api/auctions/{auction_id}/bid', data=json.dumps({'amount': amount}),
+                        content_type='application/json', headers=headers)
+            local.append(perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    start = perf_counter()
+    threads = [threading.Thread(target=bidder) for _ in range(bidders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    bid_book.flush()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    return len(latencies) / elapsed, p50, p99
+
+def main(bidders=8, bids_per_bidder=250):
+    db, backend = get_database()
+    tmp = tempfile.mkdtemp()
+    config = {
+        'RATE_LIMIT_ENABLED': False,
+        'COMPRESS_ENABLED': False,
+        'BIDBOOK_WAL_PATH': os.path.join(tmp, 'bidbook.wal')
+    }
+    with mock.patch('app.db', db), mock.patch.dict(app.config, config):
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {create_access_token(identity=str(ObjectId()))}'}
+        print(f"backend: {backend}, {bidders} bidders x {bids_per_bidder} bids")
+        for name, seconds_left in (('direct MongoDB path', 86400), ('hot bid book', 60)):
+            rate, p50, p99 = run(db, headers, seconds_left, bidders, bids_per_bidder)
+            print(f"{name:20} {rate:8.0f} bids/s   p50 {p50:6.2f} ms   p99 {p99:6.2f} ms")
+        bid_book.stop()
+
+if __name__ == '__main__':
+    main()
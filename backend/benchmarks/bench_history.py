@@ -0,0 +1,63 @@
+"""Bid history: backfill bucketing with and without numpy, and chart reads vs shipping every bid
+
+    python -m benchmarks.bench_history
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import history
+from history import backfill_history, get_history
+from storage import connect
+from utils import serialize_mongo_doc
+
+RESOLUTIONS = [60, 60 * 60, 24 * 60 * 60]
+
+def best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def bench_bucketing(auctions=500, bids_per_auction=400):
+    rng = random.Random(1)
+    count = auctions * bids_per_auction
+    keys = [rng.randrange(auctions) for _ in range(count)]
+    times = [rng.randrange(7 * 86400) for _ in range(count)]
+    amounts = [rng.random() * 1000 for _ in range(count)]
+
+    print(f"Bucketing {count:,} bids over {auctions} auctions at {len(RESOLUTIONS)} resolutions")
+    python = best_of(lambda: [list(history._buckets_python(keys, times, amounts, r)) for r in RESOLUTIONS], 1)
+    print(f"  python  {python * 1000:9.1f} ms")
+    if history.np is None:
+        print("  numpy   not installed")
+        return
+    vectorized = best_of(lambda: [list(history._buckets_numpy(keys, times, amounts, r)) for r in RESOLUTIONS], 1)
+    print(f"  numpy   {vectorized * 1000:9.1f} ms   x{python / vectorized:.1f}")
+
+def bench_chart(bids=10000):
+    db = connect({'STORAGE_BACKEND': 'memory', 'DATABASE_NAME': 'bench'})
+    auction_id = ObjectId()
+    start = datetime(2030, 1, 1)
+    auction = {'_id': auction_id, 'bids': [
+        {'user_id': ObjectId(), 'amount': 100.0 + i, 'time': start + timedelta(seconds=15 * i)}
+        for i in range(bids)
+    ]}
+    db.auctions.insert_one(auction)
+    backfill_history(db, RESOLUTIONS)
+
+    full = len(json.dumps(serialize_mongo_doc(db.auctions.find_one({'_id': auction_id}))))
+    buckets = get_history(db, auction_id, 3600, RESOLUTIONS)
+    chart = len(json.dumps(serialize_mongo_doc(buckets)))
+    read = best_of(lambda: get_history(db, auction_id, 3600, RESOLUTIONS))
+    print(f"Chart of {bids:,} bids at 1h: {len(buckets)} buckets, {chart:,} B "
+          f"vs {full:,} B for the embedded bids; read in {read * 1000:.1f} ms (embedded)")
+
+if __name__ == '__main__':
+    bench_bucketing()
+    bench_chart()
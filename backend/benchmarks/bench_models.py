@@ -0,0 +1,199 @@
+"""Compare allocations of the slotted models against the code they replaced
+
+    python -m benchmarks.bench_models [--count 10000]
+
+Bulk path: validate a create-auction payload and build its document.
+Bid path: validate a bid amount and build the embedded bid document.
+
+The legacy path is the pre-slots code: plain classes, the old validators
+(which parsed every field and threw the results away) and the route
+parsing the same fields again. Allocations are traced with tracemalloc
+around each single operation.
+
+Slots pay off on the bid path (about 10% less at the peak). The bulk path
+does not get smaller or faster: the parsed-fields dict and the keyword
+arguments built from it cost about what the second round of parsing saved.
+"""
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+from timeit import repeat
+
+from bson import ObjectId
+
+from models import Auction, Bid
+from utils import APIError, parse_auction_data, validate_bid_data
+
+# Legacy code, as it was before the models were slotted (the debug print in
+# legacy_validate_auction_data is left out so it does not flood the output)
+
+class LegacyAuction:
+    def __init__(self, title, description, starting_price, minimum_increment, end_time, seller_id, image_url=None, category=1):
+        self.title = title
+        self.description = description
+        self.starting_price = float(starting_price)
+        self.minimum_increment = float(minimum_increment)
+        self.current_bid = float(starting_price)
+        # Ensure end_time is UTC
+        if isinstance(end_time, str):
+            self.end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
+        else:
+            self.end_time = end_time
+        self.image_url = image_url
+        # Convert seller_id to ObjectId if it's not already one
+        self.seller_id = seller_id if isinstance(seller_id, ObjectId) else ObjectId(str(seller_id))
+        # Add category
+        self.category = int(category)
+        # Ensure created_at is UTC
+        self.created_at = datetime.now(self.end_time.tzinfo)
+        self.bids = []
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'description': self.description,
+            'starting_price': self.starting_price,
+            'minimum_increment': self.minimum_increment,
+            'current_bid': self.current_bid,
+            'end_time': self.end_time,
+            'image_url': self.image_url,
+            'seller_id': self.seller_id,
+            'category': self.category,
+            'created_at': self.created_at,
+            'bids': self.bids
+        }
+
+class LegacyBid:
+    def __init__(self, user_id, amount):
+        self.user_id = ObjectId(user_id)
+        self.amount = float(amount)
+        self.time = datetime.utcnow()
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'amount': self.amount,
+            'time': self.time
+        }
+
+def legacy_validate_auction_data(data):
+    # Check required fields
+    required_fields = ['title', 'description', 'startingPrice', 'minimumIncrement', 'endTime', 'category']
+    for field in required_fields:
+        if field not in data:
+            raise APIError(f"Missing required field: {field}")
+        elif not str(data[field]).strip():  # Check for empty values
+            raise APIError(f"Field cannot be empty: {field}")
+
+    # Validate numeric fields
+    try:
+        starting_price = float(data['startingPrice'])
+        if starting_price <= 0:
+            raise APIError("Starting price must be greater than 0")
+    except (ValueError, TypeError):
+        raise APIError("Starting price must be a valid number", 422)
+
+    try:
+        minimum_increment = float(data['minimumIncrement'])
+        if minimum_increment <= 0:
+            raise APIError("Minimum increment must be greater than 0")
+    except (ValueError, TypeError):
+        raise APIError("Minimum increment must be a valid number", 422)
+
+    # Validate endTime
+    try:
+        end_time = datetime.fromisoformat(data['endTime'].replace('Z', '+00:00'))
+        now = datetime.now(end_time.tzinfo)
+        if end_time <= now:
+            raise APIError("End time must be in the future")
+    except ValueError:
+        raise APIError("Invalid end time format", 422)
+
+    # Validate category
+    try:
+        category = int(data['category'])
+        if category < 1 or category > 4:
+            raise APIError("Invalid category value. Must be between 1 and 4")
+    except (ValueError, TypeError):
+        raise APIError("Category must be a valid number", 422)
+
+def legacy_validate_bid_data(data, current_bid):
+    if 'amount' not in data:
+        raise APIError("Missing bid amount")
+    try:
+        bid_amount = float(data['amount'])
+        if bid_amount <= 0:
+            raise APIError("Bid amount must be greater than 0")
+        if current_bid and bid_amount <= current_bid:
+            raise APIError(f"Bid must be higher than current bid (${current_bid})")
+    except (ValueError, TypeError):
+        raise APIError("Bid amount must be a valid number")
+
+PAYLOAD = {
+    'title': 'Vintage camera',
+    'description': 'Working condition',
+    'startingPrice': '120.50',
+    'minimumIncrement': '5',
+    'endTime': (datetime.utcnow() + timedelta(days=3)).isoformat() + 'Z',
+    'category': '2'
+}
+BID = {'amount': '130'}
+SELLER_ID = str(ObjectId())
+
+def legacy_bulk():
+    # What create_auction and the importer did: validate, then parse again
+    legacy_validate_auction_data(PAYLOAD)
+    return LegacyAuction(
+        PAYLOAD['title'],
+        PAYLOAD['description'],
+        float(PAYLOAD['startingPrice']),
+        float(PAYLOAD['minimumIncrement']),
+        datetime.fromisoformat(PAYLOAD['endTime'].replace('Z', '+00:00')),
+        SELLER_ID,
+        PAYLOAD.get('imageUrl'),
+        PAYLOAD.get('category', 1)
+    ).to_dict()
+
+def slotted_bulk():
+    return Auction(seller_id=SELLER_ID, **parse_auction_data(PAYLOAD)).to_dict()
+
+def legacy_bid():
+    legacy_validate_bid_data(BID, 120.5)
+    return LegacyBid(SELLER_ID, BID['amount']).to_dict()
+
+def slotted_bid():
+    return Bid(SELLER_ID, validate_bid_data(BID, 120.5)).to_dict()
+
+def traced(func, count):
+    """Per call: bytes allocated at the peak of the call, and bytes it leaves allocated"""
+    func()  # warm up caches and interned strings
+    results = [None] * count
+    peak = kept = 0
+    tracemalloc.start()
+    for i in range(count):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        results[i] = func()
+        current, top = tracemalloc.get_traced_memory()
+        peak += top - before
+        kept += current - before
+    tracemalloc.stop()
+    return peak / count, kept / count
+
+def per_call_us(func, count):
+    return min(repeat(func, number=count, repeat=5)) / count * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+
+    paths = {'bulk path': (legacy_bulk, slotted_bulk), 'bid path': (legacy_bid, slotted_bid)}
+    print(f"{'':10} {'':8} {'peak B/op':>10} {'kept B/op':>10} {'us/op':>8}")
+    for name, funcs in paths.items():
+        for label, func in zip(('legacy', 'slotted'), funcs):
+            peak, kept = traced(func, args.count)
+            print(f"{name:10} {label:8} {peak:10.0f} {kept:10.0f} {per_call_us(func, args.count):8.2f}")
+
+if __name__ == '__main__':
+    main()
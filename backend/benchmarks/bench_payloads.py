@@ -0,0 +1,64 @@
+"""Measure listing payload sizes: full JSON vs compact fields/epoch, with and without compression"""
+import copy
+import gzip
+import json
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from compression import brotli
+from summaries import summarize
+from utils import serialize_mongo_doc
+
+LISTING_FIELDS = ['_id', 'title', 'current_bid', 'starting_price', 'end_time', 'category', 'image_url']
+
+def make_auctions(count, bids_per_auction=20):
+    now = datetime.utcnow()
+    auctions = []
+    for i in range(count):
+        bidders = [ObjectId() for _ in range(5)]
+        auctions.append({
+            '_id': ObjectId(),
+            'title': f'Auction item {i}',
+            'description': 'A well kept item in good condition. ' * 4,
+            'starting_price': 100.0,
+            'minimum_increment': 5.0,
+            'current_bid': 100.0 + 5 * bids_per_auction,
+            'end_time': now + timedelta(hours=random.randint(1, 72)),
+            'image_url': None,
+            'seller_id': ObjectId(),
+            'category': random.randint(1, 4),
+            'created_at': now - timedelta(days=1),
+            'bids': [
+                {'user_id': random.choice(bidders), 'amount': 105.0 + 5 * j, 'time': now - timedelta(minutes=j)}
+                for j in range(bids_per_auction)
+            ]
+        })
+    return auctions
+
+def encode(auctions, fields=None, epoch=False):
+    docs = [{key: auction[key] for key in fields} if fields else auction for auction in auctions]
+    docs = copy.deepcopy(docs)  # serialize_mongo_doc converts in place
+    return json.dumps(serialize_mongo_doc(docs, epoch), separators=(',', ':')).encode('utf-8')
+
+def main(count=500):
+    auctions = make_auctions(count)
+    variants = {
+        'full': encode(auctions),
+        'fields=listing': encode(auctions, LISTING_FIELDS),
+        'fields=listing&ts=epoch': encode(auctions, LISTING_FIELDS, epoch=True),
+        'auction_summaries': encode([summarize(auction) for auction in auctions])
+    }
+    baseline = len(variants['full'])
+    print(f"{count} auctions, 20 bids each")
+    for name, body in variants.items():
+        sizes = [('identity', len(body)), ('gzip', len(gzip.compress(body, 6)))]
+        if brotli is not None:
+            sizes.append(('br', len(brotli.compress(body, quality=4))))
+        print(f"{name:26}" + "".join(
+            f" {encoding:>8} {size:9,d} B ({size / baseline:6.1%})" for encoding, size in sizes
+        ))
+
+if __name__ == '__main__':
+    main()
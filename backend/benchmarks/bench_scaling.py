@@ -0,0 +1,115 @@
+"""Throughput of serve.py with 1..N worker processes on listing and bid workloads
+
+    python -m benchmarks.bench_scaling --workers 1 2 4 --seconds 5
+
+Needs the MongoDB in MONGODB_URI; auctions are seeded into the
+`auction_benchmark` database, which is dropped afterwards. Load is generated
+from separate client processes so the client side does not share a GIL.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+def client_loop(args):
+    port, workload, auction_id, token, seconds = args
+    deadline = time.monotonic() + seconds
+    done = 0
+    amount = 1.0
+    while time.monotonic() < deadline:
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        if workload == 'listing':
+            connection.request('GET', '/api/auctions?fields=title,current_bid,end_time')
+        else:
+            amount += 1
+            connection.request(
+                'POST', f'/api/auctions/{auction_id}/bid',
+                body=json.dumps({'amount': amount}),
+                headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+            )
+        connection.getresponse().read()
+        connection.close()
+        done += 1
+    return done
+
+def make_token(user_id):
+    from flask_jwt_extended import create_access_token
+    from app import app
+    with app.app_context():
+        return create_access_token(identity=user_id)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    env = dict(os.environ, RATE_LIMIT_ENABLED='0')
+    db = MongoClient(env.get('MONGODB_URI', 'mongodb://localhost:27017/')).auction_benchmark
+    env['MONGODB_URI'] = env.get('MONGODB_URI', 'mongodb://localhost:27017/')
+    db.client.drop_database(db.name)
+    seller_id = ObjectId()
+    auction_ids = [str(auction_id) for auction_id in db.auctions.insert_many([{
+        'title': f'Auction {i}',
+        'description': 'Benchmark item',
+        'starting_price': 1.0,
+        'current_bid': 1.0,
+        'end_time': datetime.utcnow() + timedelta(days=1),
+        'seller_id': seller_id,
+        'created_at': datetime.utcnow(),
+        'bids': []
+    } for i in range(max(200, args.clients))]).inserted_ids]
+    token = make_token(str(ObjectId()))
+
+    print(f"{args.clients} client processes, {args.seconds}s per run, {os.cpu_count()} CPUs")
+    baseline = {}
+    try:
+        for workers in args.workers:
+            server = subprocess.Popen(
+                [sys.executable, 'serve.py', '--workers', str(workers), '--port', str(args.port)],
+                cwd=BACKEND_DIR, env=dict(env, DATABASE_NAME=db.name),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                wait_for_port(args.port)
+                for workload in ('listing', 'bid'):
+                    jobs = [
+                        (args.port, workload, auction_ids[i], token, args.seconds)
+                        for i in range(args.clients)
+                    ]
+                    with Pool(args.clients) as pool:
+                        rate = sum(pool.map(client_loop, jobs)) / args.seconds
+                    baseline.setdefault(workload, rate)
+                    print(f"workers={workers:<3} {workload:8} {rate:9.0f} req/s   "
+                          f"speedup x{rate / baseline[workload]:.2f}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        db.client.drop_database(db.name)
+
+if __name__ == '__main__':
+    main()
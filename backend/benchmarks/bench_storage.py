@@ -0,0 +1,82 @@
+"""Per-operation latency of the storage backends on the request path's queries
+
+    python -m benchmarks.bench_storage [--auctions 10000]
+
+Compares the memory backend (STORAGE_BACKEND=memory) with MongoDB itself
+when MONGODB_URI is reachable. Listings read the auction_summaries view
+with the indexes the app declares, as the request path does.
+"""
+import argparse
+import os
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from storage import clear_database, connect
+from summaries import rebuild_summaries, summaries_collection
+from utils import ensure_index
+
+def backends():
+    yield 'memory', connect({'STORAGE_BACKEND': 'memory', 'DATABASE_NAME': 'auction_benchmark'})
+    try:
+        client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'), serverSelectionTimeoutMS=500)
+        client.admin.command('ping')
+        yield 'mongodb', client.auction_benchmark
+    except PyMongoError:
+        pass
+
+def per_op(func, ids):
+    start = perf_counter()
+    for auction_id in ids:
+        func(auction_id)
+    return (perf_counter() - start) / len(ids) * 1e6
+
+def run(db, auctions, ops):
+    clear_database(db)
+    sellers = [ObjectId() for _ in range(100)]
+    ids = db.auctions.insert_many([{
+        'title': f'Auction {i}',
+        'current_bid': 1.0,
+        'end_time': datetime.utcnow() + timedelta(days=1),
+        'seller_id': sellers[i % len(sellers)],
+        'bids': []
+    } for i in range(auctions)]).inserted_ids
+    sample = ids[::max(1, len(ids) // ops)][:ops]
+    user_id = ObjectId()
+    rebuild_summaries(db)
+    summaries = summaries_collection(db)
+    ensure_index(db.auctions, 'bids.user_id')
+
+    results = {
+        'find_one by _id': per_op(lambda a: db.auctions.find_one({'_id': a}), sample),
+        'conditional bid': per_op(lambda a: db.auctions.update_one(
+            {'_id': a, 'current_bid': {'$lt': 2.0}},
+            {'$set': {'current_bid': 2.0}, '$push': {'bids': {'user_id': user_id, 'amount': 2.0}}}
+        ), sample),
+        'insert_one': per_op(lambda a: db.scratch.insert_one({'auction_id': a}), sample),
+        'seller listing': per_op(
+            lambda s: list(summaries.find({'seller_id': s}).sort('_id', 1).limit(20)), sellers[:20]
+        ),
+        'bidder listing': per_op(lambda a: list(db.auctions.find({'bids.user_id': user_id}).limit(20)), sample[:20]),
+    }
+    clear_database(db)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--auctions', type=int, default=10000)
+    parser.add_argument('--ops', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.auctions:,} auctions, microseconds per operation")
+    for name, db in backends():
+        results = run(db, args.auctions, args.ops)
+        print(f"  {name}")
+        for operation, micros in results.items():
+            print(f"    {operation:18} {micros:12.1f} us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from models import Bid
+from sync import next_update_seq
+from utils import APIError, validate_bid_data, soft_close_deadline, utc_now
+
+class HotAuction:
+    """In-memory state of an auction close to its end time"""
+    __slots__ = ('auction_id', 'current_bid', 'end_time', 'lock')
+
+    def __init__(self, auction_id, current_bid, end_time):
+        self.auction_id = auction_id
+        self.current_bid = current_bid
+        self.end_time = end_time
+        self.lock = threading.Lock()
+
+    def now(self):
+        return utc_now(self.end_time)
+
+    def has_ended(self):
+        return self.end_time < self.now()
+
+class BidBook:
+    """Authoritative in-process bid state for auctions in their final minutes
+
+    Bids on hot auctions are validated against memory, appended to a
+    write-ahead log and acknowledged; a background thread flushes them to
+    MongoDB in batches. `current_bid` and a soft-close `end_time` are only
+    ever raised with `$max`, and each auction records the last WAL sequence
+    it has applied so a replay after a crash never pushes the same bid twice.
+
+    The book is the only authority for a hot auction's price, so it runs
+    only when a single process serves the API (EVENT_BUS='local'). With
+    several workers each would accept bids against its own copy, so bids
+    go straight to MongoDB instead.
+
+    The hot books double as the ending-soon index: a soft-close extension
+    updates the book's end_time in place and is announced to
+    `deadline_listeners` as `listener(auction_id, end_time)`. After each
+    successful write-behind batch `flush_listeners` get `listener(batch)`,
+    a dict of auction_id -> [(seq, bid, end_time)].
+    """
+    def __init__(self, app=None, get_db=None):
+        self.get_db = get_db
+        self._books = {}
+        self._books_lock = threading.Lock()
+        self._pending = defaultdict(list)  # auction_id -> [(seq, bid, extended end_time or None)]
+        self._flushing = {}  # the batch being written, still shown by overlay()
+        self._wal_lock = threading.Lock()
+        self._wal = None
+        self._seq = time.time_ns()
+        self._retry = False  # the last flush failed, possibly after a partial write
+        self._flusher = None
+        self._stopped = threading.Event()
+        self.deadline_listeners = []
+        self.flush_listeners = []
+        if app is not None:
+            self.init_app(app, get_db)
+
+    def init_app(self, app, get_db=None):
+        self.app = app
+        if get_db is not None:
+            self.get_db = get_db
+        app.before_first_request(self.start)
+
+    @property
+    def enabled(self):
+        return self.app.config['BIDBOOK_ENABLED'] and self.app.config['EVENT_BUS'] == 'local'
+
+    # Lifecycle
+
+    def start(self):
+        """Replay any unflushed WAL entries, then start the flusher thread"""
+        if self._flusher is not None:
+            return
+        # Bids acknowledged before a restart are written out even if the book
+        # is now off; bidbook_seq keeps concurrent replays from doubling them
+        self.replay()
+        if not self.enabled:
+            return
+        self._stopped.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name='bidbook-flusher', daemon=True)
+        self._flusher.start()
+
+    def stop(self):
+        """Stop the flusher and write out everything still pending"""
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.app.config['BIDBOOK_FLUSH_INTERVAL']):
+            try:
+                self.flush()
+            except Exception as e:
+                # Entries stay pending and in the WAL; the next round retries them
+                self.app.logger.error(f"Bid book flush failed: {str(e)}")
+
+    # Hot auction tracking
+
+    def get(self, auction_id):
+        """Return the hot book for an auction id, if this process holds one"""
+        return self._books.get(str(auction_id))
+
+    def is_hot(self, auction):
+        end_time = auction['end_time']
+        if isinstance(end_time, str):
+            return False
+        window = timedelta(seconds=self.app.config['BIDBOOK_WINDOW'])
+        return timedelta(0) < end_time - utc_now(end_time) <= window
+
+    def promote(self, auction):
+        """Start serving bids for `auction` from memory"""
+        key = str(auction['_id'])
+        with self._books_lock:
+            book = self._books.get(key)
+            if book is None:
+                book = self._books[key] = HotAuction(auction['_id'], auction['current_bid'], auction['end_time'])
+            return book
+
+    def deadline_extended(self, auction_id, end_time):
+        """Record a soft-close extension made outside the book and notify listeners"""
+        book = self.get(auction_id)
+        if book is not None:
+            with book.lock:
+                if end_time > book.end_time:
+                    book.end_time = end_time
+        self._notify_extended(auction_id, end_time)
+
+    def _notify_extended(self, auction_id, end_time):
+        for listener in self.deadline_listeners:
+            listener(auction_id, end_time)
+
+    def evict_ended(self):
+        """Drop books whose auction has ended and whose bids are all flushed"""
+        with self._books_lock, self._wal_lock:
+            for key, book in list(self._books.items()):
+                if book.has_ended() and not self._pending.get(book.auction_id):
+                    del self._books[key]
+
+    # Bidding
+
+    def place(self, book, user_id, data):
+        """Validate a bid against memory, log it and queue it for the next flush"""
+        with book.lock:
+            now = book.now()
+            if book.end_time < now:
+                raise APIError('Auction has ended', 400)
+            amount = validate_bid_data(data, book.current_bid)
+            bid = Bid(user_id, amount)
+            new_end_time = soft_close_deadline(
+                book.end_time, now,
+                self.app.config['SOFT_CLOSE_WINDOW'], self.app.config['SOFT_CLOSE_EXTENSION']
+            )
+            entry = {
+                'auction_id': str(book.auction_id),
+                'user_id': str(bid.user_id),
+                'amount': bid.amount,
+                'time': bid.time.isoformat()
+            }
+            if new_end_time:
+                entry['end_time'] = new_end_time.isoformat()
+            with self._wal_lock:
+                self._seq += 1
+                entry['seq'] = self._seq
+                self._append_wal(entry)
+                self._pending[book.auction_id].append((self._seq, bid, new_end_time))
+            book.current_bid = amount
+            if new_end_time:
+                book.end_time = new_end_time
+        if new_end_time:
+            self._notify_extended(book.auction_id, new_end_time)
+        return bid
+
+    def overlay(self, auction):
+        """Apply bids that are acknowledged but not yet flushed to a fetched auction"""
+        book = self.get(auction['_id'])
+        if book is None:
+            return auction
+        with self._wal_lock:
+            entries = [*self._flushing.get(auction['_id'], ()), *self._pending.get(auction['_id'], ())]
+        # Entries of a batch being written may already be in the fetched document
+        applied = auction.get('bidbook_seq', 0)
+        pending = [bid.to_dict() for seq, bid, _ in entries if seq > applied]
+        if pending:
+            auction['bids'] = list(auction.get('bids') or []) + pending
+            auction['current_bid'] = max(auction['current_bid'], book.current_bid)
+        if isinstance(auction.get('end_time'), datetime) and book.end_time > auction['end_time']:
+            auction['end_time'] = book.end_time
+        return auction
+
+    # Write-behind
+
+    def flush(self):
+        """Write all pending bids with one bulk_write and checkpoint the WAL"""
+        with self._wal_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, defaultdict(list)
+            self._flushing = batch
+            through = self._seq
+            retry = self._retry
+
+        # After a failed flush part of the batch may already be in MongoDB
+        # (an unordered bulk_write fails per auction): only write the rest
+        unapplied = self._unapplied(batch) if retry else batch
+        try:
+            if unapplied:
+                self._write(unapplied)
+        except Exception:
+            # Put the batch back in front of anything queued meanwhile
+            with self._wal_lock:
+                for auction_id, entries in batch.items():
+                    self._pending[auction_id][:0] = entries
+                self._flushing = {}
+                self._retry = True
+            raise
+
+        with self._wal_lock:
+            self._flushing = {}
+            self._retry = False
+            if self._pending:
+                self._append_wal({'flushed': through})
+            else:
+                self._truncate_wal()
+        self.evict_ended()
+        # Listeners run once the bids are durable; bids written by an earlier
+        # failed attempt were never announced, so they get the whole batch
+        self._notify_flushed(batch)
+        return sum(len(entries) for entries in batch.values())
+
+    def _unapplied(self, batch):
+        """Drop entries each auction already has, going by its bidbook_seq"""
+        applied = {
+            auction['_id']: auction.get('bidbook_seq', 0)
+            for auction in self.get_db().auctions.find({'_id': {'$in': list(batch)}}, {'bidbook_seq': 1})
+        }
+        batch = {
+            auction_id: [item for item in items if item[0] > applied.get(auction_id, 0)]
+            for auction_id, items in batch.items()
+        }
+        return {auction_id: items for auction_id, items in batch.items() if items}
+
+    def _write(self, batch):
+        requests = []
+        for auction_id, entries in batch.items():
+            last_seq = entries[-1][0]
+            maximums = {'current_bid': max(bid.amount for _, bid, _ in entries)}
+            extensions = [end_time for _, _, end_time in entries if end_time]
+            if extensions:
+                maximums['end_time'] = max(extensions)
+            requests.append(UpdateOne(
+                {'_id': auction_id, '$or': [
+                    {'bidbook_seq': {'$exists': False}},
+                    {'bidbook_seq': {'$lt': last_seq}}
+                ]},
+                {
+                    '$push': {'bids': {'$each': [bid.to_dict() for _, bid, _ in entries]}},
+                    '$max': maximums,
+                    '$set': {'bidbook_seq': last_seq, 'update_seq': next_update_seq()}
+                }
+            ))
+        self.get_db().auctions.bulk_write(requests, ordered=False)
+
+    def _notify_flushed(self, batch):
+        for listener in self.flush_listeners:
+            listener(batch)
+
+    # Write-ahead log
+
+    def _wal_path(self):
+        return self.app.config['BIDBOOK_WAL_PATH']
+
+    def _append_wal(self, entry):
+        if self._wal is None:
+            os.makedirs(os.path.dirname(self._wal_path()) or '.', exist_ok=True)
+            self._wal = open(self._wal_path(), 'a')
+        self._wal.write(json.dumps(entry) + '\n')
+        self._wal.flush()
+        if self.app.config['BIDBOOK_WAL_FSYNC']:
+            os.fsync(self._wal.fileno())
+
+    def _truncate_wal(self):
+        if self._wal is not None:
+            self._wal.truncate(0)
+            self._wal.seek(0)
+
+    def replay(self):
+        """Re-apply WAL entries that were acknowledged but never flushed"""
+        try:
+            with open(self._wal_path()) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return 0
+
+        flushed = 0
+        entries = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # torn final write: the bid was never acknowledged
+            if 'flushed' in entry:
+                flushed = max(flushed, entry['flushed'])
+            else:
+                entries.append(entry)
+
+        batch = defaultdict(list)
+        for entry in entries:
+            if entry['seq'] > flushed:
+                bid = Bid(entry['user_id'], entry['amount'])
+                bid.time = datetime.fromisoformat(entry['time'])
+                end_time = datetime.fromisoformat(entry['end_time']) if 'end_time' in entry else None
+                batch[ObjectId(entry['auction_id'])].append((entry['seq'], bid, end_time))
+            self._seq = max(self._seq, entry['seq'])
+
+        if batch:
+            # A flush may have reached MongoDB without its checkpoint: skip what each auction already has
+            batch = self._unapplied(batch)
+            if batch:
+                self._write(batch)
+                self._notify_flushed(batch)
+
+        with self._wal_lock:
+            if self._wal is None:
+                self._wal = open(self._wal_path(), 'a')
+            self._truncate_wal()
+        return sum(len(items) for items in batch.values())
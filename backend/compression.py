@@ -0,0 +1,73 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+def _gzip_compressor(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+def _brotli_compressor(quality):
+    compressor = brotli.Compressor(quality=quality)
+    return compressor.process, compressor.finish
+
+class Compress:
+    """Negotiated gzip/brotli compression of API responses in an after_request hook"""
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.after_request(self.after_request)
+
+    def _encoding(self):
+        encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+        return request.accept_encodings.best_match(encodings)
+
+    def _compressor(self, encoding):
+        if encoding == 'br':
+            return _brotli_compressor(self.app.config['COMPRESS_BROTLI_QUALITY'])
+        return _gzip_compressor(self.app.config['COMPRESS_LEVEL'])
+
+    def _stream(self, chunks, encoding):
+        compress, finish = self._compressor(encoding)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+
+    def after_request(self, response):
+        config = self.app.config
+        if (not config['COMPRESS_ENABLED']
+                or request.method == 'HEAD'
+                or not 200 <= response.status_code < 300
+                or response.status_code == 204
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in config['COMPRESS_MIMETYPES']):
+            return response
+
+        encoding = self._encoding()
+        if not encoding:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            compress, finish = self._compressor(encoding)
+            response.set_data(compress(data) + finish())
+        response.headers['Content-Encoding'] = encoding
+        return response
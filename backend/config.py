@@ -14,7 +14,108 @@ class Config:
     
     # MongoDB
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
-    DATABASE_NAME = 'auction_system'
+    DATABASE_NAME = os.getenv('DATABASE_NAME', 'auction_system')
+    # 'mongo', or 'memory' for an in-process database (single process only,
+    # nothing persisted; used by the test suite and CI load tests)
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+    
+    # Event bus shared by worker processes: 'local' (single process),
+    # 'ipc' (workers forked by serve.py) or 'mongo' (change streams, needs a replica set)
+    EVENT_BUS = os.getenv('EVENT_BUS', 'local')
+    
+    # Rate limiting
+    # Token buckets per endpoint: `rate` tokens/second refill, `burst` capacity.
+    # Scopes: 'ip' (client address), 'user' (JWT identity; the view needs
+    # @rate_limiter.per_user, otherwise the client address), 'auction' (URL id)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') != '0'
+    # 'memory' counts per process (serve.py refuses it with several workers) or 'mongo'
+    RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')
+    RATE_LIMITS = {
+        'login': [
+            {'scope': 'ip', 'rate': 0.2, 'burst': 10}
+        ],
+        'register': [
+            {'scope': 'ip', 'rate': 0.1, 'burst': 5}
+        ],
+        'place_bid': [
+            {'scope': 'user', 'rate': 2, 'burst': 10},
+            {'scope': 'auction', 'rate': 50, 'burst': 100}
+        ],
+        'create_auction': [
+            {'scope': 'user', 'rate': 0.5, 'burst': 10}
+        ]
+    }
+    
+    # Admission control: each request is classed 'urgent' (a bid on an auction
+    # ending within BIDBOOK_WINDOW), 'write' (other non-GET requests) or
+    # 'read'. A class runs at most `limit` requests at once, all classes together
+    # at most ADMISSION_MAX_ACTIVE; freed slots go to the lowest `priority` first.
+    # Requests queued longer than `shed_after` seconds get 503 (None: never shed).
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') != '0'
+    ADMISSION_MAX_ACTIVE = 64
+    ADMISSION_CLASSES = {
+        'urgent': {'priority': 0, 'limit': 64, 'shed_after': None},
+        'write': {'priority': 1, 'limit': 16, 'shed_after': 2.0},
+        'read': {'priority': 2, 'limit': 32, 'shed_after': 0.5}
+    }
+    ADMISSION_EXEMPT = ['metrics']  # endpoints that bypass admission
+    
+    # Idempotency keys
+    IDEMPOTENCY_TTL = 24 * 60 * 60  # seconds a stored response can be replayed
+    IDEMPOTENCY_CACHE_SIZE = 10000  # responses kept in the in-process cache
+    IDEMPOTENCY_WAIT_TIMEOUT = 10  # seconds a duplicate waits for the original
+    IDEMPOTENCY_LOCK_TIMEOUT = 60  # seconds before a retry may take over an unfinished request's key
+    
+    # Response compression
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are sent as-is
+    COMPRESS_LEVEL = 6  # gzip level
+    COMPRESS_BROTLI_QUALITY = 4  # used when the optional brotli package is installed
+    COMPRESS_MIMETYPES = ['application/json', 'application/x-ndjson', 'text/csv']
+    
+    # Soft close (anti-sniping): a bid within SOFT_CLOSE_WINDOW seconds of the
+    # end time extends the auction so SOFT_CLOSE_EXTENSION seconds remain.
+    # Set SOFT_CLOSE_EXTENSION to 0 to disable.
+    SOFT_CLOSE_WINDOW = 2 * 60
+    SOFT_CLOSE_EXTENSION = 2 * 60
+    
+    # Hot auction bid book. Only used with EVENT_BUS='local': the book must be
+    # the single authority for an auction's price, which several workers are not
+    BIDBOOK_ENABLED = True
+    BIDBOOK_WINDOW = 5 * 60  # seconds before end_time an auction is served from memory
+    BIDBOOK_FLUSH_INTERVAL = 0.05  # seconds between write-behind flushes
+    BIDBOOK_WAL_PATH = os.getenv('BIDBOOK_WAL_PATH', 'data/bidbook.wal')
+    BIDBOOK_WAL_FSYNC = False  # fsync each WAL append (slower, survives power loss)
+    
+    # Listing view: 'writes' updates auction_summaries next to each auction write,
+    # 'change_stream' tails the auctions collection instead (needs a replica set)
+    SUMMARY_SYNC = os.getenv('SUMMARY_SYNC', 'writes')
+    
+    # Delta sync (`since=` on listings): cursors trail the clock by SYNC_SETTLE
+    # seconds so writes still in flight on other workers are not skipped;
+    # tombstones of deleted auctions are kept for SYNC_TOMBSTONE_TTL seconds
+    SYNC_SETTLE = 5
+    SYNC_TOMBSTONE_TTL = 7 * 24 * 60 * 60
+    
+    # View and watcher counts are summed in memory and written every
+    # COUNTER_FLUSH_INTERVAL seconds (one $inc per touched auction)
+    COUNTER_FLUSH_INTERVAL = 5
+    
+    # Bid history: bucket widths (seconds) rolled up on every bid; the chart
+    # endpoint serves any multiple of these
+    HISTORY_RESOLUTIONS = [60, 60 * 60, 24 * 60 * 60]
+    
+    # Multipart auction uploads: images are hashed, checked and spooled to
+    # UPLOAD_DIR as they arrive; the JSON metadata part is the only thing held in memory
+    UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'data/uploads')
+    UPLOAD_MAX_IMAGE_SIZE = 10 * 1024 * 1024  # bytes
+    UPLOAD_MAX_METADATA_SIZE = 64 * 1024  # bytes
+    
+    # Exports
+    EXPORT_BATCH_SIZE = 500  # documents fetched per cursor batch
+    
+    # Bulk import
+    IMPORT_BATCH_SIZE = 1000  # documents per insert_many
     
     # Logging
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -0,0 +1,158 @@
+import os
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from multiprocessing.connection import wait
+
+from pymongo.errors import PyMongoError
+
+from utils import ensure_index
+
+class EventBus:
+    """Publish/subscribe between the workers of one deployment
+
+    `publish` delivers to subscribers in every worker, including the one that
+    published, so handlers must be idempotent (e.g. "raise current_bid to at
+    least X", "drop cache entry K"). Payloads are small JSON-compatible dicts.
+    """
+    def __init__(self):
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._handlers = defaultdict(list)
+
+    def subscribe(self, topic, handler):
+        self._handlers[topic].append(handler)
+
+    def publish(self, topic, payload):
+        self._dispatch(topic, payload)
+
+    def _dispatch(self, topic, payload):
+        for handler in self._handlers.get(topic, ()):
+            handler(payload)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+class LocalEventBus(EventBus):
+    """Single-process bus: events are dispatched synchronously in this worker"""
+
+class IpcEventBus(EventBus):
+    """Bus for workers forked by serve.py, relayed through the parent process
+
+    Each worker holds one end of a multiprocessing Pipe; the parent runs
+    `relay_events` and forwards every message to all other workers.
+    """
+    def __init__(self, connection):
+        super().__init__()
+        self.connection = connection
+        self._send_lock = threading.Lock()
+        self._reader = None
+
+    def publish(self, topic, payload):
+        self._dispatch(topic, payload)
+        with self._send_lock:
+            self.connection.send((topic, payload))
+
+    def start(self):
+        if self._reader is None:
+            self._reader = threading.Thread(target=self._read_loop, name='event-bus-ipc', daemon=True)
+            self._reader.start()
+
+    def _read_loop(self):
+        while True:
+            try:
+                topic, payload = self.connection.recv()
+            except (EOFError, OSError):
+                return
+            self._dispatch(topic, payload)
+
+def relay_events(connections, stopped):
+    """Parent side of IpcEventBus: forward each worker's events to the others"""
+    live = list(connections)
+    while live and not stopped.is_set():
+        for connection in wait(live, timeout=0.5):
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                live.remove(connection)
+                continue
+            for other in live:
+                if other is not connection:
+                    try:
+                        other.send(message)
+                    except OSError:
+                        pass
+
+class MongoEventBus(EventBus):
+    """Bus shared through a MongoDB collection and read back with a change stream
+
+    Works across hosts; requires a replica set (change streams are not
+    available on a standalone mongod). Old events expire via a TTL index.
+    """
+    def __init__(self, get_db, collection='events', ttl=60 * 60):
+        super().__init__()
+        self.get_db = get_db
+        self.collection_name = collection
+        self.ttl = ttl
+        self._reader = None
+        self._stopped = threading.Event()
+
+    def _collection(self):
+        collection = self.get_db()[self.collection_name]
+        ensure_index(collection, 'created_at', expireAfterSeconds=self.ttl)
+        return collection
+
+    def publish(self, topic, payload):
+        self._dispatch(topic, payload)
+        self._collection().insert_one({
+            'topic': topic,
+            'payload': payload,
+            'origin': self.origin,
+            'created_at': datetime.utcnow()
+        })
+
+    def start(self):
+        if self._reader is None:
+            self._stopped.clear()
+            self._reader = threading.Thread(target=self._watch_loop, name='event-bus-mongo', daemon=True)
+            self._reader.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch_loop(self):
+        pipeline = [{'$match': {'operationType': 'insert', 'fullDocument.origin': {'$ne': self.origin}}}]
+        resume_token = None
+        while not self._stopped.is_set():
+            try:
+                with self._collection().watch(pipeline, resume_after=resume_token, max_await_time_ms=500) as stream:
+                    while not self._stopped.is_set():
+                        change = stream.try_next()
+                        if change is None:
+                            continue
+                        resume_token = stream.resume_token
+                        event = change['fullDocument']
+                        self._dispatch(event['topic'], event['payload'])
+            except PyMongoError:
+                # Connection loss or failover: resume from the last seen event
+                self._stopped.wait(1)
+
+_worker_connection = None
+
+def set_worker_connection(connection):
+    """Called by serve.py in each worker before the app is imported"""
+    global _worker_connection
+    _worker_connection = connection
+
+def create_event_bus(kind, get_db=None):
+    """Build the bus selected by the EVENT_BUS setting: 'local', 'ipc' or 'mongo'"""
+    if kind == 'mongo':
+        return MongoEventBus(get_db)
+    if kind == 'ipc':
+        if _worker_connection is None:
+            raise RuntimeError("EVENT_BUS=ipc requires running under serve.py")
+        return IpcEventBus(_worker_connection)
+    return LocalEventBus()
@@ -0,0 +1,152 @@
+import csv
+import io
+import json
+import os
+
+from bson import ObjectId
+
+from utils import APIError, serialize_mongo_doc
+
+AUCTION_COLUMNS = [
+    '_id', 'title', 'description', 'starting_price', 'minimum_increment', 'current_bid',
+    'end_time', 'seller_id', 'category', 'created_at', 'bid_count'
+]
+BID_COLUMNS = ['auction_id', 'user_id', 'amount', 'time']
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def _range_filter(field, since, until):
+    """Mongo filter on `field` for the half-open range [since, until)"""
+    bounds = {}
+    if since:
+        bounds['$gte'] = since
+    if until:
+        bounds['$lt'] = until
+    return {field: bounds} if bounds else {}
+
+def _after_filter(after):
+    if not after:
+        return {}
+    try:
+        return {'_id': {'$gt': ObjectId(after)}}
+    except Exception:
+        raise APIError("Invalid checkpoint", 422)
+
+def iter_auctions(db, since=None, until=None, after=None, batch_size=500):
+    """Yield (checkpoint, row) for each auction created in the range, in _id order"""
+    query = {**_range_filter('created_at', since, until), **_after_filter(after)}
+    projection = {column: 1 for column in AUCTION_COLUMNS if column != 'bid_count'}
+    projection['bid_count'] = {'$size': {'$ifNull': ['$bids', []]}}
+    cursor = db.auctions.aggregate(
+        [{'$match': query}, {'$sort': {'_id': 1}}, {'$project': projection}],
+        batchSize=batch_size
+    )
+    for auction in cursor:
+        yield auction['_id'], serialize_mongo_doc(auction)
+
+def iter_bids(db, since=None, until=None, after=None, batch_size=500):
+    """Yield (checkpoint, row) for each bid placed in the range, grouped by auction"""
+    pipeline = [
+        {'$match': {**_after_filter(after), 'bids.0': {'$exists': True}}},
+        {'$sort': {'_id': 1}},
+        {'$project': {'bids': 1}},
+        {'$unwind': '$bids'}
+    ]
+    time_filter = _range_filter('bids.time', since, until)
+    if time_filter:
+        pipeline.append({'$match': time_filter})
+    pipeline.append({'$project': {
+        '_id': 0,
+        'auction_id': '$_id',
+        'user_id': '$bids.user_id',
+        'amount': '$bids.amount',
+        'time': '$bids.time'
+    }})
+    for bid in db.auctions.aggregate(pipeline, batchSize=batch_size):
+        yield bid['auction_id'], serialize_mongo_doc(bid)
+
+EXPORTS = {
+    'auctions': (iter_auctions, AUCTION_COLUMNS),
+    'bids': (iter_bids, BID_COLUMNS)
+}
+
+def format_rows(rows, fmt, columns, header=True):
+    """Encode (checkpoint, row) pairs as (checkpoint, line) pairs in NDJSON or CSV"""
+    if fmt == 'ndjson':
+        for checkpoint, row in rows:
+            yield checkpoint, json.dumps(row) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+
+    def take():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    if header:
+        writer.writeheader()
+        yield None, take()
+    for checkpoint, row in rows:
+        writer.writerow(row)
+        yield checkpoint, take()
+
+def export_lines(db, kind, fmt, since=None, until=None, after=None, batch_size=500, header=True):
+    """Stream an export as (checkpoint, line) pairs with constant memory"""
+    if kind not in EXPORTS:
+        raise APIError(f"Unknown export: {kind}", 404)
+    if fmt not in EXPORT_FORMATS:
+        raise APIError(f"Unsupported export format: {fmt}", 422)
+    _after_filter(after)  # reject a bad checkpoint before the response starts streaming
+    iter_rows, columns = EXPORTS[kind]
+    rows = iter_rows(db, since, until, after, batch_size)
+    return format_rows(rows, fmt, columns, header)
+
+def _load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _save_checkpoint(path, after, offset):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'after': after, 'offset': offset}, f)
+    os.replace(tmp_path, path)
+
+def export_to_file(db, kind, fmt, path, since=None, until=None, batch_size=500, checkpoint_path=None):
+    """Write an export to `path`, resuming from `checkpoint_path` if a previous run stopped early
+
+    The checkpoint records the last auction whose rows are fully written and the
+    file offset just after them, so a resumed run truncates any partial auction
+    and continues without duplicates.
+    """
+    checkpoint = _load_checkpoint(checkpoint_path) if checkpoint_path else None
+    after = checkpoint['after'] if checkpoint else None
+    count = 0
+    unsaved = 0
+
+    with open(path, 'r+' if checkpoint else 'w', newline='') as out:
+        if checkpoint:
+            out.seek(checkpoint['offset'])
+            out.truncate()
+        last = None
+        lines = export_lines(db, kind, fmt, since, until, after, batch_size, header=not checkpoint)
+        for current, line in lines:
+            if checkpoint_path and last is not None and current != last:
+                # Every row of `last` is written: flush and move the checkpoint forward
+                if unsaved >= batch_size:
+                    out.flush()
+                    _save_checkpoint(checkpoint_path, str(last), out.tell())
+                    unsaved = 0
+            out.write(line)
+            if current is not None:
+                last = current
+                count += 1
+                unsaved += 1
+        out.flush()
+        if checkpoint_path and last is not None:
+            _save_checkpoint(checkpoint_path, str(last), out.tell())
+    return count
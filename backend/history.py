@@ -0,0 +1,202 @@
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReplaceOne, UpdateOne
+
+from utils import APIError, ensure_index
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; backfills fall back to a Python loop
+    np = None
+
+HISTORY_COLLECTION = 'bid_history'
+
+EPOCH = datetime(1970, 1, 1)
+
+RESOLUTION_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+def parse_resolution(value):
+    """Parse a bucket width such as '300', '5m', '1h' or '1d' into seconds"""
+    value = str(value).strip().lower()
+    try:
+        if value and value[-1] in RESOLUTION_UNITS:
+            seconds = int(value[:-1]) * RESOLUTION_UNITS[value[-1]]
+        else:
+            seconds = int(value)
+    except ValueError:
+        raise APIError(f"Invalid resolution: {value}", 422)
+    if seconds <= 0:
+        raise APIError("Resolution must be positive", 422)
+    return seconds
+
+def _epoch_seconds(time):
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((time - EPOCH).total_seconds())
+
+def bucket_start(time, resolution):
+    """Start of the UTC-aligned bucket of `resolution` seconds containing `time`"""
+    seconds = _epoch_seconds(time)
+    return EPOCH + timedelta(seconds=seconds - seconds % resolution)
+
+def history_collection(db):
+    collection = db[HISTORY_COLLECTION]
+    ensure_index(collection, [('auction_id', 1), ('resolution', 1), ('start', 1)], unique=True)
+    return collection
+
+def record_bids(db, bids_by_auction, resolutions):
+    """Fold accepted bids ({auction_id: [bid dicts]}) into the buckets of every resolution
+
+    Bids on an auction only ever go up, so a bucket's open is its low and its
+    close is its high. Updates are therefore plain $min/$max and bids can be
+    applied in any order.
+    """
+    requests = []
+    for auction_id, bids in bids_by_auction.items():
+        for resolution in resolutions:
+            buckets = {}
+            for bid in bids:
+                start = bucket_start(bid['time'], resolution)
+                low, high, count = buckets.get(start, (bid['amount'], bid['amount'], 0))
+                buckets[start] = (min(low, bid['amount']), max(high, bid['amount']), count + 1)
+            for start, (low, high, count) in buckets.items():
+                requests.append(UpdateOne(
+                    {'auction_id': auction_id, 'resolution': resolution, 'start': start},
+                    {
+                        '$min': {'open': low, 'low': low},
+                        '$max': {'high': high, 'close': high},
+                        '$inc': {'count': count}
+                    },
+                    upsert=True
+                ))
+    if requests:
+        history_collection(db).bulk_write(requests, ordered=False)
+
+def _merge(buckets, resolution):
+    merged = []
+    for bucket in buckets:
+        start = bucket_start(bucket['start'], resolution)
+        if merged and merged[-1]['start'] == start:
+            last = merged[-1]
+            last['high'] = max(last['high'], bucket['high'])
+            last['low'] = min(last['low'], bucket['low'])
+            last['close'] = bucket['close']
+            last['count'] += bucket['count']
+        else:
+            merged.append(dict(bucket, start=start))
+    return merged
+
+def get_history(db, auction_id, resolution, resolutions, since=None, until=None):
+    """Return OHLC buckets of `resolution` seconds, oldest first
+
+    Reads the precomputed resolution that divides `resolution` with the fewest
+    buckets and merges adjacent ones when a coarser width is asked for, so the
+    cost depends on the number of buckets, never on the number of bids.
+    """
+    stored = [r for r in resolutions if resolution % r == 0]
+    if not stored:
+        raise APIError(f"Resolution must be a multiple of one of {sorted(resolutions)} seconds", 422)
+    base = max(stored)
+
+    query = {'auction_id': auction_id, 'resolution': base}
+    if since or until:
+        query['start'] = {}
+        if since:
+            query['start']['$gte'] = bucket_start(since, resolution)
+        if until:
+            query['start']['$lt'] = until
+    buckets = history_collection(db).find(
+        query, {'_id': 0, 'start': 1, 'open': 1, 'high': 1, 'low': 1, 'close': 1, 'count': 1}
+    ).sort('start', 1)
+    return list(buckets) if base == resolution else _merge(buckets, resolution)
+
+# Backfill
+
+def _buckets_numpy(keys, times, amounts, resolution):
+    keys = np.asarray(keys, dtype=np.int64)
+    times = np.asarray(times, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    order = np.lexsort((times, keys))
+    keys, times, amounts = keys[order], times[order], amounts[order]
+    starts = times - times % resolution
+    first = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]) | (starts[1:] != starts[:-1])])
+    ends = np.r_[first[1:], len(starts)]
+    return zip(
+        keys[first].tolist(), starts[first].tolist(), amounts[first].tolist(),
+        np.maximum.reduceat(amounts, first).tolist(), np.minimum.reduceat(amounts, first).tolist(),
+        amounts[ends - 1].tolist(), (ends - first).tolist()
+    )
+
+def _buckets_python(keys, times, amounts, resolution):
+    buckets = {}
+    for key, time, amount in sorted(zip(keys, times, amounts), key=lambda row: (row[0], row[1])):
+        start = time - time % resolution
+        bucket = buckets.get((key, start))
+        if bucket is None:
+            buckets[(key, start)] = [amount, amount, amount, amount, 1]
+        else:
+            bucket[1] = max(bucket[1], amount)
+            bucket[2] = min(bucket[2], amount)
+            bucket[3] = amount
+            bucket[4] += 1
+    return ((key, start, *bucket) for (key, start), bucket in buckets.items())
+
+def compute_buckets(keys, times, amounts, resolution):
+    """OHLC buckets for many series at once
+
+    `keys` identifies the series (e.g. auction) of each bid, `times` are epoch
+    seconds. Yields (key, start, open, high, low, close, count) for every
+    non-empty bucket. With numpy installed a whole batch of auctions is
+    bucketed in a few array operations.
+    """
+    if np is not None:
+        return _buckets_numpy(keys, times, amounts, resolution)
+    return _buckets_python(keys, times, amounts, resolution)
+
+def _backfill_batch(collection, auctions, resolutions):
+    keys, times, amounts = [], [], []
+    for key, auction in enumerate(auctions):
+        for bid in auction['bids']:
+            keys.append(key)
+            times.append(_epoch_seconds(bid['time']))
+            amounts.append(bid['amount'])
+
+    requests = []
+    for resolution in resolutions:
+        for key, start, open_, high, low, close, count in compute_buckets(keys, times, amounts, resolution):
+            bucket = {
+                'auction_id': auctions[key]['_id'],
+                'resolution': resolution,
+                'start': EPOCH + timedelta(seconds=start)
+            }
+            requests.append(ReplaceOne(
+                dict(bucket),
+                dict(bucket, open=open_, high=high, low=low, close=close, count=count),
+                upsert=True
+            ))
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+
+def backfill_history(db, resolutions, auction_ids=None, batch_size=500):
+    """Recompute the buckets of auctions from their embedded bids
+
+    Replaces existing buckets, so it also repairs rollups that drifted.
+    Returns the number of auctions processed.
+    """
+    query = {'bids.0': {'$exists': True}}
+    if auction_ids is not None:
+        query['_id'] = {'$in': list(auction_ids)}
+    collection = history_collection(db)
+
+    count = 0
+    batch = []
+    for auction in db.auctions.find(query, {'bids.time': 1, 'bids.amount': 1}, batch_size=batch_size):
+        batch.append(auction)
+        if len(batch) >= batch_size:
+            _backfill_batch(collection, batch, resolutions)
+            count += len(batch)
+            batch = []
+    if batch:
+        _backfill_batch(collection, batch, resolutions)
+        count += len(batch)
+    return count
@@ -0,0 +1,212 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from time import monotonic
+
+from flask import Response, request, make_response
+from flask_jwt_extended import get_jwt_identity
+from pymongo.errors import DuplicateKeyError
+
+from utils import APIError, ensure_index
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+class _HashingInput:
+    """wsgi.input wrapper that hashes the request body as the view reads it
+
+    It counts what it hands out so `fingerprint` can drain the rest of the
+    body itself: on a keep-alive socket the raw input never hits EOF, and a
+    fresh `request.stream` would wait for CONTENT_LENGTH more bytes after a
+    form parser already consumed the body through its own stream.
+    """
+    def __init__(self, stream, remaining):
+        self._stream = stream
+        self._remaining = remaining  # bytes left in the body, or None to read to EOF
+        self._hash = hashlib.sha256()
+
+    def _consumed(self, data):
+        self._hash.update(data)
+        if self._remaining is not None:
+            self._remaining -= len(data)
+        return data
+
+    def read(self, *args):
+        return self._consumed(self._stream.read(*args))
+
+    def readline(self, *args):
+        return self._consumed(self._stream.readline(*args))
+
+    @classmethod
+    def install(cls):
+        """Wrap the current request's input; must run before anything reads the body"""
+        environ = request.environ
+        if environ.get('wsgi.input_terminated'):
+            remaining = None
+        else:
+            # Same rule as werkzeug: without a length (and no terminated input) the body is empty
+            remaining = request.content_length or 0
+        hashing = environ['wsgi.input'] = cls(environ['wsgi.input'], remaining)
+        return hashing
+
+    def fingerprint(self):
+        """Hash of the whole body, reading whatever the view left unread"""
+        while self._remaining is None or self._remaining > 0:
+            size = 64 * 1024 if self._remaining is None else min(64 * 1024, self._remaining)
+            if not self.read(size):
+                break
+        return self._hash.hexdigest()
+
+class Idempotency:
+    """Replay stored responses for requests repeated with the same Idempotency-Key
+
+    Completed responses are kept in a TTL-indexed collection, fronted by an
+    in-process LRU. Concurrent duplicates in this process wait for the first
+    one to finish; duplicates arriving at another process while the first is
+    still running get 409 and can retry. A running request holds its key for
+    IDEMPOTENCY_LOCK_TIMEOUT seconds, after which a retry may take it over,
+    so a worker that dies mid-request does not block the key for the whole
+    TTL. The body is hashed as it is read (streamed uploads stay streamed);
+    reusing a key with a different body gets 422.
+    """
+    def __init__(self, app=None, get_db=None):
+        self.get_db = get_db
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, get_db)
+
+    def init_app(self, app, get_db=None):
+        self.app = app
+        if get_db is not None:
+            self.get_db = get_db
+
+    def _collection(self):
+        collection = self.get_db().idempotency_keys
+        ensure_index(collection, 'created_at', expireAfterSeconds=self.app.config['IDEMPOTENCY_TTL'])
+        return collection
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _remember(self, key, stored):
+        with self._lock:
+            self._cache[key] = (monotonic() + self.app.config['IDEMPOTENCY_TTL'], stored)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.app.config['IDEMPOTENCY_CACHE_SIZE']:
+                self._cache.popitem(last=False)
+
+    def forget(self, key=None):
+        """Drop one key (or everything) from the in-process cache"""
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    @staticmethod
+    def _replay(stored, hashing):
+        # Responses stored before bodies were fingerprinted have no hash to compare
+        if stored.get('fingerprint', hashing.fingerprint()) != hashing.fingerprint():
+            raise APIError(f"{IDEMPOTENCY_HEADER} was already used with a different request body", 422)
+        response = Response(stored['body'], status=stored['status'], mimetype=stored['mimetype'])
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _acquire(self, collection, key):
+        """Claim `key` for this request; returns the completed record if there is one"""
+        now = datetime.utcnow()
+        locked_until = now + timedelta(seconds=self.app.config['IDEMPOTENCY_LOCK_TIMEOUT'])
+        try:
+            collection.insert_one({'_id': key, 'status': 'pending', 'locked_until': locked_until, 'created_at': now})
+            return None
+        except DuplicateKeyError:
+            existing = collection.find_one({'_id': key})
+        if existing and existing['status'] == 'completed':
+            return existing
+        # The request holding the key died without finishing: take it over
+        # once its lease has run out (if no other retry got there first)
+        if existing and (existing.get('locked_until') or now) <= now and collection.update_one(
+            {'_id': key, 'status': 'pending', 'locked_until': existing.get('locked_until')},
+            {'$set': {'locked_until': locked_until}}
+        ).modified_count:
+            return None
+        raise APIError('A request with this Idempotency-Key is already in progress', 409, {'Retry-After': '1'})
+
+    def _run_once(self, key, hashing, func, args, kwargs):
+        """Execute the view for `key` unless another process already did"""
+        collection = self._collection()
+        existing = self._acquire(collection, key)
+        if existing is not None:
+            stored = existing['response']
+            self._remember(key, stored)
+            return self._replay(stored, hashing)
+
+        try:
+            response = make_response(func(*args, **kwargs))
+        except BaseException:
+            # Nothing was committed under this key; let the client retry
+            collection.delete_one({'_id': key})
+            raise
+
+        if response.status_code >= 300 or response.is_streamed:
+            collection.delete_one({'_id': key})
+            return response
+
+        stored = {
+            'body': response.get_data(),
+            'status': response.status_code,
+            'mimetype': response.mimetype,
+            'fingerprint': hashing.fingerprint()
+        }
+        collection.update_one({'_id': key}, {'$set': {'status': 'completed', 'response': stored}})
+        self._remember(key, stored)
+        return response
+
+    def __call__(self, func):
+        """Decorator for JWT-protected views; keys are scoped per user and endpoint"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            client_key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not client_key:
+                return func(*args, **kwargs)
+            if len(client_key) > 255:
+                raise APIError(f"{IDEMPOTENCY_HEADER} is too long", 400)
+
+            key = f"{get_jwt_identity()}:{request.endpoint}:{request.path}:{client_key}"
+            hashing = _HashingInput.install()
+            stored = self._cached(key)
+            if stored is not None:
+                return self._replay(stored, hashing)
+
+            with self._lock:
+                event = self._in_flight.get(key)
+                leader = event is None
+                if leader:
+                    event = self._in_flight[key] = threading.Event()
+
+            if not leader:
+                # Collapse into the in-flight request and replay its result
+                event.wait(self.app.config['IDEMPOTENCY_WAIT_TIMEOUT'])
+                stored = self._cached(key)
+                if stored is not None:
+                    return self._replay(stored, hashing)
+                raise APIError('A request with this Idempotency-Key is already in progress', 409, {'Retry-After': '1'})
+
+            try:
+                return self._run_once(key, hashing, func, args, kwargs)
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+                event.set()
+        return wrapper
@@ -0,0 +1,100 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from models import Auction
+from summaries import add_summaries
+from sync import next_update_seq
+from utils import APIError, parse_auction_data
+
+def build_auction_doc(data, seller_id):
+    """Validate one import row and return the auction document to insert"""
+    if not isinstance(data, dict):
+        raise APIError("Row must be a JSON object", 422)
+    doc = Auction(seller_id=seller_id, **parse_auction_data(data)).to_dict()
+    doc['update_seq'] = next_update_seq()
+    return doc
+
+def _validate_row(row, seller_id):
+    index, data = row
+    if isinstance(data, ValueError):
+        return index, None, f"Invalid JSON: {data}"
+    try:
+        return index, build_auction_doc(data, seller_id), None
+    except APIError as e:
+        return index, None, e.message
+
+def _insert_batch(db, validated, errors, sync_summaries):
+    docs = [doc for _, doc, _ in validated if doc is not None]
+    indexes = [index for index, doc, _ in validated if doc is not None]
+    errors.extend({'row': index, 'error': error} for index, _, error in validated if error is not None)
+    if not docs:
+        return 0
+    try:
+        inserted = len(db.auctions.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        failed = set()
+        for write_error in e.details['writeErrors']:
+            failed.add(write_error['index'])
+            errors.append({'row': indexes[write_error['index']], 'error': write_error['errmsg']})
+        docs = [doc for i, doc in enumerate(docs) if i not in failed]
+        inserted = e.details['nInserted']
+    if sync_summaries:
+        add_summaries(db, docs)
+    return inserted
+
+def import_auctions(db, rows, seller_id, batch_size=1000, sync_summaries=True):
+    """Validate and insert auctions from an iterable of request-style dicts
+
+    Rows are validated inline: parse_auction_data is pure Python, so a
+    thread pool would only add overhead under the GIL. Each validated batch
+    is handed to a single writer thread for its unordered insert_many, which
+    waits on the database with the GIL released, so writing one batch
+    overlaps validating the next. Invalid rows are reported and skipped;
+    they never abort the rest of the import. Listing summaries are written
+    per batch unless `sync_summaries` is False (the change stream maintains
+    them).
+    """
+    if not ObjectId.is_valid(str(seller_id)):
+        raise APIError("Invalid user ID format", 422)
+    seller_id = ObjectId(str(seller_id))
+
+    rows = enumerate(rows)
+    inserted = 0
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        writing = None
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            validated = [_validate_row(row, seller_id) for row in batch]
+            if writing is not None:
+                inserted += writing.result()
+            writing = writer.submit(_insert_batch, db, validated, errors, sync_summaries)
+        if writing is not None:
+            inserted += writing.result()
+
+    errors.sort(key=lambda error: error['row'])
+    return {'inserted': inserted, 'errors': errors}
+
+def iter_import_file(f):
+    """Yield rows from a JSON array or NDJSON file; NDJSON is read line by line"""
+    first = f.read(1)
+    while first.isspace():
+        first = f.read(1)
+    if first == '[':
+        yield from json.loads(first + f.read())
+        return
+    for line in chain([first + f.readline()], f):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            # Reported as a row error by import_auctions
+            yield e
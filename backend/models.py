@@ -1,7 +1,11 @@
 from datetime import datetime
 from bson import ObjectId
 
+from utils import utc_now
+
 class User:
+    __slots__ = ('first_name', 'last_name', 'email', 'phone', 'password', 'created_at', 'rating', 'total_sales')
+
     def __init__(self, first_name, last_name, email, phone, password_hash):
         self.first_name = first_name
         self.last_name = last_name
@@ -9,7 +13,7 @@ class User:
         self.phone = phone
         self.password = password_hash
         self.created_at = datetime.utcnow()
-        self.rating = 0 
+        self.rating = 0
         self.total_sales = 0
 
     def to_dict(self):
@@ -25,12 +29,17 @@ class User:
         }
 
 class Auction:
+    __slots__ = (
+        'title', 'description', 'starting_price', 'minimum_increment', 'current_bid', 'end_time',
+        'image_url', 'seller_id', 'category', 'created_at', 'bids'
+    )
+
     def __init__(self, title, description, starting_price, minimum_increment, end_time, seller_id, image_url=None, category=1):
         self.title = title
         self.description = description
         self.starting_price = float(starting_price)
         self.minimum_increment = float(minimum_increment)
-        self.current_bid = float(starting_price)
+        self.current_bid = self.starting_price
         # Ensure end_time is UTC
         if isinstance(end_time, str):
             self.end_time = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
@@ -42,7 +51,7 @@ class Auction:
         # Add category
         self.category = int(category)
         # Ensure created_at is UTC
-        self.created_at = datetime.now(self.end_time.tzinfo)
+        self.created_at = utc_now(self.end_time)
         self.bids = []
 
     def to_dict(self):
@@ -61,8 +70,10 @@ class Auction:
         }
 
 class Bid:
+    __slots__ = ('user_id', 'amount', 'time')
+
     def __init__(self, user_id, amount):
-        self.user_id = ObjectId(user_id)
+        self.user_id = user_id if isinstance(user_id, ObjectId) else ObjectId(user_id)
         self.amount = float(amount)
         self.time = datetime.utcnow()
 
@@ -71,4 +82,4 @@ class Bid:
             'user_id': self.user_id,
             'amount': self.amount,
             'time': self.time
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,220 @@
+import math
+import threading
+from datetime import datetime
+from functools import wraps
+from time import monotonic
+
+from flask import request
+from flask_jwt_extended import get_jwt_identity
+from pymongo import ReturnDocument
+
+from utils import APIError, ensure_index
+
+class MemoryBucketStore:
+    """In-process token buckets
+
+    Each key holds a single float, the time its bucket will be full again
+    (GCRA). A request takes `cost / rate` seconds of that time and is refused
+    while the bucket would be more than `burst / rate` seconds behind. Keys
+    whose bucket has refilled are indistinguishable from new ones, so they
+    are swept out every SWEEP_INTERVAL seconds and memory only holds clients
+    that have been active recently.
+
+    `consume` takes no lock: a lock costs more than the rest of the check.
+    A thread switch between reading and writing the same key can let one
+    extra request through, which is within what a rate limit promises.
+    """
+    SWEEP_INTERVAL = 60  # seconds between sweeps of refilled buckets
+
+    def __init__(self):
+        self._buckets = {}
+        self._sweep_lock = threading.Lock()
+        self._next_sweep = monotonic() + self.SWEEP_INTERVAL
+
+    def _full_at(self, key, rate, burst, cost, now):
+        """Return (seconds to wait, the bucket's full_at once `cost` is taken)"""
+        full_at = self._buckets.get(key, now)
+        if full_at < now:
+            full_at = now
+        full_at += cost / rate
+        wait = full_at - now - burst / rate
+        # not > 0: rounding must not cost the last token of a burst
+        return (wait if wait > 1e-9 else 0), full_at
+
+    def wait(self, key, rate, burst, cost=1):
+        """Return seconds until `cost` tokens are available, without taking them"""
+        return self._full_at(key, rate, burst, cost, monotonic())[0]
+
+    def consume(self, key, rate, burst, cost=1):
+        """Take `cost` tokens from the bucket; return seconds to wait (0 if allowed)"""
+        now = monotonic()
+        wait, full_at = self._full_at(key, rate, burst, cost, now)
+        if wait:
+            return wait
+        self._buckets[key] = full_at
+        if now >= self._next_sweep:
+            self._sweep(now)
+        return 0
+
+    def _sweep(self, now):
+        """Drop the buckets that have refilled"""
+        if not self._sweep_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sweep = now + self.SWEEP_INTERVAL
+            for key, full_at in list(self._buckets.items()):
+                if full_at <= now:
+                    # Keep the key if a request refreshed it meanwhile
+                    if self._buckets.get(key) == full_at:
+                        self._buckets.pop(key, None)
+        finally:
+            self._sweep_lock.release()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def reset(self):
+        self._buckets.clear()
+
+class MongoBucketStore:
+    """Token buckets shared between processes, kept in a MongoDB collection
+
+    A TTL index on `ts` drops buckets that have not been touched for
+    `expire_after` seconds. That must be at least the longest time a
+    configured bucket takes to refill (burst / rate), or a drained bucket
+    could be forgotten, and so refilled, early.
+    """
+    def __init__(self, collection, expire_after=3600):
+        self.collection = collection
+        self.expire_after = expire_after
+
+    def wait(self, key, rate, burst, cost=1):
+        """Return seconds until `cost` tokens are available, without taking them"""
+        bucket = self.collection.find_one({'_id': key}, {'tokens': 1, 'ts': 1})
+        if bucket is None:
+            return 0 if cost <= burst else (cost - burst) / rate
+        elapsed = max((datetime.utcnow() - bucket['ts']).total_seconds(), 0)
+        tokens = min(burst, bucket['tokens'] + elapsed * rate)
+        return 0 if tokens >= cost else (cost - tokens) / rate
+
+    def consume(self, key, rate, burst, cost=1):
+        """Take `cost` tokens from the bucket; return seconds to wait (0 if allowed)"""
+        ensure_index(self.collection, 'ts', expireAfterSeconds=self.expire_after)
+        now = datetime.utcnow()
+        refilled = {'$min': [burst, {'$add': [
+            {'$ifNull': ['$tokens', burst]},
+            {'$multiply': [{'$divide': [{'$subtract': [now, {'$ifNull': ['$ts', now]}]}, 1000]}, rate]}
+        ]}]}
+        bucket = self.collection.find_one_and_update(
+            {'_id': key},
+            [
+                {'$set': {'tokens': refilled, 'ts': now}},
+                {'$set': {
+                    'allowed': {'$gte': ['$tokens', cost]},
+                    'tokens': {'$cond': [{'$gte': ['$tokens', cost]}, {'$subtract': ['$tokens', cost]}, '$tokens']}
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket['allowed']:
+            return 0
+        return (cost - bucket['tokens']) / rate
+
+    def reset(self):
+        self.collection.delete_many({})
+
+class RateLimiter:
+    """Per-route token bucket limits configured through RATE_LIMITS
+
+    A request is only charged once every rule of its route allows it, so a
+    caller refused by its own 'user' limit does not drain a shared 'auction'
+    bucket. Two callers racing for the last tokens may still both be charged
+    for the buckets one of them got.
+
+    Rules are applied before the request is dispatched. 'user' rules need the
+    JWT identity, so routes decorated with `per_user` are only screened there
+    and charged by the decorator under the view's @jwt_required(), which has
+    already decoded the token; routes without it count 'user' rules per
+    client address.
+    """
+    def __init__(self, app=None, store=None):
+        self.store = store
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.store is None:
+            self.store = MemoryBucketStore()
+        self.app = app
+        app.before_request(self.check)
+
+    @staticmethod
+    def _scope_key(req, scope):
+        if scope in ('ip', 'user'):
+            # 'user' rules only get here for views without @per_user
+            return req.remote_addr
+        if scope == 'auction':
+            return (req.view_args or {}).get('id')
+        raise ValueError(f"Unknown rate limit scope: {scope}")
+
+    def _rules(self, endpoint):
+        if not self.app.config.get('RATE_LIMIT_ENABLED', True):
+            return ()
+        return self.app.config.get('RATE_LIMITS', {}).get(endpoint) or ()
+
+    @staticmethod
+    def _reject(wait):
+        if wait:
+            raise APIError('Too many requests', 429, {'Retry-After': str(math.ceil(wait))})
+
+    def _buckets(self, req, rules, identity=None):
+        """Yield (bucket key, rule) for the rules that apply to this request"""
+        for rule in rules:
+            scope = rule['scope']
+            if identity is not None and scope == 'user':
+                scope_key = identity
+            else:
+                scope_key = self._scope_key(req, scope)
+            if scope_key is not None:
+                yield f"{req.endpoint}:{scope}:{scope_key}", rule
+
+    def _wait(self, buckets):
+        return max((self.store.wait(key, rule['rate'], rule['burst']) for key, rule in buckets), default=0)
+
+    def _consume(self, buckets):
+        """Charge every bucket, but only after all of them have the tokens"""
+        if len(buckets) > 1:
+            self._reject(self._wait(buckets))
+        self._reject(max(
+            (self.store.consume(key, rule['rate'], rule['burst']) for key, rule in buckets), default=0
+        ))
+
+    def check(self):
+        """before_request hook: reject the request with 429 once a bucket runs dry"""
+        # Every `request.<attr>` resolves the context again; do it once
+        req = request._get_current_object()
+        rules = self._rules(req.endpoint)
+        if not rules:
+            return
+        if getattr(self.app.view_functions.get(req.endpoint), 'rate_limited_per_user', False):
+            # Turn away requests a shared bucket refuses before their JWT is
+            # decoded; per_user charges the buckets once the user is known
+            self._reject(self._wait([
+                bucket for bucket in self._buckets(req, rules) if bucket[1]['scope'] != 'user'
+            ]))
+            return
+        self._consume(list(self._buckets(req, rules)))
+
+    def per_user(self, func):
+        """Decorator applying the route's rules, 'user' ones to the identity of its JWT"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            req = request._get_current_object()
+            rules = self._rules(req.endpoint)
+            if rules:
+                identity = get_jwt_identity() or req.remote_addr
+                self._consume(list(self._buckets(req, rules, identity)))
+            return func(*args, **kwargs)
+        wrapper.rate_limited_per_user = True
+        return wrapper
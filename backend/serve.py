@@ -0,0 +1,82 @@
+"""Run the API with several worker processes sharing one listening socket
+
+    python serve.py --workers 4 --port 5000
+
+The parent binds the socket, forks the workers and relays events between
+them (EVENT_BUS=ipc). Set EVENT_BUS=mongo to share events through MongoDB
+change streams instead, e.g. when workers run on more than one host. With
+more than one worker the hot auction bid book is off and rate limits are
+kept in MongoDB (RATE_LIMIT_STORE=mongo).
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from events import relay_events, set_worker_connection
+
+def run_worker(sock, host, port, connection):
+    set_worker_connection(connection)
+    # Import after fork so every worker gets its own MongoClient and in-memory state
+    from werkzeug.serving import make_server
+    from app import app, bid_book, counters, summaries, event_bus
+
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+    # Forked workers exit without running atexit handlers; stop the background
+    # workers here so the bid book and counters write out what they still hold
+    bid_book.stop()
+    counters.stop()
+    summaries.stop()
+    event_bus.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if os.getenv('STORAGE_BACKEND') == 'memory':
+            parser.error("STORAGE_BACKEND=memory keeps data inside one process; use --workers 1")
+        if os.getenv('RATE_LIMIT_STORE') == 'memory':
+            parser.error("RATE_LIMIT_STORE=memory would let each worker allow the full limit; use mongo")
+        os.environ.setdefault('RATE_LIMIT_STORE', 'mongo')
+    # A single worker keeps the local bus, and with it the bid book
+    os.environ.setdefault('EVENT_BUS', 'ipc' if args.workers > 1 else 'local')
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    context = multiprocessing.get_context('fork')
+    workers, parent_ends = [], []
+    for _ in range(args.workers):
+        parent_end, worker_end = context.Pipe()
+        worker = context.Process(target=run_worker, args=(sock, args.host, args.port, worker_end))
+        worker.start()
+        workers.append(worker)
+        parent_ends.append(parent_end)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers", flush=True)
+
+    stopped = threading.Event()
+    def shutdown(*_):
+        stopped.set()
+        for worker in workers:
+            worker.terminate()
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    if os.environ['EVENT_BUS'] == 'ipc':
+        relay_events(parent_ends, stopped)
+    for worker in workers:
+        worker.join()
+
+if __name__ == '__main__':
+    main()
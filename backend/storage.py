@@ -0,0 +1,878 @@
+"""Storage backends: MongoDB, or an indexed in-process database
+
+The helpers in utils.py and the other modules talk to the database through
+the pymongo collection API. STORAGE_BACKEND='memory' swaps in MemoryClient,
+which implements the part of that API the app uses on top of plain dicts:
+
+- documents are kept BSON-encoded and decoded on read, so callers get
+  copies with MongoDB's semantics (millisecond datetimes, naive UTC)
+- `_id` lookups go straight to the dict, and every index declared with
+  `create_index` (e.g. through `ensure_index`) keeps a hash of its leading
+  field plus a sorted list of its values, so equality, `$in` and range
+  filters only look at the documents the index points to
+- unique indexes raise DuplicateKeyError and TTL indexes expire documents
+  once a minute, like MongoDB's TTL monitor
+
+Filters are evaluated and aggregation pipelines run by mongomock's query
+engine, on the candidate documents only. Change streams are not supported:
+keep SUMMARY_SYNC='writes' and EVENT_BUS='local' with this backend.
+"""
+import bisect
+import operator
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from time import monotonic
+
+import bson
+from bson import ObjectId
+from pymongo import InsertOne, MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, InvalidOperation, OperationFailure, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+from utils import forget_indexes
+
+try:
+    from mongomock.aggregate import process_pipeline
+    from mongomock.filtering import bson_compare, filter_applies, resolve_sort_key
+except ImportError:
+    process_pipeline = None
+
+STORAGE_BACKENDS = ('mongo', 'memory')
+
+# How often TTL indexes are swept; MongoDB's TTL monitor also runs every 60 seconds
+TTL_SWEEP_INTERVAL = 60
+
+def connect(config):
+    """Return the database for the configured STORAGE_BACKEND
+
+    'mongo' connects to MONGODB_URI. 'memory' is a MemoryClient database
+    inside this process: nothing to install or start, but data is lost on
+    exit and it is not shared between worker processes.
+    """
+    backend = config['STORAGE_BACKEND']
+    if backend == 'mongo':
+        return MongoClient(config['MONGODB_URI'])[config['DATABASE_NAME']]
+    if backend == 'memory':
+        if process_pipeline is None:
+            raise RuntimeError("STORAGE_BACKEND=memory requires the mongomock package")
+        return MemoryClient()[config['DATABASE_NAME']]
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
+
+def clear_database(db):
+    """Drop every collection, e.g. between tests or benchmark runs"""
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+    forget_indexes(db)
+
+# Values
+
+def _naive_utc(value):
+    """Convert aware datetimes in a filter to naive UTC, as stored documents hold them"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(value, dict):
+        return {key: _naive_utc(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_naive_utc(item) for item in value]
+    return value
+
+def _rank(value):
+    """Sort bracket of an indexable value (values only compare within one), or None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return 1
+    if isinstance(value, str):
+        return 2
+    if isinstance(value, ObjectId):
+        return 3
+    if isinstance(value, datetime):
+        return 4
+    return None
+
+def _lookup_value(value):
+    """Whether an index can look `value` up by equality"""
+    return value is None or isinstance(value, bool) or _rank(value) is not None
+
+def _values_at(doc, path):
+    """Leaf values at a dotted path, descending into arrays like a multikey index"""
+    values = [doc]
+    for part in path.split('.'):
+        found = []
+        for value in values:
+            if isinstance(value, dict):
+                if part in value:
+                    found.append(value[part])
+            elif isinstance(value, list):
+                if part.isdigit() and int(part) < len(value):
+                    found.append(value[int(part)])
+                found.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+        values = found
+    if not values:
+        return [None]
+    leaves = []
+    for value in values:
+        leaves.extend(value if isinstance(value, list) else [value])
+    return leaves
+
+def _walk(doc, path, create=True):
+    """Return the container holding the last part of `path` and that part"""
+    parts = path.split('.')
+    target = doc
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            try:
+                target = target[int(part)]
+            except (ValueError, IndexError):
+                raise WriteError(f"Cannot use the part ({part}) of ({path}) to traverse the array", 28)
+        elif isinstance(target, dict):
+            if part not in target:
+                if not create:
+                    return None, None
+                target[part] = {}
+            target = target[part]
+        else:
+            raise WriteError(f"Cannot create field '{part}' in element {target!r}", 28)
+    last = parts[-1]
+    if isinstance(target, list):
+        try:
+            last = int(last)
+        except ValueError:
+            raise WriteError(f"Cannot use the part ({last}) of ({path}) to traverse the array", 28)
+        if last >= len(target):
+            target.extend([None] * (last + 1 - len(target)))
+    return target, last
+
+def _get(container, key, default=None):
+    if isinstance(container, list):
+        return container[key] if key < len(container) else default
+    return container.get(key, default)
+
+def _conditions(filter):
+    """(field, condition) pairs that must all hold, looking into top-level $and"""
+    for field, condition in filter.items():
+        if field == '$and':
+            for clause in condition:
+                yield from _conditions(clause)
+        elif not field.startswith('$'):
+            yield field, condition
+
+def _is_operator_doc(condition):
+    return isinstance(condition, dict) and any(key.startswith('$') for key in condition)
+
+# Updates
+
+def _push(container, key, path, values, unique=False):
+    current = _get(container, key)
+    if current is None:
+        current = container[key] = []
+    if not isinstance(current, list):
+        raise WriteError(f"The field '{path}' must be an array", 2)
+    for value in values:
+        if not unique or value not in current:
+            current.append(value)
+
+def _each(value):
+    if isinstance(value, dict) and '$each' in value:
+        if len(value) > 1:
+            raise NotImplementedError(f"Push modifiers other than $each are not supported: {sorted(value)}")
+        return value['$each']
+    return [value]
+
+def _apply_update(doc, update, inserting=False):
+    """Apply an update document (or pipeline) to `doc` and return the result"""
+    if isinstance(update, list):
+        return next(iter(process_pipeline([doc], None, update, None)))
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        for path, value in fields.items():
+            container, key = _walk(doc, path, create=op != '$unset')
+            if container is None:
+                continue
+            if op in ('$set', '$setOnInsert'):
+                container[key] = value
+            elif op == '$unset':
+                if isinstance(container, dict):
+                    container.pop(key, None)
+                elif key < len(container):
+                    container[key] = None
+            elif op == '$inc':
+                current = _get(container, key, 0)
+                if not isinstance(current, (int, float)) or isinstance(current, bool):
+                    raise WriteError(f"Cannot apply $inc to a value of non-numeric type at '{path}'", 14)
+                container[key] = current + value
+            elif op in ('$max', '$min'):
+                current = _get(container, key)
+                compare = operator.gt if op == '$max' else operator.lt
+                if current is None or bson_compare(compare, value, current):
+                    container[key] = value
+            elif op == '$push':
+                _push(container, key, path, _each(value))
+            elif op == '$addToSet':
+                _push(container, key, path, _each(value), unique=True)
+            else:
+                raise NotImplementedError(f"{op} is not supported by the memory backend")
+    return doc
+
+def _upsert_seed(filter):
+    """The document an upsert starts from: the filter's equality conditions"""
+    doc = {}
+    for field, condition in _conditions(filter):
+        if isinstance(condition, dict) and set(condition) == {'$eq'}:
+            condition = condition['$eq']
+        elif _is_operator_doc(condition):
+            continue
+        container, key = _walk(doc, field)
+        container[key] = condition
+    return doc
+
+# Projections
+
+def _include(value, parts):
+    """The part of `value` a dotted inclusion projection keeps, or None"""
+    if isinstance(value, list):
+        return [_include(item, parts) or {} for item in value if isinstance(item, dict)]
+    if not isinstance(value, dict) or parts[0] not in value:
+        return None
+    if len(parts) == 1:
+        return {parts[0]: value[parts[0]]}
+    inner = _include(value[parts[0]], parts[1:])
+    return None if inner is None else {parts[0]: inner}
+
+def _merge(target, source):
+    for key, value in source.items():
+        current = target.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            _merge(current, value)
+        elif isinstance(value, list) and isinstance(current, list):
+            for into, item in zip(current, value):
+                _merge(into, item)
+        else:
+            target[key] = value
+
+def _exclude(value, parts):
+    if isinstance(value, list):
+        for item in value:
+            _exclude(item, parts)
+    elif isinstance(value, dict) and parts[0] in value:
+        if len(parts) == 1:
+            del value[parts[0]]
+        else:
+            _exclude(value[parts[0]], parts[1:])
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    if not isinstance(projection, dict):
+        projection = {field: 1 for field in projection}
+    fields = {field: value for field, value in projection.items() if field != '_id'}
+    if any(isinstance(value, dict) for value in fields.values()):
+        raise NotImplementedError("Projection operators are not supported by the memory backend; use aggregate")
+    include_id = projection.get('_id', 1)
+    if fields and all(fields.values()):
+        projected = {'_id': doc['_id']} if include_id and '_id' in doc else {}
+        for field in fields:
+            kept = _include(doc, field.split('.'))
+            if kept is not None:
+                _merge(projected, kept)
+        return projected
+    for field in fields:
+        _exclude(doc, field.split('.'))
+    if not include_id:
+        doc.pop('_id', None)
+    return doc
+
+# Indexes
+
+class _Index:
+    """A declared index: hash and sorted values of its leading field, unique keys, TTL"""
+    def __init__(self, name, keys, unique=False, ttl=None):
+        self.name = name
+        self.keys = keys
+        self.field = keys[0][0]
+        self.unique = {} if unique else None  # key tuple -> row
+        self.ttl = ttl
+        self._buckets = defaultdict(set)  # leading field value -> rows
+        self._sorted = []  # distinct (rank, value) of rankable values
+        self._odd = set()  # rows with values the index can't file (embedded documents)
+        self._filed = {}  # row -> values filed under
+
+    def unique_key(self, doc):
+        return tuple(repr(_values_at(doc, field)) for field, _ in self.keys)
+
+    def add(self, row, doc):
+        filed = []
+        for value in _values_at(doc, self.field):
+            if _lookup_value(value):
+                self._buckets[value].add(row)
+                if _rank(value) is not None:
+                    self._insert_sorted((_rank(value), value))
+                filed.append(value)
+            else:
+                self._odd.add(row)
+        self._filed[row] = filed
+        if self.unique is not None:
+            self.unique[self.unique_key(doc)] = row
+
+    def remove(self, row, doc):
+        for value in self._filed.pop(row, ()):
+            bucket = self._buckets.get(value)
+            if bucket is None:
+                continue
+            bucket.discard(row)
+            if not bucket:
+                del self._buckets[value]
+                if _rank(value) is not None:
+                    self._remove_sorted((_rank(value), value))
+        self._odd.discard(row)
+        if self.unique is not None and self.unique.get(self.unique_key(doc)) == row:
+            del self.unique[self.unique_key(doc)]
+
+    def move(self, row, old, new):
+        """Re-file a document after an update, unless its indexed values stayed the same"""
+        if _values_at(old, self.field) == _values_at(new, self.field) and (
+                self.unique is None or self.unique_key(old) == self.unique_key(new)):
+            return
+        self.remove(row, old)
+        self.add(row, new)
+
+    def _insert_sorted(self, key):
+        position = bisect.bisect_left(self._sorted, key)
+        if position == len(self._sorted) or self._sorted[position] != key:
+            self._sorted.insert(position, key)
+
+    def _remove_sorted(self, key):
+        position = bisect.bisect_left(self._sorted, key)
+        if position < len(self._sorted) and self._sorted[position] == key:
+            del self._sorted[position]
+
+    def candidates(self, condition):
+        """(rows of every document that may match `condition`, whether all of them do), or None to scan"""
+        if not _is_operator_doc(condition):
+            condition = {'$eq': condition}
+        if '$eq' in condition:
+            values = [condition['$eq']]
+        elif '$in' in condition:
+            values = condition['$in']
+        else:
+            rows = self._range(condition)
+            return None if rows is None else (rows, False)
+        if not all(_lookup_value(value) for value in values):
+            return None
+        rows = set(self._odd)
+        for value in values:
+            rows |= self._buckets.get(value, set())
+        # Buckets hold exact matches, except null, which also matches missing fields and arrays
+        exact = len(condition) == 1 and not self._odd and all(_rank(value) is not None for value in values)
+        return rows, exact
+
+    def _range(self, condition):
+        bounds = [(op, condition[op]) for op in ('$gt', '$gte', '$lt', '$lte') if op in condition]
+        ranks = {_rank(value) for _, value in bounds}
+        if not bounds or len(ranks) != 1 or None in ranks:
+            return None
+        rank = ranks.pop()
+        low, high = bisect.bisect_left(self._sorted, (rank,)), bisect.bisect_left(self._sorted, (rank + 1,))
+        for op, value in bounds:
+            if op == '$gt':
+                low = max(low, bisect.bisect_right(self._sorted, (rank, value)))
+            elif op == '$gte':
+                low = max(low, bisect.bisect_left(self._sorted, (rank, value)))
+            elif op == '$lt':
+                high = min(high, bisect.bisect_left(self._sorted, (rank, value)))
+            else:
+                high = min(high, bisect.bisect_right(self._sorted, (rank, value)))
+        rows = set(self._odd)
+        for _, value in self._sorted[low:high]:
+            rows |= self._buckets.get(value, set())
+        return rows
+
+class _Store:
+    """Documents of one collection with their indexes
+
+    Each document gets a row number when it is inserted. Indexes file rows
+    rather than _ids, so sorting candidate rows gives the natural order.
+    """
+    def __init__(self):
+        self.rows = {}  # _id -> row
+        self.docs = {}  # row -> decoded document, never handed out
+        self.raw = {}  # row -> BSON bytes, decoded into copies for callers
+        self.indexes = {}  # name -> _Index
+        self.next_sweep = 0
+        self._counter = count()
+
+    def index_for(self, field):
+        for index in self.indexes.values():
+            if index.field == field:
+                return index
+        return None
+
+    def plan(self, filter):
+        """Candidate rows for `filter` in natural order and whether they all match, or None to scan"""
+        best = None
+        for field, condition in _conditions(filter):
+            if field == '_id':
+                candidates = self._id_candidates(condition)
+            else:
+                index = self.index_for(field)
+                candidates = index.candidates(condition) if index else None
+            if candidates is not None and (best is None or len(candidates[0]) < len(best[0])):
+                best = candidates
+        if best is None:
+            return None
+        rows, exact = best
+        # A lone top-level equality condition answered by a hash needs no further matching
+        exact = exact and len(filter) == 1 and not next(iter(filter)).startswith('$')
+        return sorted(row for row in rows if row in self.docs), exact
+
+    def _id_candidates(self, condition):
+        if not _is_operator_doc(condition):
+            ids, exact = [condition], True
+        elif set(condition) == {'$eq'}:
+            ids, exact = [condition['$eq']], True
+        elif '$in' in condition:
+            ids, exact = condition['$in'], len(condition) == 1
+        else:
+            return None
+        try:
+            return {self.rows[doc_id] for doc_id in ids if doc_id in self.rows}, exact
+        except TypeError:  # unhashable _id such as an embedded document
+            return None
+
+    def check_unique(self, row, doc):
+        for index in self.indexes.values():
+            if index.unique is None:
+                continue
+            owner = index.unique.get(index.unique_key(doc))
+            if owner is not None and owner != row:
+                raise DuplicateKeyError(f"E11000 duplicate key error index: {index.name}", 11000)
+
+    def put(self, row, doc, raw):
+        """Store a new document (row None) or a new version of one; returns its row"""
+        self.check_unique(row, doc)
+        if row is None:
+            row = self.rows[doc['_id']] = next(self._counter)
+            for index in self.indexes.values():
+                index.add(row, doc)
+        else:
+            for index in self.indexes.values():
+                index.move(row, self.docs[row], doc)
+        self.docs[row] = doc
+        self.raw[row] = raw
+        return row
+
+    def delete(self, row):
+        doc = self.docs.pop(row)
+        del self.raw[row]
+        del self.rows[doc['_id']]
+        for index in self.indexes.values():
+            index.remove(row, doc)
+
+def _sorted(matches, key, reverse):
+    """Sort (row, document) pairs on one key with MongoDB's ordering"""
+    values = [doc.get(key) for _, doc in matches] if '.' not in key else None
+    ranks = {_rank(value) for value in values or ()}
+    if len(ranks) == 1 and None not in ranks:
+        # One plain type (and no missing values): compare the values directly
+        order = sorted(range(len(matches)), key=values.__getitem__, reverse=reverse)
+        return [matches[position] for position in order]
+    return sorted(matches, key=lambda match: resolve_sort_key(key, match[1]), reverse=reverse)
+
+# Client, database, collection
+
+def _encode(doc):
+    """Encode a document the way MongoDB would store it; returns (decoded, raw)"""
+    raw = bson.encode(doc)
+    return bson.decode(raw), raw
+
+def _index_keys(keys, direction=1):
+    if isinstance(keys, str):
+        return [(keys, direction)]
+    return [(key, value) for key, value in keys]
+
+class MemoryCursor:
+    """The part of pymongo's Cursor the app uses: sort, skip, limit and iteration"""
+    def __init__(self, collection, filter=None, projection=None, sort=None, skip=0, limit=0, **kwargs):
+        self._collection = collection
+        self._filter = filter or {}
+        self._projection = projection
+        self._sort = []
+        self._skip = skip
+        self._limit = limit
+        self._results = None
+        if sort:
+            self.sort(sort)
+
+    def sort(self, key_or_list, direction=1):
+        self._sort = _index_keys(key_or_list, direction)
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._results is None:
+            self._results = iter(self._collection._query(self._filter, self._projection, self._sort, self._skip, self._limit))
+        return next(self._results)
+
+    def close(self):
+        self._results = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class MemoryCollection:
+    """pymongo Collection API backed by a _Store; see the module docstring"""
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+
+    @property
+    def _lock(self):
+        return self.database.client._lock
+
+    def _store(self, create=False):
+        stores = self.database._stores
+        if create and self.name not in stores:
+            stores[self.name] = _Store()
+        store = stores.get(self.name)
+        if store is not None and store.next_sweep <= monotonic():
+            self._expire(store)
+        return store
+
+    def _expire(self, store):
+        store.next_sweep = monotonic() + TTL_SWEEP_INTERVAL
+        now = datetime.utcnow()
+        for index in store.indexes.values():
+            if index.ttl is None:
+                continue
+            cutoff = now - timedelta(seconds=index.ttl)
+            expired = index.candidates({'$lt': cutoff})
+            for row in expired[0] if expired else ():
+                if row in store.docs and filter_applies({index.field: {'$lt': cutoff}}, store.docs[row]):
+                    store.delete(row)
+
+    def _matches(self, store, filter):
+        """(row, stored document) pairs matching `filter`, in natural order"""
+        if store is None:
+            return
+        filter = _naive_utc(filter or {})
+        if not isinstance(filter, dict):
+            filter = {'_id': filter}
+        plan = store.plan(filter)
+        rows, exact = plan if plan is not None else (list(store.docs), False)
+        for row in rows:
+            doc = store.docs[row]
+            if exact or filter_applies(filter, doc):
+                yield row, doc
+
+    # Reads
+
+    def _query(self, filter, projection=None, sort=None, skip=0, limit=0):
+        with self._lock:
+            store = self._store()
+            matches = list(self._matches(store, filter))
+            for key, direction in reversed(sort or ()):
+                matches = _sorted(matches, key, direction < 0)
+            matches = matches[skip:skip + limit if limit else None]
+            return [_project(bson.decode(store.raw[row]), projection) for row, _ in matches]
+
+    def find(self, filter=None, projection=None, **kwargs):
+        return MemoryCursor(self, filter, projection, **kwargs)
+
+    def find_one(self, filter=None, projection=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        kwargs['limit'] = 1
+        return next(iter(self.find(filter, projection, **kwargs)), None)
+
+    def count_documents(self, filter, skip=0, limit=0, **kwargs):
+        with self._lock:
+            matches = sum(1 for _ in self._matches(self._store(), filter))
+        matches = max(0, matches - skip)
+        return min(matches, limit) if limit else matches
+
+    def estimated_document_count(self, **kwargs):
+        with self._lock:
+            store = self._store()
+            return len(store.docs) if store else 0
+
+    def distinct(self, key, filter=None, **kwargs):
+        values = []
+        with self._lock:
+            for _, doc in self._matches(self._store(), filter):
+                for value in _values_at(doc, key):
+                    if value not in values:
+                        values.append(value)
+        return values
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        with self._lock:
+            store = self._store()
+            first = pipeline[0].get('$match') if pipeline else None
+            docs = [bson.decode(store.raw[row]) for row, _ in self._matches(store, first)] if store else []
+        return process_pipeline(docs, self.database, pipeline[1:] if first is not None else pipeline, session)
+
+    def watch(self, *args, **kwargs):
+        raise NotImplementedError("Change streams need MongoDB; the memory backend does not support watch()")
+
+    # Writes
+
+    def _insert(self, store, document):
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        doc, raw = _encode(document)
+        if doc['_id'] in store.rows:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: _id_", 11000)
+        store.put(None, doc, raw)
+        return doc['_id']
+
+    def _update(self, store, filter, update, upsert=False, multi=False, replace=False):
+        """Apply one update; returns (matched, modified, upserted _id or None)"""
+        if not replace and isinstance(update, dict) and not _is_operator_doc(update):
+            raise ValueError("update only works with $ operators")
+        matched = modified = 0
+        for row, current in list(self._matches(store, filter)):
+            matched += 1
+            if replace:
+                new = dict(update, _id=current['_id'])
+            else:
+                new = _apply_update(bson.decode(store.raw[row]), update)
+            if new.get('_id') != current['_id']:
+                raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+            doc, raw = _encode(new)
+            if raw != store.raw[row]:
+                store.put(row, doc, raw)
+                modified += 1
+            if not multi:
+                break
+        if matched or not upsert:
+            return matched, modified, None
+        seed = _upsert_seed(_naive_utc(filter))
+        if replace:
+            new = dict(update, _id=seed['_id']) if '_id' in seed else dict(update)
+        else:
+            new = _apply_update(seed, update, inserting=True)
+        if '_id' not in new:
+            new = {'_id': ObjectId(), **new}
+        return 0, 0, self._insert(store, new)
+
+    def insert_one(self, document, **kwargs):
+        with self._lock:
+            return InsertOneResult(self._insert(self._store(create=True), document), True)
+
+    def insert_many(self, documents, ordered=True, **kwargs):
+        documents = list(documents)
+        self.bulk_write([InsertOne(document) for document in documents], ordered=ordered)
+        return InsertManyResult([document['_id'] for document in documents], True)
+
+    def update_one(self, filter, update, upsert=False, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(self._store(create=True), filter, update, upsert)
+        return UpdateResult({'n': matched or int(upserted is not None), 'nModified': modified, 'upserted': upserted}, True)
+
+    def update_many(self, filter, update, upsert=False, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(self._store(create=True), filter, update, upsert, multi=True)
+        return UpdateResult({'n': matched or int(upserted is not None), 'nModified': modified, 'upserted': upserted}, True)
+
+    def replace_one(self, filter, replacement, upsert=False, **kwargs):
+        with self._lock:
+            matched, modified, upserted = self._update(self._store(create=True), filter, replacement, upsert, replace=True)
+        return UpdateResult({'n': matched or int(upserted is not None), 'nModified': modified, 'upserted': upserted}, True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, **kwargs):
+        with self._lock:
+            store = self._store(create=True)
+            before = None
+            for row, _ in self._matches(store, filter):
+                before = bson.decode(store.raw[row])
+                filter = {'_id': before['_id']}
+                break
+            _, _, upserted = self._update(store, filter, update, upsert)
+            if return_document == ReturnDocument.BEFORE:
+                return before and _project(before, projection)
+            row = store.rows.get(upserted if upserted is not None else (before or {}).get('_id'))
+            if row is None:
+                return None
+            return _project(bson.decode(store.raw[row]), projection)
+
+    def _delete(self, store, filter, multi):
+        deleted = 0
+        for row, _ in list(self._matches(store, filter)):
+            store.delete(row)
+            deleted += 1
+            if not multi:
+                break
+        return deleted
+
+    def delete_one(self, filter, **kwargs):
+        with self._lock:
+            return DeleteResult({'n': self._delete(self._store(), filter, False)}, True)
+
+    def delete_many(self, filter, **kwargs):
+        with self._lock:
+            return DeleteResult({'n': self._delete(self._store(), filter, True)}, True)
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        bulk = _Bulk()
+        requests = list(requests)
+        if not requests:
+            raise InvalidOperation('No operations to execute')
+        for request in requests:
+            # pymongo's write models describe themselves to a bulk builder
+            request._add_to_bulk(bulk)
+        result = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0,
+                  'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        with self._lock:
+            store = self._store(create=True)
+            for position, (kind, args) in enumerate(bulk.operations):
+                try:
+                    if kind == 'insert':
+                        self._insert(store, args[0])
+                        result['nInserted'] += 1
+                    elif kind == 'delete':
+                        result['nRemoved'] += self._delete(store, *args)
+                    else:
+                        matched, modified, upserted = self._update(store, *args)
+                        result['nMatched'] += matched
+                        result['nModified'] += modified
+                        if upserted is not None:
+                            result['nUpserted'] += 1
+                            result['upserted'].append({'index': position, '_id': upserted})
+                except (DuplicateKeyError, WriteError) as e:
+                    result['writeErrors'].append({'index': position, 'code': e.code, 'errmsg': str(e), 'op': args[0]})
+                    if ordered:
+                        break
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # Indexes and collection management
+
+    def create_index(self, keys, unique=False, expireAfterSeconds=None, name=None, **kwargs):
+        keys = _index_keys(keys)
+        name = name or '_'.join(f"{key}_{direction}" for key, direction in keys)
+        with self._lock:
+            store = self._store(create=True)
+            if name in store.indexes:
+                return name
+            index = _Index(name, keys, unique, expireAfterSeconds)
+            for row, doc in store.docs.items():
+                if index.unique is not None and index.unique.get(index.unique_key(doc)) not in (None, row):
+                    raise DuplicateKeyError(f"E11000 duplicate key error index: {name}", 11000)
+                index.add(row, doc)
+            store.indexes[name] = index
+            if expireAfterSeconds is not None:
+                store.next_sweep = 0
+        return name
+
+    def index_information(self):
+        with self._lock:
+            store = self._store()
+            info = {'_id_': {'key': [('_id', 1)]}}
+            for index in (store.indexes.values() if store else ()):
+                info[index.name] = {'key': index.keys}
+                if index.unique is not None:
+                    info[index.name]['unique'] = True
+                if index.ttl is not None:
+                    info[index.name]['expireAfterSeconds'] = index.ttl
+            return info
+
+    def rename(self, new_name, dropTarget=False, **kwargs):
+        with self._lock:
+            stores = self.database._stores
+            if self.name not in stores:
+                raise OperationFailure("source namespace does not exist", 26)
+            if new_name in stores and not dropTarget:
+                raise OperationFailure("target namespace exists", 48)
+            stores[new_name] = stores.pop(self.name)
+
+    def drop(self):
+        self.database.drop_collection(self.name)
+
+class _Bulk:
+    """Receives pymongo write models through their _add_to_bulk protocol"""
+    def __init__(self):
+        self.operations = []
+
+    def add_insert(self, document):
+        self.operations.append(('insert', (document,)))
+
+    def add_update(self, selector, update, multi=False, upsert=False, **kwargs):
+        self.operations.append(('update', (selector, update, upsert, multi)))
+
+    def add_replace(self, selector, replacement, upsert=False, **kwargs):
+        self.operations.append(('update', (selector, replacement, upsert, False, True)))
+
+    def add_delete(self, selector, limit, **kwargs):
+        self.operations.append(('delete', (selector, limit != 1)))
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._stores = {}  # collection name -> _Store, created on first write
+        self._collections = {}
+
+    def __getitem__(self, name):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections.setdefault(name, MemoryCollection(self, name))
+        return collection
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    def list_collection_names(self, **kwargs):
+        with self.client._lock:
+            return list(self._stores)
+
+    def drop_collection(self, name_or_collection, **kwargs):
+        name = getattr(name_or_collection, 'name', name_or_collection)
+        with self.client._lock:
+            self._stores.pop(name, None)
+
+class MemoryClient:
+    """In-process stand-in for MongoClient; one lock serializes its operations"""
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._databases = {}
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = MemoryDatabase(self, name)
+            return self._databases[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def close(self):
+        pass
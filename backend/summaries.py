@@ -0,0 +1,234 @@
+import threading
+
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from counters import COUNTER_FIELDS
+from sync import TOMBSTONE_COLLECTION, current_cursor
+from utils import ensure_index
+
+SUMMARY_COLLECTION = 'auction_summaries'
+
+# Listing fields computed from an auction document, without its bids or image data
+SUMMARY_PROJECTION = {
+    'title': 1,
+    'current_bid': 1,
+    'starting_price': 1,
+    'end_time': 1,
+    'category': 1,
+    'seller_id': 1,
+    'created_at': 1,
+    'update_seq': 1,
+    'bid_count': {'$size': {'$ifNull': ['$bids', []]}},
+    'view_count': {'$ifNull': ['$view_count', 0]},
+    'watcher_count': {'$ifNull': ['$watcher_count', 0]},
+    'has_image': {'$cond': [{'$ifNull': ['$image_url', False]}, True, False]}
+}
+COMPUTED_FIELDS = ('bid_count', 'view_count', 'watcher_count', 'has_image')
+
+SUMMARY_INDEXES = [
+    [('seller_id', 1), ('_id', 1)],
+    [('category', 1), ('_id', 1)],
+    [('end_time', 1)],
+    [('update_seq', 1)],
+    [('view_count', -1), ('_id', 1)],
+    [('watcher_count', -1), ('_id', 1)]
+]
+
+def thumbnail_url(auction_id):
+    return f"/api/auctions/{auction_id}/image"
+
+def _finish(summary):
+    summary['thumbnail_url'] = thumbnail_url(summary['_id']) if summary.pop('has_image') else None
+    return summary
+
+def summarize(auction):
+    """Build the summary of an auction document that is already in memory"""
+    # Like the $project in _summary_cursor, fields missing from the auction are left out
+    summary = {
+        key: auction[key] for key in SUMMARY_PROJECTION
+        if key in auction and key not in COMPUTED_FIELDS
+    }
+    summary['_id'] = auction['_id']
+    summary['bid_count'] = len(auction.get('bids') or ())
+    summary['view_count'] = auction.get('view_count', 0)
+    summary['watcher_count'] = auction.get('watcher_count', 0)
+    summary['has_image'] = bool(auction.get('image_url'))
+    return _finish(summary)
+
+def summaries_collection(db):
+    collection = db[SUMMARY_COLLECTION]
+    for keys in SUMMARY_INDEXES:
+        ensure_index(collection, keys)
+    return collection
+
+def _summary_cursor(db, auction_ids=None, batch_size=1000):
+    pipeline = [{'$project': SUMMARY_PROJECTION}]
+    if auction_ids is not None:
+        pipeline.insert(0, {'$match': {'_id': {'$in': list(auction_ids)}}})
+    return (_finish(summary) for summary in db.auctions.aggregate(pipeline, batchSize=batch_size))
+
+def add_summaries(db, auctions):
+    """Write summaries for freshly inserted auction documents"""
+    requests = [ReplaceOne({'_id': auction['_id']}, summarize(auction), upsert=True) for auction in auctions]
+    if requests:
+        summaries_collection(db).bulk_write(requests, ordered=False)
+
+def refresh_summaries(db, auction_ids):
+    """Recompute summaries from the auctions collection; removes those of deleted auctions"""
+    auction_ids = list(auction_ids)
+    if not auction_ids:
+        return
+    collection = summaries_collection(db)
+    summaries = list(_summary_cursor(db, auction_ids))
+    if summaries:
+        collection.bulk_write([
+            ReplaceOne({'_id': summary['_id']}, summary, upsert=True) for summary in summaries
+        ], ordered=False)
+    found = {summary['_id'] for summary in summaries}
+    missing = [auction_id for auction_id in auction_ids if auction_id not in found]
+    if missing:
+        collection.delete_many({'_id': {'$in': missing}})
+
+def record_bid(db, auction_id, amount, update_seq, end_time=None):
+    """Apply one accepted bid, and the soft-close extension it made, to an auction's summary"""
+    maximums = {'current_bid': amount, 'update_seq': update_seq}
+    if end_time:
+        maximums['end_time'] = end_time
+    summaries_collection(db).update_one({'_id': auction_id}, {'$max': maximums, '$inc': {'bid_count': 1}})
+
+def copy_counters(db, auction_ids):
+    """Copy view and watcher counts into summaries, leaving their other fields alone
+
+    Unlike refresh_summaries this never writes back a current_bid read before
+    a concurrent record_bid raised it.
+    """
+    requests = [
+        UpdateOne({'_id': auction['_id']}, {'$set': {field: auction.get(field, 0) for field in COUNTER_FIELDS}})
+        for auction in db.auctions.find({'_id': {'$in': list(auction_ids)}}, dict.fromkeys(COUNTER_FIELDS, 1))
+    ]
+    if requests:
+        summaries_collection(db).bulk_write(requests, ordered=False)
+
+def rebuild_summaries(db, batch_size=1000, settle=5):
+    """Rebuild the whole view into a scratch collection and swap it in
+
+    Readers keep seeing the old summaries until the rename, so a rebuild never
+    serves a partial listing. Each rebuild uses its own scratch collection, so
+    workers rebuilding at once do not clobber each other. Auctions written or
+    deleted after the rebuild started (by update_seq, less `settle` seconds
+    for writes committed out of order) are refreshed again after the swap, as
+    their summary updates went to the collection that was replaced.
+    """
+    started = int(current_cursor(settle))
+    scratch = db[f'{SUMMARY_COLLECTION}_rebuild_{ObjectId()}']
+    for keys in SUMMARY_INDEXES:
+        scratch.create_index(keys)
+
+    count = 0
+    batch = []
+    for summary in _summary_cursor(db, batch_size=batch_size):
+        batch.append(summary)
+        if len(batch) >= batch_size:
+            scratch.insert_many(batch, ordered=False)
+            count += len(batch)
+            batch = []
+    if batch:
+        scratch.insert_many(batch, ordered=False)
+        count += len(batch)
+
+    if count:
+        scratch.rename(SUMMARY_COLLECTION, dropTarget=True)
+    else:
+        db[SUMMARY_COLLECTION].delete_many({})
+        scratch.drop()
+
+    changed = {'update_seq': {'$gt': started}}
+    missed = [auction['_id'] for auction in db.auctions.find(changed, {'_id': 1})]
+    missed += [tombstone['_id'] for tombstone in db[TOMBSTONE_COLLECTION].find(changed, {'_id': 1})]
+    if missed:
+        refresh_summaries(db, missed)
+    return count
+
+class AuctionSummaries:
+    """Keeps the `auction_summaries` listing view in sync with `auctions`
+
+    With SUMMARY_SYNC='writes' the app updates summaries next to each auction
+    write. With 'change_stream' the request path skips that work and a
+    background thread tails the auctions collection instead, which also picks
+    up writes made outside the app (requires a replica set).
+    """
+    def __init__(self, app=None, get_db=None):
+        self.get_db = get_db
+        self._watcher = None
+        self._stopped = threading.Event()
+        if app is not None:
+            self.init_app(app, get_db)
+
+    def init_app(self, app, get_db=None):
+        self.app = app
+        if get_db is not None:
+            self.get_db = get_db
+        app.before_first_request(self.start)
+
+    @property
+    def sync_on_write(self):
+        return self.app.config['SUMMARY_SYNC'] == 'writes'
+
+    def collection(self):
+        return summaries_collection(self.get_db())
+
+    # Write-path hooks (no-ops when the change stream keeps the view in sync)
+
+    def created(self, auctions):
+        if self.sync_on_write:
+            add_summaries(self.get_db(), auctions)
+
+    def changed(self, auction_ids):
+        if self.sync_on_write:
+            refresh_summaries(self.get_db(), auction_ids)
+
+    def counted(self, auction_ids):
+        """Counters flush listener"""
+        if self.sync_on_write:
+            copy_counters(self.get_db(), auction_ids)
+
+    def bid_placed(self, auction_id, amount, update_seq, end_time=None):
+        if self.sync_on_write:
+            record_bid(self.get_db(), auction_id, amount, update_seq, end_time)
+
+    # Lifecycle
+
+    def start(self):
+        db = self.get_db()
+        # Build the view on first start so an upgraded deployment does not serve an empty listing
+        if not db[SUMMARY_COLLECTION].find_one({}, {'_id': 1}) and db.auctions.find_one({}, {'_id': 1}):
+            rebuild_summaries(db, settle=self.app.config['SYNC_SETTLE'])
+        if not self.sync_on_write and self._watcher is None:
+            self._stopped.clear()
+            self._watcher = threading.Thread(target=self._watch_loop, name='summary-sync', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch_loop(self):
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}}]
+        resume_token = None
+        while not self._stopped.is_set():
+            try:
+                with self.get_db().auctions.watch(pipeline, resume_after=resume_token, max_await_time_ms=500) as stream:
+                    while not self._stopped.is_set():
+                        # Drain whatever is queued and refresh the touched auctions in one batch
+                        changed = set()
+                        change = stream.try_next()
+                        while change is not None:
+                            changed.add(change['documentKey']['_id'])
+                            resume_token = stream.resume_token
+                            change = stream.try_next()
+                        if changed:
+                            refresh_summaries(self.get_db(), changed)
+            except PyMongoError as e:
+                self.app.logger.error(f"Summary change stream failed: {str(e)}")
+                self._stopped.wait(1)
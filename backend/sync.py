@@ -0,0 +1,95 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils import APIError, ensure_index, serialize_mongo_doc
+
+TOMBSTONE_COLLECTION = 'auction_tombstones'
+
+_seq_lock = threading.Lock()
+_last_seq = 0
+
+def next_update_seq():
+    """Return the update sequence for an auction write
+
+    Sequences are microseconds since the epoch, made strictly increasing
+    within the process, so they need no shared counter document. Writers in
+    different processes may commit slightly out of order; `sync_changes`
+    hands out cursors that trail the clock by SYNC_SETTLE seconds to cover that.
+    """
+    global _last_seq
+    with _seq_lock:
+        _last_seq = max(_last_seq + 1, time.time_ns() // 1000)
+        return _last_seq
+
+def _seq_time(seq):
+    return datetime(1970, 1, 1) + timedelta(microseconds=seq)
+
+def current_cursor(settle):
+    """Cursor to hand out with a full listing"""
+    return str(time.time_ns() // 1000 - int(settle * 1e6))
+
+def parse_cursor(value):
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        raise APIError("Invalid since cursor", 422)
+    if cursor < 0:
+        raise APIError("Invalid since cursor", 422)
+    return cursor
+
+def tombstone_collection(db, ttl):
+    collection = db[TOMBSTONE_COLLECTION]
+    ensure_index(collection, 'update_seq')
+    ensure_index(collection, 'deleted_at', expireAfterSeconds=ttl)
+    return collection
+
+def record_tombstone(db, auction, ttl):
+    """Remember a deleted auction so delta syncs can report it"""
+    tombstone_collection(db, ttl).replace_one({'_id': auction['_id']}, {
+        '_id': auction['_id'],
+        'seller_id': auction.get('seller_id'),
+        'update_seq': next_update_seq(),
+        'deleted_at': datetime.utcnow()
+    }, upsert=True)
+
+def sync_changes(db, collection, query, since, config, projection=None, epoch=False, tombstone_query=None):
+    """Return what changed in `collection` (matching `query`) after cursor `since`
+
+    A change is a write with a newer update_seq, or an auction whose end_time
+    passed since the cursor. Deleted auctions matching `tombstone_query` are
+    listed by id. The new cursor trails the clock by SYNC_SETTLE seconds, so
+    recent changes may be sent twice but a write committed late is never
+    skipped. Cursors older than the tombstone TTL get a full `reset` listing.
+    """
+    settle = int(config['SYNC_SETTLE'] * 1e6)
+    ttl = config['SYNC_TOMBSTONE_TTL']
+    cursor = parse_cursor(since)
+    now = time.time_ns() // 1000
+    ensure_index(collection, 'update_seq')
+    ensure_index(collection, 'end_time')
+
+    reset = cursor < now - ttl * 1000000
+    if reset:
+        changed = query
+    else:
+        changed = {'$and': [query, {'$or': [
+            {'update_seq': {'$gt': cursor}},
+            {'end_time': {'$gt': _seq_time(cursor), '$lte': _seq_time(now)}}
+        ]}]}
+    changes = list(collection.find(changed, projection).sort('_id', 1))
+
+    deleted = []
+    if tombstone_query is not None and not reset:
+        deleted = [
+            str(tombstone['_id']) for tombstone in tombstone_collection(db, ttl).find(
+                dict(tombstone_query, update_seq={'$gt': cursor}), {'_id': 1}
+            )
+        ]
+
+    return {
+        'changes': serialize_mongo_doc(changes, epoch),
+        'deleted': deleted,
+        'reset': reset,
+        'cursor': str(max(cursor, now - settle))
+    }
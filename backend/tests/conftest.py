@@ -1,9 +1,17 @@
+import os
 import pytest
 from datetime import datetime, timedelta
+from unittest import mock
 from flask import json
-from app import app
-import mongomock
+
+# Run the suite on the memory backend unless STORAGE_BACKEND=mongo is set,
+# in which case it uses (and empties) DATABASE_NAME on MONGODB_URI
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+os.environ.setdefault('DATABASE_NAME', 'test_auction_system')
+
+from app import app, db, bid_book
 from flask_jwt_extended import create_access_token
+from storage import clear_database
 
 @pytest.fixture
 def client():
@@ -14,9 +22,26 @@ def client():
 
 @pytest.fixture
 def mock_db():
-    """Mock MongoDB fixture"""
-    client = mongomock.MongoClient()
-    return client.auction_system
+    """The app's database, emptied before each test"""
+    clear_database(db)
+    return db
+
+@pytest.fixture
+def app_db(request, tmp_path):
+    """The app's database, emptied, with the bid book logging to a temporary WAL
+
+    For unittest-style route tests (`@pytest.mark.usefixtures('app_db')`):
+    sets `self.db` before setUp runs and writes out the bid book afterwards.
+    """
+    clear_database(db)
+    if request.instance is not None:
+        request.instance.db = db
+    with mock.patch.dict(app.config, {'BIDBOOK_WAL_PATH': str(tmp_path / 'bidbook.wal')}):
+        yield db
+        bid_book.flush()
+        if bid_book._wal is not None:
+            bid_book._wal.close()
+            bid_book._wal = None
 
 @pytest.fixture
 def test_user(mock_db):
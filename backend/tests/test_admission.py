@@ -0,0 +1,191 @@
+import threading
+import time
+import unittest
+import pytest
+from unittest import mock
+from flask import Flask, json
+from app import app, admission
+from bson import ObjectId
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+
+from admission import AdmissionControl, EndTimes
+from utils import APIError, handle_api_error
+
+def make_controller(max_active=4, **classes):
+    flask_app = Flask(__name__)
+    flask_app.config.update(
+        ADMISSION_ENABLED=True,
+        ADMISSION_MAX_ACTIVE=max_active,
+        ADMISSION_EXEMPT=[],
+        ADMISSION_CLASSES={
+            'urgent': {'priority': 0, 'limit': 4, 'shed_after': None},
+            'write': {'priority': 1, 'limit': 2, 'shed_after': 1.0},
+            'read': {'priority': 2, 'limit': 2, 'shed_after': 1.0},
+            **classes
+        }
+    )
+    return flask_app, AdmissionControl(flask_app)
+
+class TestAdmissionControl(unittest.TestCase):
+    def _acquire_in_thread(self, controller, name, admitted):
+        def run():
+            controller.acquire(name)
+            admitted.append(name)
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def _wait_for_waiters(self, controller, count):
+        deadline = time.monotonic() + 2
+        while sum(c['waiting'] for c in controller.stats()['classes'].values()) < count:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_urgent_requests_jump_the_queue(self):
+        """Test a freed slot goes to a waiting urgent request before earlier reads"""
+        _, controller = make_controller(max_active=1)
+        controller.acquire('read')
+        admitted = []
+        threads = [self._acquire_in_thread(controller, 'read', admitted)]
+        self._wait_for_waiters(controller, 1)
+        threads.append(self._acquire_in_thread(controller, 'urgent', admitted))
+        self._wait_for_waiters(controller, 2)
+
+        controller.release('read')
+        threads[1].join(timeout=2)
+        self.assertEqual(admitted, ['urgent'])
+        controller.release('urgent')
+        threads[0].join(timeout=2)
+        self.assertEqual(admitted, ['urgent', 'read'])
+        controller.release('read')
+        self.assertEqual(controller.stats()['active'], 0)
+
+    def test_class_limits_are_separate(self):
+        """Test a class at its limit does not hold back the others"""
+        _, controller = make_controller(max_active=4)
+        controller.acquire('write')
+        controller.acquire('write')
+        controller.acquire('read')  # does not block
+        stats = controller.stats()['classes']
+        self.assertEqual((stats['write']['active'], stats['read']['active']), (2, 1))
+
+    def test_shed_after_queue_threshold(self):
+        """Test requests queued past shed_after get 503 with Retry-After"""
+        _, controller = make_controller(read={'priority': 2, 'limit': 1, 'shed_after': 0.02})
+        controller.acquire('read')
+        start = time.monotonic()
+        with self.assertRaises(APIError) as error:
+            controller.acquire('read')
+        self.assertGreaterEqual(time.monotonic() - start, 0.02)
+        self.assertEqual(error.exception.status_code, 503)
+        self.assertEqual(error.exception.headers, {'Retry-After': '1'})
+        stats = controller.stats()['classes']['read']
+        self.assertEqual((stats['shed'], stats['waiting'], stats['admitted']), (1, 0, 1))
+
+    def test_hooks_release_slots(self):
+        """Test the request hooks free the slot after the response, errors included"""
+        flask_app, controller = make_controller(read={'priority': 2, 'limit': 1, 'shed_after': 0.02})
+        flask_app.register_error_handler(APIError, handle_api_error)
+
+        @flask_app.route('/ok')
+        def ok():
+            return 'ok'
+
+        @flask_app.route('/fail')
+        def fail():
+            raise APIError('nope', 400)
+
+        client = flask_app.test_client()
+        for path in ('/ok', '/fail', '/ok'):
+            client.get(path)
+        self.assertEqual(controller.stats()['classes']['read']['active'], 0)
+
+        controller.acquire('read')
+        response = client.get('/ok')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+
+@pytest.mark.usefixtures('app_db')
+class TestAdmissionRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.config = mock.patch.dict(app.config, {'RATE_LIMIT_ENABLED': False})
+        self.config.start()
+        self.client = app.test_client()
+        admin_id = str(self.db.users.insert_one({'email': 'ops@example.com', 'role': 'admin'}).inserted_id)
+        self.headers = self._headers(str(ObjectId()))
+        self.admin_headers = self._headers(admin_id)
+
+    def tearDown(self):
+        self.config.stop()
+
+    def _headers(self, user_id):
+        with app.app_context():
+            token = create_access_token(identity=user_id)
+        return {'Authorization': f'Bearer {token}'}
+
+    def _admitted(self):
+        classes = self.client.get('/api/metrics', headers=self.admin_headers).json['admission']['classes']
+        return {name: stats['admitted'] for name, stats in classes.items()}
+
+    def test_metrics_are_for_admins(self):
+        """Test the metrics endpoint needs a JWT with the admin role"""
+        self.assertEqual(self.client.get('/api/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/api/metrics', headers=self.headers).status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics', headers=self.admin_headers).status_code, 200)
+
+    def test_bids_on_closing_auctions_are_urgent(self):
+        """Test bids are classed by how close the auction is to its end, with or without the bid book"""
+        def bid(auction_id, amount):
+            return self.client.post(f'/api/auctions/{auction_id}/bid', data=json.dumps({'amount': amount}),
+                                    content_type='application/json', headers=self.headers)
+
+        for event_bus in ('local', 'mongo'):
+            closing, open_ = (str(self.db.auctions.insert_one({
+                'title': title,
+                'current_bid': 100.0,
+                'end_time': datetime.utcnow() + delta,
+                'bids': []
+            }).inserted_id) for title, delta in (('Closing', timedelta(seconds=60)), ('Open', timedelta(days=1))))
+            with mock.patch.dict(app.config, {'EVENT_BUS': event_bus}):
+                before = self._admitted()
+                # The first bid in the closing window is urgent too, before anything holds the auction
+                self.assertEqual(bid(closing, 110.0).status_code, 200)
+                self.assertEqual(bid(closing, 120.0).status_code, 200)
+                self.assertEqual(bid(open_, 120.0).status_code, 200)
+                self.client.get(f'/api/auctions/{open_}')
+                after = self._admitted()
+            self.assertEqual(
+                {name: after[name] - before[name] for name in after}, {'urgent': 2, 'write': 1, 'read': 1}, event_bus
+            )
+            self.assertEqual(admission.stats()['active'], 0)
+
+class TestEndTimes(unittest.TestCase):
+    def test_lookups_are_cached_and_follow_extensions(self):
+        """Test end times are looked up once per ttl, raised by extensions and bounded in number"""
+        end_time = datetime.utcnow() + timedelta(seconds=60)
+        lookup = mock.Mock(side_effect=lambda auction_id: {'a': end_time, 'b': 'not a date'}.get(auction_id))
+        end_times = EndTimes(lookup, ttl=60, max_entries=2)
+
+        self.assertTrue(end_times.closes_within('a', 300))
+        self.assertFalse(end_times.closes_within('a', 30))
+        self.assertEqual(lookup.call_count, 1)
+        end_times.extended('a', end_time + timedelta(minutes=10))
+        self.assertFalse(end_times.closes_within('a', 300))
+        self.assertEqual(lookup.call_count, 1)
+
+        self.assertFalse(end_times.closes_within('b', 300))
+        self.assertFalse(end_times.closes_within('missing', 300))
+        self.assertEqual(len(end_times), 2)
+        # 'a' was dropped to make room, so it is looked up again
+        self.assertTrue(end_times.closes_within('a', 300))
+        self.assertEqual(lookup.call_count, 4)
+
+        with mock.patch('admission.monotonic', return_value=float('inf')):
+            end_times.get('a')
+        self.assertEqual(lookup.call_count, 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,10 @@
 import unittest
 from flask import json
-from app import app
+from app import app, db
 from models import User, Auction
 from datetime import datetime, timedelta
-import mongomock
+from storage import clear_database
+from summaries import rebuild_summaries
 from flask_jwt_extended import create_access_token
 
 class TestAuctions(unittest.TestCase):
@@ -12,9 +13,9 @@ class TestAuctions(unittest.TestCase):
         app.config['TESTING'] = True
         app.config['JWT_SECRET_KEY'] = 'test-secret-key'
         
-        # Create mock MongoDB client
-        self.mongo_client = mongomock.MongoClient()
-        self.db = self.mongo_client.auction_system
+        # The app's own database (the memory backend under pytest, see conftest.py), emptied per test
+        self.db = db
+        clear_database(self.db)
         
         # Get test client
         self.client = app.test_client()
@@ -28,7 +29,8 @@ class TestAuctions(unittest.TestCase):
         }).inserted_id)
         
         # Create access token for test user
-        self.access_token = create_access_token(identity=self.user_id)
+        with app.app_context():
+            self.access_token = create_access_token(identity=self.user_id)
         self.headers = {'Authorization': f'Bearer {self.access_token}'}
         
         # Sample auction data
@@ -36,8 +38,10 @@ class TestAuctions(unittest.TestCase):
             'title': 'Test Auction',
             'description': 'Test description',
             'startingPrice': 100.0,
+            'minimumIncrement': 5.0,
             'endTime': (datetime.utcnow() + timedelta(days=7)).isoformat(),
-            'imageUrl': 'https://example.com/image.jpg'
+            'imageUrl': 'data:image/png;base64,iVBORw0KGgo=',
+            'category': 1
         }
 
     def test_create_auction_success(self):
@@ -95,6 +99,8 @@ class TestAuctions(unittest.TestCase):
                 'end_time': datetime.utcnow() + timedelta(days=2)
             }
         ])
+        # Inserted behind the app's back, so build the listing view by hand
+        rebuild_summaries(self.db)
         
         response = self.client.get('/api/auctions')
         
@@ -1,9 +1,9 @@
 import unittest
 from flask import json
-from app import app
+from app import app, db
 from models import User
 from datetime import datetime
-import mongomock
+from storage import clear_database
 
 class TestAuth(unittest.TestCase):
     def setUp(self):
@@ -11,9 +11,9 @@ class TestAuth(unittest.TestCase):
         app.config['TESTING'] = True
         app.config['JWT_SECRET_KEY'] = 'test-secret-key'
         
-        # Create mock MongoDB client
-        self.mongo_client = mongomock.MongoClient()
-        self.db = self.mongo_client.auction_system
+        # The app's own database (the memory backend under pytest, see conftest.py), emptied per test
+        self.db = db
+        clear_database(self.db)
         
         # Get test client
         self.client = app.test_client()
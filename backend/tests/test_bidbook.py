@@ -0,0 +1,220 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import pytest
+from flask import Flask, json
+from app import app, bid_book
+from bson import ObjectId
+from datetime import datetime, timedelta
+import mongomock
+from flask_jwt_extended import create_access_token
+
+from bidbook import BidBook
+from config import Config
+from utils import APIError
+
+class TestBidBook(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = mongomock.MongoClient().auction_system
+        self.app = Flask(__name__)
+        self.app.config.from_object(Config)
+        self.app.config['BIDBOOK_WAL_PATH'] = os.path.join(self.tmp, 'bidbook.wal')
+        self.book = BidBook(self.app, lambda: self.db)
+
+        self.auction_id = self.db.auctions.insert_one({
+            'title': 'Closing soon',
+            'current_bid': 100.0,
+            'end_time': datetime.utcnow() + timedelta(seconds=60),
+            'bids': []
+        }).inserted_id
+        self.user_id = str(ObjectId())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _auction(self):
+        return self.db.auctions.find_one({'_id': self.auction_id})
+
+    def _hot(self, book=None):
+        book = book or self.book
+        auction = self._auction()
+        self.assertTrue(book.is_hot(auction))
+        return book.promote(auction)
+
+    def test_bids_validated_in_memory_and_flushed_in_batch(self):
+        """Test bids are checked against memory and written with one flush"""
+        hot = self._hot()
+        self.book.place(hot, self.user_id, {'amount': 110})
+        self.book.place(hot, self.user_id, {'amount': 120})
+        with self.assertRaises(APIError):
+            self.book.place(hot, self.user_id, {'amount': 115})
+        self.assertEqual(self._auction()['bids'], [])
+
+        self.assertEqual(self.book.flush(), 2)
+        auction = self._auction()
+        self.assertEqual([bid['amount'] for bid in auction['bids']], [110.0, 120.0])
+        self.assertEqual(auction['current_bid'], 120.0)
+
+    def test_overlay_shows_unflushed_bids(self):
+        """Test a fetched auction reflects acknowledged bids before they are flushed"""
+        self.book.place(self._hot(), self.user_id, {'amount': 130})
+        auction = self.book.overlay(self._auction())
+        self.assertEqual(auction['current_bid'], 130.0)
+        self.assertEqual(len(auction['bids']), 1)
+
+    def test_overlay_while_flushing(self):
+        """Test bids stay visible, once, while their batch is being written"""
+        self.book.place(self._hot(), self.user_id, {'amount': 130})
+        write = self.db.auctions.bulk_write
+        seen = []
+
+        def observed_write(*args, **kwargs):
+            seen.append(self.book.overlay(self._auction())['current_bid'])
+            write(*args, **kwargs)
+            seen.append(len(self.book.overlay(self._auction())['bids']))
+
+        with mock.patch.object(self.db.auctions, 'bulk_write', observed_write):
+            self.book.flush()
+        self.assertEqual(seen, [130.0, 1])
+
+    def test_replay_after_crash(self):
+        """Test unflushed bids are recovered from the WAL exactly once"""
+        self.book.place(self._hot(), self.user_id, {'amount': 110})
+        self.book.place(self._hot(), self.user_id, {'amount': 125})
+
+        # A new process starts from the same WAL
+        recovered = BidBook(self.app, lambda: self.db)
+        self.assertEqual(recovered.replay(), 2)
+        self.assertEqual(BidBook(self.app, lambda: self.db).replay(), 0)
+
+        auction = self._auction()
+        self.assertEqual([bid['amount'] for bid in auction['bids']], [110.0, 125.0])
+        self.assertEqual(auction['current_bid'], 125.0)
+
+    def test_replay_skips_flush_without_checkpoint(self):
+        """Test a flush that reached MongoDB but not the WAL is not applied twice"""
+        hot = self._hot()
+        self.book.place(hot, self.user_id, {'amount': 110})
+        self.book._write(self.book._pending)  # crash before the checkpoint is written
+
+        self.assertEqual(BidBook(self.app, lambda: self.db).replay(), 0)
+        self.assertEqual(len(self._auction()['bids']), 1)
+
+    def test_failed_flush_is_not_written_twice(self):
+        """Test a flush that fails after its bulk_write does not push those bids again"""
+        hot = self._hot()
+
+        def failing_listener(batch):
+            raise RuntimeError('listener failed')
+
+        self.book.flush_listeners.append(failing_listener)
+        self.book.place(hot, self.user_id, {'amount': 110})
+        with self.assertRaises(RuntimeError):
+            self.book.flush()
+        self.book.flush_listeners.remove(failing_listener)
+
+        # The bulk_write itself applies the batch, then reports an error
+        write = self.db.auctions.bulk_write
+
+        def partial_write(*args, **kwargs):
+            write(*args, **kwargs)
+            raise RuntimeError('write failed for another auction')
+
+        self.book.place(hot, self.user_id, {'amount': 120})
+        with mock.patch.object(self.db.auctions, 'bulk_write', partial_write):
+            with self.assertRaises(RuntimeError):
+                self.book.flush()
+
+        flushed = []
+        self.book.flush_listeners.append(flushed.append)
+        self.book.place(hot, self.user_id, {'amount': 130})
+        self.assertEqual(self.book.flush(), 2)
+        self.assertEqual([bid['amount'] for bid in self._auction()['bids']], [110.0, 120.0, 130.0])
+        self.assertEqual([bid.amount for _, bid, _ in flushed[0][self.auction_id]], [120.0, 130.0])
+
+    def test_workers_replay_but_do_not_hold_books(self):
+        """Test with several workers the book is off but a leftover WAL is still written once"""
+        self.book.place(self._hot(), self.user_id, {'amount': 110})
+
+        self.app.config['EVENT_BUS'] = 'ipc'
+        workers = [BidBook(self.app, lambda: self.db) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+            self.assertFalse(worker.enabled)
+            self.assertIsNone(worker._flusher)
+        self.assertEqual([bid['amount'] for bid in self._auction()['bids']], [110.0])
+
+    def test_current_bid_never_decreases(self):
+        """Test a stale flush cannot lower current_bid"""
+        self.book.place(self._hot(), self.user_id, {'amount': 110})
+        self.db.auctions.update_one({'_id': self.auction_id}, {'$set': {'current_bid': 500.0}})
+        self.book.flush()
+        self.assertEqual(self._auction()['current_bid'], 500.0)
+
+    def test_concurrent_bids_stay_monotonic(self):
+        """Test concurrent bidders produce a strictly increasing bid history"""
+        hot = self._hot()
+
+        def bidder():
+            for _ in range(50):
+                try:
+                    self.book.place(hot, self.user_id, {'amount': hot.current_bid + 1})
+                except APIError:
+                    pass
+
+        threads = [threading.Thread(target=bidder) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.book.flush()
+
+        amounts = [bid['amount'] for bid in self._auction()['bids']]
+        self.assertEqual(amounts, sorted(set(amounts)))
+        self.assertEqual(self._auction()['current_bid'], amounts[-1])
+
+@pytest.mark.usefixtures('app_db')
+class TestBidBookRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.client = app.test_client()
+
+        with app.app_context():
+            token = create_access_token(identity=str(ObjectId()))
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def test_bid_on_closing_auction(self):
+        """Test bids on an auction in its final minutes are acknowledged and visible"""
+        auction_id = str(self.db.auctions.insert_one({
+            'title': 'Closing soon',
+            'current_bid': 100.0,
+            'end_time': datetime.utcnow() + timedelta(seconds=60),
+            'bids': []
+        }).inserted_id)
+
+        response = self.client.post(
+            f'/api/auctions/{auction_id}/bid',
+            data=json.dumps({'amount': 150.0}),
+            content_type='application/json',
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(bid_book.get(auction_id))
+        self.assertEqual(self.client.get(f'/api/auctions/{auction_id}').json['current_bid'], 150.0)
+
+        response = self.client.post(
+            f'/api/auctions/{auction_id}/bid',
+            data=json.dumps({'amount': 120.0}),
+            content_type='application/json',
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Bid must be higher than current bid', response.json['error'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import gzip
+import unittest
+from app import app, db
+from summaries import rebuild_summaries
+from datetime import datetime, timedelta
+from storage import clear_database
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.db = db
+        clear_database(self.db)
+
+    def _insert_auctions(self, count):
+        self.db.auctions.insert_many([{
+            'title': f'Auction {i}',
+            'description': 'Description ' * 10,
+            'current_bid': 100.0,
+            'end_time': datetime(2030, 1, 1) + timedelta(hours=i),
+            'bids': []
+        } for i in range(count)])
+        rebuild_summaries(self.db)
+
+    def test_large_response_is_gzipped(self):
+        """Test listings above the size threshold are gzip encoded when accepted"""
+        self._insert_auctions(50)
+        plain = self.client.get('/api/auctions')
+        response = self.client.get('/api/auctions', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+
+    def test_small_response_is_not_compressed(self):
+        """Test bodies below the threshold are sent as-is"""
+        self._insert_auctions(1)
+        response = self.client.get('/api/auctions', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_fields_and_epoch_timestamps(self):
+        """Test the compact representation selects fields and uses epoch milliseconds"""
+        self._insert_auctions(2)
+        response = self.client.get('/api/auctions?fields=title,end_time&ts=epoch')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json[0]), {'_id', 'title', 'end_time'})
+        self.assertIsInstance(response.json[0]['end_time'], int)
+
+    def test_invalid_timestamp_format(self):
+        """Test an unknown ts value is rejected"""
+        response = self.client.get('/api/auctions?ts=unix')
+        self.assertEqual(response.status_code, 422)
+
+if __name__ == '__main__':
+    unittest.main()
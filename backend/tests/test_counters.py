@@ -0,0 +1,135 @@
+import unittest
+import pytest
+from unittest import mock
+from flask import Flask, json
+from app import app, counters
+from bson import ObjectId
+from datetime import datetime, timedelta
+import mongomock
+from flask_jwt_extended import create_access_token
+
+from counters import Counters
+
+class TestCounters(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().auction_system
+        self.ids = self.db.auctions.insert_many([{'title': 'One'}, {'title': 'Two'}]).inserted_ids
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['COUNTER_FLUSH_INTERVAL'] = 60
+        self.counters = Counters(self.flask_app, lambda: self.db)
+
+    def test_increments_are_coalesced(self):
+        """Test many increments become one $inc per auction in one bulk_write"""
+        for _ in range(50):
+            self.counters.incr(self.ids[0], 'view_count')
+        self.counters.incr(self.ids[1], 'view_count', 3)
+        self.counters.incr(self.ids[1], 'watcher_count')
+
+        with mock.patch.object(self.db.auctions, 'bulk_write', wraps=self.db.auctions.bulk_write) as bulk_write:
+            self.assertEqual(self.counters.flush(), 2)
+        self.assertEqual(bulk_write.call_count, 1)
+        self.assertEqual(len(bulk_write.call_args[0][0]), 2)
+        self.assertEqual(self.db.auctions.find_one({'_id': self.ids[0]})['view_count'], 50)
+        self.assertEqual(self.db.auctions.find_one({'_id': self.ids[1]})['watcher_count'], 1)
+        self.assertEqual(self.counters.flush(), 0)
+
+    def test_overlay_adds_unflushed_counts(self):
+        """Test reads include increments this process has not written yet"""
+        self.counters.incr(self.ids[0], 'view_count', 2)
+        doc = {'_id': self.ids[0], 'view_count': 10, 'title': 'One'}
+        self.assertEqual(self.counters.overlay(doc)['view_count'], 12)
+        self.assertNotIn('view_count', self.counters.overlay({'_id': self.ids[0], 'title': 'One'}))
+
+    def test_cancelling_increments_are_not_written(self):
+        """Test a watch and unwatch within one interval cost no write"""
+        self.counters.incr(self.ids[0], 'watcher_count')
+        self.counters.incr(self.ids[0], 'watcher_count', -1)
+        self.assertEqual(self.counters.flush(), 0)
+        self.assertNotIn('watcher_count', self.db.auctions.find_one({'_id': self.ids[0]}))
+
+    def test_failed_flush_keeps_counts(self):
+        """Test a failed write folds its counts back in for the next flush"""
+        self.counters.incr(self.ids[0], 'view_count', 4)
+        with mock.patch.object(self.db.auctions, 'bulk_write', side_effect=RuntimeError('down')):
+            with self.assertRaises(RuntimeError):
+                self.counters.flush()
+        self.counters.incr(self.ids[0], 'view_count')
+        self.counters.flush()
+        self.assertEqual(self.db.auctions.find_one({'_id': self.ids[0]})['view_count'], 5)
+
+    def test_stop_flushes(self):
+        """Test shutting down writes what is still pending"""
+        self.counters.start()
+        self.counters.incr(self.ids[0], 'view_count')
+        self.counters.stop()
+        self.assertEqual(self.db.auctions.find_one({'_id': self.ids[0]})['view_count'], 1)
+
+@pytest.mark.usefixtures('app_db')
+class TestCounterRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.config = mock.patch.dict(app.config, {'RATE_LIMIT_ENABLED': False})
+        self.config.start()
+        self.client = app.test_client()
+        self.user_id = str(ObjectId())
+        self.headers = self._headers(self.user_id)
+
+    def tearDown(self):
+        counters.flush()
+        self.config.stop()
+
+    def _headers(self, user_id):
+        with app.app_context():
+            token = create_access_token(identity=user_id)
+        return {'Authorization': f'Bearer {token}'}
+
+    def _create(self, title):
+        response = self.client.post('/api/auctions', data=json.dumps({
+            'title': title,
+            'description': 'Description',
+            'startingPrice': 100,
+            'minimumIncrement': 5,
+            'endTime': (datetime.utcnow() + timedelta(days=2)).isoformat() + 'Z',
+            'category': 1
+        }), content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        return response.json['_id']
+
+    def test_views_are_counted_and_ranked(self):
+        """Test detail reads are counted, shown before and after a flush, and rank the listing"""
+        quiet, popular = self._create('Quiet'), self._create('Popular')
+        for _ in range(3):
+            self.client.get(f'/api/auctions/{popular}')
+        self.assertNotIn('view_count', self.db.auctions.find_one({'_id': ObjectId(popular)}))
+        # A response counts the views before it
+        self.assertEqual(self.client.get(f'/api/auctions/{popular}').json['view_count'], 3)
+        self.assertEqual(self.client.get(f'/api/auctions/{quiet}').json['view_count'], 0)
+
+        counters.flush()
+        self.assertEqual(self.db.auctions.find_one({'_id': ObjectId(popular)})['view_count'], 4)
+        listing = self.client.get('/api/auctions?sort=views').json
+        self.assertEqual([(a['_id'], a['view_count']) for a in listing], [(popular, 4), (quiet, 1)])
+        self.assertEqual(self.client.get('/api/auctions?sort=price').status_code, 422)
+        self.assertEqual(self.client.get(f'/api/auctions/{ObjectId()}').status_code, 404)
+
+    def test_watchlist(self):
+        """Test watching is idempotent per user and drives watcher_count"""
+        auction_id = self._create('Watched')
+        other = self._headers(str(ObjectId()))
+        for headers in (self.headers, self.headers, other):
+            response = self.client.post(f'/api/auctions/{auction_id}/watch', headers=headers)
+            self.assertEqual(response.json, {'auction_id': auction_id, 'watching': True})
+        self.client.delete(f'/api/auctions/{auction_id}/watch', headers=other)
+        self.client.delete(f'/api/auctions/{auction_id}/watch', headers=other)
+        counters.flush()
+
+        self.assertEqual(self.client.get(f'/api/auctions/{auction_id}').json['watcher_count'], 1)
+        self.assertEqual(self.client.get('/api/auctions?sort=watchers').json[0]['watcher_count'], 1)
+        watchlist = self.client.get(f'/api/users/{self.user_id}/watchlist', headers=self.headers)
+        self.assertEqual([a['_id'] for a in watchlist.json], [auction_id])
+        self.assertEqual(self.client.get(f'/api/users/{self.user_id}/watchlist', headers=other).status_code, 403)
+        self.assertEqual(self.client.post(f'/api/auctions/{ObjectId()}/watch', headers=self.headers).status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
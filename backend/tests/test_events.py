@@ -0,0 +1,40 @@
+import multiprocessing
+import threading
+import unittest
+
+from events import IpcEventBus, LocalEventBus, relay_events
+
+class TestEventBus(unittest.TestCase):
+    def test_local_bus_dispatches_synchronously(self):
+        """Test the in-process bus delivers to subscribers of the topic only"""
+        bus = LocalEventBus()
+        received = []
+        bus.subscribe('bid', received.append)
+        bus.publish('bid', {'auction_id': 'a'})
+        bus.publish('auction.changed', {'auction_id': 'b'})
+        self.assertEqual(received, [{'auction_id': 'a'}])
+
+    def test_ipc_bus_relays_between_workers(self):
+        """Test an event published by one worker reaches the others through the relay"""
+        pipes = [multiprocessing.Pipe() for _ in range(3)]
+        stopped = threading.Event()
+        relay = threading.Thread(target=relay_events, args=([parent for parent, _ in pipes], stopped), daemon=True)
+        relay.start()
+
+        buses = [IpcEventBus(worker) for _, worker in pipes]
+        delivered = [threading.Event() for _ in buses]
+        received = [[] for _ in buses]
+        for bus, events, done in zip(buses, received, delivered):
+            bus.subscribe('bid', lambda payload, events=events, done=done: (events.append(payload), done.set()))
+            bus.start()
+
+        buses[0].publish('bid', {'auction_id': 'a', 'current_bid': 10.0})
+        for done in delivered:
+            self.assertTrue(done.wait(5))
+        stopped.set()
+
+        for events in received:
+            self.assertEqual(events, [{'auction_id': 'a', 'current_bid': 10.0}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import csv
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from flask import json
+from app import app, db
+from bson import ObjectId
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+
+from export import export_lines, export_to_file
+from storage import clear_database
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.db = db
+        clear_database(self.db)
+        self.client = app.test_client()
+
+        now = datetime.utcnow()
+        self.user_id = ObjectId()
+        for i in range(5):
+            self.db.auctions.insert_one({
+                'title': f'Auction {i}',
+                'description': 'Description',
+                'starting_price': 10.0,
+                'current_bid': 10.0 + i,
+                'end_time': now + timedelta(days=1),
+                'seller_id': self.user_id,
+                'created_at': now - timedelta(days=5 - i),
+                'bids': [
+                    {'user_id': self.user_id, 'amount': 10.0 + j, 'time': now - timedelta(hours=j)}
+                    for j in range(i)
+                ]
+            })
+
+        self.admin_id = self.db.users.insert_one({'email': 'ops@example.com', 'role': 'admin'}).inserted_id
+        self.headers = self._headers(self.admin_id)
+
+    def _headers(self, user_id):
+        with app.app_context():
+            token = create_access_token(identity=str(user_id))
+        return {'Authorization': f'Bearer {token}'}
+
+    def test_ndjson_auctions(self):
+        """Test NDJSON export yields one document per auction with bid counts"""
+        lines = [line for _, line in export_lines(self.db, 'auctions', 'ndjson')]
+        rows = [json.loads(line) for line in lines]
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([row['bid_count'] for row in rows], [0, 1, 2, 3, 4])
+        self.assertNotIn('bids', rows[0])
+
+    def test_csv_bids_with_time_range(self):
+        """Test CSV bid export honours the time range filter"""
+        since = datetime.utcnow() - timedelta(hours=1, minutes=30)
+        text = ''.join(line for _, line in export_lines(self.db, 'bids', 'csv', since=since))
+        rows = list(csv.DictReader(io.StringIO(text)))
+
+        # Bids j=0 and j=1 of the four auctions that have bids
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(set(rows[0]), {'auction_id', 'user_id', 'amount', 'time'})
+
+    def test_export_resumes_from_checkpoint(self):
+        """Test a resumed export appends only the rows after the checkpoint"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'bids.csv')
+            checkpoint = os.path.join(tmp, 'bids.checkpoint')
+
+            real_lines = export_lines
+            def interrupted(*args, **kwargs):
+                for i, item in enumerate(real_lines(*args, **kwargs)):
+                    if i == 6:
+                        raise KeyboardInterrupt
+                    yield item
+
+            with mock.patch('export.export_lines', interrupted):
+                with self.assertRaises(KeyboardInterrupt):
+                    export_to_file(self.db, 'bids', 'csv', path, batch_size=1, checkpoint_path=checkpoint)
+
+            export_to_file(self.db, 'bids', 'csv', path, batch_size=1, checkpoint_path=checkpoint)
+            with open(path) as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(len({(row['auction_id'], row['amount']) for row in rows}), 10)
+
+    def test_export_endpoint_streams(self):
+        """Test the export endpoint streams NDJSON to admins"""
+        response = self.client.get('/api/export/auctions?format=ndjson', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(len(response.get_data(as_text=True).splitlines()), 5)
+
+    def test_export_endpoint_requires_admin(self):
+        """Test other users cannot export, even their own auctions"""
+        response = self.client.get('/api/export/bids', headers=self._headers(self.user_id))
+        self.assertEqual(response.status_code, 403)
+
+    def test_set_role_command(self):
+        """Test `flask set-role` grants and revokes the admin role"""
+        runner = app.test_cli_runner()
+        self.db.users.insert_one({'_id': self.user_id, 'email': 'seller@example.com'})
+        self.assertEqual(runner.invoke(args=['set-role', 'seller@example.com', 'admin']).exit_code, 0)
+        self.assertEqual(self.client.get('/api/export/bids', headers=self._headers(self.user_id)).status_code, 200)
+        runner.invoke(args=['set-role', 'seller@example.com', 'user'])
+        self.assertEqual(self.client.get('/api/export/bids', headers=self._headers(self.user_id)).status_code, 403)
+        self.assertNotEqual(runner.invoke(args=['set-role', 'nobody@example.com', 'admin']).exit_code, 0)
+
+    def test_export_endpoint_rejects_unknown_format(self):
+        """Test the export endpoint rejects unsupported formats"""
+        response = self.client.get('/api/export/auctions?format=xml', headers=self.headers)
+        self.assertEqual(response.status_code, 422)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import random
+import unittest
+import pytest
+from unittest import mock
+from flask import json
+from app import app, bid_book
+from bson import ObjectId
+from datetime import datetime, timedelta
+import mongomock
+from flask_jwt_extended import create_access_token
+
+import history
+from history import (
+    backfill_history, bucket_start, compute_buckets, get_history, parse_resolution, record_bids
+)
+from utils import APIError
+
+RESOLUTIONS = [60, 3600]
+
+class TestBidHistory(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().auction_system
+        self.start = datetime(2030, 1, 1, 12, 0, 0)
+        self.bids = [
+            {'user_id': ObjectId(), 'amount': 100.0 + i, 'time': self.start + timedelta(seconds=25 * i)}
+            for i in range(10)
+        ]
+
+    def _buckets(self, auction_id, resolution):
+        return get_history(self.db, auction_id, resolution, RESOLUTIONS)
+
+    def test_parse_resolution(self):
+        """Test bucket widths accept seconds and s/m/h/d suffixes"""
+        self.assertEqual(parse_resolution('300'), 300)
+        self.assertEqual(parse_resolution('5m'), 300)
+        self.assertEqual(parse_resolution('1d'), 86400)
+        for value in ('0', 'abc', '5w'):
+            with self.assertRaises(APIError):
+                parse_resolution(value)
+
+    def test_incremental_rollups_match_backfill(self):
+        """Test per-bid updates, applied out of order, equal a backfill from the bids"""
+        auction_id = ObjectId()
+        shuffled = self.bids[:]
+        random.shuffle(shuffled)
+        for bid in shuffled:
+            record_bids(self.db, {auction_id: [bid]}, RESOLUTIONS)
+        incremental = self._buckets(auction_id, 60)
+
+        self.db.bid_history.delete_many({})
+        self.db.auctions.insert_one({'_id': auction_id, 'bids': self.bids})
+        self.assertEqual(backfill_history(self.db, RESOLUTIONS), 1)
+
+        self.assertEqual(self._buckets(auction_id, 60), incremental)
+        self.assertEqual([bucket['count'] for bucket in incremental], [3, 2, 3, 2])
+        self.assertEqual(incremental[0], {
+            'start': self.start, 'open': 100.0, 'high': 102.0, 'low': 100.0, 'close': 102.0, 'count': 3
+        })
+
+    def test_coarser_resolution_is_merged(self):
+        """Test a multiple of a stored resolution is served by merging buckets"""
+        auction_id = ObjectId()
+        record_bids(self.db, {auction_id: self.bids}, RESOLUTIONS)
+
+        buckets = self._buckets(auction_id, 180)
+        self.assertEqual([bucket['start'] for bucket in buckets], [self.start, self.start + timedelta(minutes=3)])
+        self.assertEqual((buckets[0]['open'], buckets[0]['close'], buckets[0]['count']), (100.0, 107.0, 8))
+        self.assertEqual(self._buckets(auction_id, 7200)[0]['count'], 10)
+        with self.assertRaises(APIError):
+            self._buckets(auction_id, 90)
+
+    def test_python_buckets(self):
+        """Test the pure Python path keeps series apart and orders bids by time"""
+        rows = list(history._buckets_python([1, 0, 0, 1], [130, 10, 70, 5], [4.0, 1.0, 2.0, 3.0], 60))
+        self.assertEqual(sorted(rows), [
+            (0, 0, 1.0, 1.0, 1.0, 1.0, 1), (0, 60, 2.0, 2.0, 2.0, 2.0, 1),
+            (1, 0, 3.0, 3.0, 3.0, 3.0, 1), (1, 120, 4.0, 4.0, 4.0, 4.0, 1)
+        ])
+
+    @unittest.skipIf(history.np is None, 'numpy is not installed')
+    def test_numpy_matches_python(self):
+        """Test the vectorized backfill gives the same buckets as the Python loop"""
+        rng = random.Random(7)
+        keys = [rng.randrange(20) for _ in range(2000)]
+        times = [rng.randrange(86400) for _ in range(2000)]
+        amounts = [float(rng.randrange(1000)) for _ in range(2000)]
+        for resolution in (60, 3600):
+            self.assertEqual(
+                sorted(history._buckets_numpy(keys, times, amounts, resolution)),
+                sorted(history._buckets_python(keys, times, amounts, resolution))
+            )
+
+    def test_bucket_start_is_utc_aligned(self):
+        """Test buckets align to UTC boundaries for naive and aware times"""
+        aware = datetime.fromisoformat('2030-01-01T14:35:10+02:00')
+        self.assertEqual(bucket_start(aware, 3600), datetime(2030, 1, 1, 12, 0))
+        self.assertEqual(list(compute_buckets([0], [3599], [5.0], 3600)), [(0, 0, 5.0, 5.0, 5.0, 5.0, 1)])
+
+@pytest.mark.usefixtures('app_db')
+class TestHistoryRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.config = mock.patch.dict(app.config, {
+            'RATE_LIMIT_ENABLED': False,
+            'HISTORY_RESOLUTIONS': RESOLUTIONS
+        })
+        self.config.start()
+        self.client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity=str(ObjectId()))
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def tearDown(self):
+        self.config.stop()
+
+    def _bid(self, auction_id, amount):
+        return self.client.post(f'/api/auctions/{auction_id}/bid', data=json.dumps({'amount': amount}),
+                                content_type='application/json', headers=self.headers)
+
+    def _auction(self, ends_in):
+        return self.db.auctions.insert_one({
+            'title': 'Chart', 'current_bid': 100.0, 'starting_price': 100.0,
+            'end_time': datetime.utcnow() + ends_in, 'bids': []
+        }).inserted_id
+
+    def test_history_endpoint(self):
+        """Test direct and bid-book bids both land in the chart buckets"""
+        direct = self._auction(timedelta(days=1))
+        hot = self._auction(timedelta(minutes=1))
+        for amount in (110, 120, 130):
+            self.assertEqual(self._bid(direct, amount).status_code, 200)
+            self.assertEqual(self._bid(hot, amount).status_code, 200)
+        bid_book.flush()
+
+        for auction_id in (direct, hot):
+            response = self.client.get(f'/api/auctions/{auction_id}/history?resolution=1h&ts=epoch')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json['resolution'], 3600)
+            buckets = response.json['buckets']
+            self.assertEqual(sum(bucket['count'] for bucket in buckets), 3)
+            self.assertEqual(buckets[-1]['close'], 130.0)
+            self.assertIsInstance(buckets[0]['start'], int)
+
+    def test_invalid_resolution(self):
+        """Test resolutions that are not a multiple of a stored width are rejected"""
+        response = self.client.get(f'/api/auctions/{ObjectId()}/history?resolution=45s')
+        self.assertEqual(response.status_code, 422)
+
+if __name__ == '__main__':
+    unittest.main()
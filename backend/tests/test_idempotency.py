@@ -0,0 +1,113 @@
+import threading
+import unittest
+from flask import json
+from app import app, db, idempotent, rate_limiter
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from storage import clear_database
+
+class TestIdempotency(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.db = db
+        clear_database(self.db)
+        idempotent.forget()
+        rate_limiter.store.reset()
+
+        self.user_id = str(self.db.users.insert_one({'email': 'test@example.com'}).inserted_id)
+        with app.app_context():
+            token = create_access_token(identity=self.user_id)
+        self.headers = {'Authorization': f'Bearer {token}', 'Idempotency-Key': 'bid-1'}
+
+        self.auction_id = str(self.db.auctions.insert_one({
+            'title': 'Test Auction',
+            'current_bid': 100.0,
+            'end_time': datetime.utcnow() + timedelta(days=1),
+            'bids': []
+        }).inserted_id)
+
+    def _bid(self, amount, headers=None):
+        return app.test_client().post(
+            f'/api/auctions/{self.auction_id}/bid',
+            data=json.dumps({'amount': amount}),
+            content_type='application/json',
+            headers=headers or self.headers
+        )
+
+    def _bid_count(self):
+        return len(self.db.auctions.find_one()['bids'])
+
+    def test_retry_replays_original_response(self):
+        """Test a retried bid returns the stored response without a second write"""
+        first = self._bid(150)
+        second = self._bid(150)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json, first.json)
+        self.assertEqual(second.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(self._bid_count(), 1)
+
+    def test_replay_from_database(self):
+        """Test a retry served by another process is answered from the stored response"""
+        self._bid(150)
+        idempotent.forget()
+
+        response = self._bid(150)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get('Idempotent-Replayed'), 'true')
+        self.assertEqual(self._bid_count(), 1)
+
+    def test_failed_request_is_not_stored(self):
+        """Test a rejected request can be retried with the same key"""
+        self.assertEqual(self._bid(50).status_code, 400)
+        self.assertEqual(self._bid(150).status_code, 200)
+        self.assertEqual(self._bid_count(), 1)
+
+    def test_concurrent_duplicates_collapse(self):
+        """Test concurrent duplicates execute the bid once"""
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(self._bid(150))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [200] * 8)
+        self.assertEqual(self._bid_count(), 1)
+
+    def test_without_key_is_not_deduplicated(self):
+        """Test requests without the header behave as before"""
+        headers = {'Authorization': self.headers['Authorization']}
+        self._bid(150, headers)
+        self._bid(160, headers)
+        self.assertEqual(self._bid_count(), 2)
+
+    def test_key_reused_with_different_body(self):
+        """Test a key reused for a different request gets 422, from cache or database"""
+        self._bid(150)
+        self.assertEqual(self._bid(175).status_code, 422)
+        idempotent.forget()
+        self.assertEqual(self._bid(175).status_code, 422)
+        self.assertEqual(self._bid(150).status_code, 200)
+        self.assertEqual(self._bid_count(), 1)
+
+    def test_expired_pending_key_is_taken_over(self):
+        """Test a key left pending by a dead worker can be retried once its lease runs out"""
+        key = f"{self.user_id}:place_bid:/api/auctions/{self.auction_id}/bid:bid-1"
+        self.db.idempotency_keys.insert_one({
+            '_id': key,
+            'status': 'pending',
+            'locked_until': datetime.utcnow() + timedelta(seconds=30),
+            'created_at': datetime.utcnow()
+        })
+        self.assertEqual(self._bid(150).status_code, 409)
+
+        self.db.idempotency_keys.update_one({'_id': key}, {'$set': {'locked_until': datetime.utcnow() - timedelta(seconds=1)}})
+        self.assertEqual(self._bid(150).status_code, 200)
+        self.assertEqual(self.db.idempotency_keys.find_one({'_id': key})['status'], 'completed')
+        self.assertEqual(self._bid_count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
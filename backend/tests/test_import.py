@@ -0,0 +1,71 @@
+import io
+import unittest
+from flask import json
+from app import app, db
+from bson import ObjectId
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+
+from importer import import_auctions, iter_import_file
+from storage import clear_database
+
+class TestImport(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.db = db
+        clear_database(self.db)
+        self.client = app.test_client()
+        self.user_id = str(ObjectId())
+
+        with app.app_context():
+            token = create_access_token(identity=self.user_id)
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def _row(self, i, **overrides):
+        row = {
+            'title': f'Auction {i}',
+            'description': 'Imported',
+            'startingPrice': 10 + i,
+            'minimumIncrement': 1,
+            'endTime': (datetime.utcnow() + timedelta(days=3)).isoformat() + 'Z',
+            'category': 1
+        }
+        row.update(overrides)
+        return row
+
+    def test_import_reports_row_errors(self):
+        """Test invalid rows are reported without aborting the batch"""
+        rows = [self._row(i) for i in range(7)]
+        rows[2] = self._row(2, startingPrice='abc')
+        rows[5].pop('title')
+
+        result = import_auctions(self.db, rows, self.user_id, batch_size=3)
+
+        self.assertEqual(result['inserted'], 5)
+        self.assertEqual([error['row'] for error in result['errors']], [2, 5])
+        self.assertEqual(self.db.auctions.count_documents({'seller_id': ObjectId(self.user_id)}), 5)
+
+    def test_iter_import_file_ndjson(self):
+        """Test NDJSON files are parsed line by line with bad lines reported"""
+        text = '\n'.join([json.dumps(self._row(0)), '{broken', '', json.dumps(self._row(1))])
+        result = import_auctions(self.db, iter_import_file(io.StringIO(text)), self.user_id)
+
+        self.assertEqual(result['inserted'], 2)
+        self.assertEqual(result['errors'][0]['row'], 1)
+        self.assertIn('Invalid JSON', result['errors'][0]['error'])
+
+    def test_bulk_endpoint(self):
+        """Test the bulk endpoint accepts a JSON array"""
+        response = self.client.post(
+            '/api/auctions/bulk',
+            data=json.dumps([self._row(i) for i in range(3)]),
+            content_type='application/json',
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json['inserted'], 3)
+        self.assertEqual(response.json['errors'], [])
+
+if __name__ == '__main__':
+    unittest.main()
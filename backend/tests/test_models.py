@@ -0,0 +1,65 @@
+import unittest
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from models import User, Auction, Bid
+from utils import APIError, parse_auction_data, validate_bid_data
+
+class TestModels(unittest.TestCase):
+    def setUp(self):
+        self.payload = {
+            'title': 'Test Auction',
+            'description': 'Test description',
+            'startingPrice': '100',
+            'minimumIncrement': 5,
+            'endTime': (datetime.utcnow() + timedelta(days=7)).isoformat() + 'Z',
+            'category': '3'
+        }
+
+    def test_models_have_no_instance_dict(self):
+        """Test models are slotted"""
+        auction = Auction('t', 'd', 1, 1, datetime.utcnow(), ObjectId())
+        self.assertFalse(hasattr(auction, '__dict__'))
+        self.assertFalse(hasattr(Bid(ObjectId(), 1), '__dict__'))
+
+    def test_parse_auction_data(self):
+        """Test parsed fields are typed and build an auction directly"""
+        fields = parse_auction_data(self.payload)
+        self.assertEqual(fields['starting_price'], 100.0)
+        self.assertEqual(fields['category'], 3)
+        self.assertIsNotNone(fields['end_time'].tzinfo)
+
+        doc = Auction(seller_id=str(ObjectId()), **fields).to_dict()
+        self.assertEqual(doc['current_bid'], 100.0)
+        self.assertNotIn('_id', doc)
+
+    def test_parse_auction_data_errors(self):
+        """Test validation errors keep their status codes"""
+        with self.assertRaises(APIError) as ctx:
+            parse_auction_data({**self.payload, 'startingPrice': 'abc'})
+        self.assertEqual(ctx.exception.status_code, 422)
+
+        with self.assertRaises(APIError) as ctx:
+            parse_auction_data({**self.payload, 'endTime': '2000-01-01T00:00:00Z'})
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    def test_validate_bid_data_returns_amount(self):
+        """Test bid validation returns the parsed amount"""
+        self.assertEqual(validate_bid_data({'amount': '150'}, 100.0), 150.0)
+        with self.assertRaises(APIError):
+            validate_bid_data({'amount': 50}, 100.0)
+
+    def test_to_dict(self):
+        """Test documents use the stored key names"""
+        user = User('Test', 'User', 'test@example.com', '123', b'hash').to_dict()
+        self.assertEqual(
+            list(user), ['firstName', 'lastName', 'email', 'phone', 'password', 'created_at', 'rating', 'total_sales']
+        )
+        self.assertEqual(user['firstName'], 'Test')
+        bid = Bid(str(ObjectId()), '11').to_dict()
+        self.assertEqual(list(bid), ['user_id', 'amount', 'time'])
+        self.assertIsInstance(bid['user_id'], ObjectId)
+        self.assertEqual(bid['amount'], 11.0)
+
+if __name__ == '__main__':
+    unittest.main()
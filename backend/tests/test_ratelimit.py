@@ -0,0 +1,155 @@
+import unittest
+from unittest import mock
+from flask import json
+from app import app, db, rate_limiter
+from bson import ObjectId
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token, view_decorators
+from ratelimit import MemoryBucketStore, MongoBucketStore
+from storage import MemoryClient, clear_database
+
+class TestMemoryBucketStore(unittest.TestCase):
+    def test_burst_then_reject(self):
+        """Test bucket allows the burst and then reports a wait time"""
+        store = MemoryBucketStore()
+        for _ in range(3):
+            self.assertEqual(store.consume('k', 1, 3), 0)
+        self.assertGreater(store.consume('k', 1, 3), 0)
+
+    def test_keys_are_independent(self):
+        """Test buckets for different keys do not share tokens"""
+        store = MemoryBucketStore()
+        self.assertEqual(store.consume('a', 1, 1), 0)
+        self.assertGreater(store.consume('a', 1, 1), 0)
+        self.assertEqual(store.consume('b', 1, 1), 0)
+
+    def test_refilled_buckets_are_swept(self):
+        """Test buckets that have refilled are dropped and busy ones kept"""
+        store = MemoryBucketStore()
+        store.consume('idle', 1000, 1)
+        store.consume('busy', 0.001, 5)
+        with mock.patch('ratelimit.monotonic', return_value=store._next_sweep + 1):
+            self.assertEqual(store.consume('other', 1000, 1), 0)
+        self.assertEqual(len(store), 2)  # 'busy' and 'other'
+        for _ in range(4):
+            self.assertEqual(store.consume('busy', 0.001, 5), 0)
+        self.assertGreater(store.consume('busy', 0.001, 5), 0)
+
+class TestMongoBucketStore(unittest.TestCase):
+    def test_wait_does_not_take_tokens(self):
+        """Test buckets are shared through the collection, expire and can be checked without charging"""
+        collection = MemoryClient().auction_system.rate_limits
+        store = MongoBucketStore(collection, expire_after=600)
+        self.assertEqual(store.wait('k', 0.01, 2), 0)
+        for _ in range(2):
+            self.assertEqual(store.consume('k', 0.01, 2), 0)
+        self.assertGreater(store.wait('k', 0.01, 2), 0)
+        self.assertGreater(MongoBucketStore(collection).consume('k', 0.01, 2), 0)
+        self.assertEqual(store.wait('other', 0.01, 2), 0)
+        self.assertIsNone(collection.find_one({'_id': 'other'}))
+
+        ttl = [index for index in collection.index_information().values() if index['key'] == [('ts', 1)]]
+        self.assertEqual(ttl[0]['expireAfterSeconds'], 600)
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        clear_database(db)
+        rate_limiter.store.reset()
+        self.limits = app.config['RATE_LIMITS']
+        app.config['RATE_LIMITS'] = {'login': [{'scope': 'ip', 'rate': 0.01, 'burst': 2}]}
+
+    def tearDown(self):
+        app.config['RATE_LIMITS'] = self.limits
+        rate_limiter.store.reset()
+
+    def _login(self):
+        return self.client.post(
+            '/api/auth/login',
+            data=json.dumps({'email': 'nobody@example.com', 'password': 'wrongpass'}),
+            content_type='application/json'
+        )
+
+    def test_login_rate_limited(self):
+        """Test login is rejected with 429 and Retry-After once the burst is spent"""
+        self.assertEqual(self._login().status_code, 401)
+        self.assertEqual(self._login().status_code, 401)
+
+        response = self._login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+    def test_rate_limit_disabled(self):
+        """Test no request is rejected when rate limiting is switched off"""
+        app.config['RATE_LIMIT_ENABLED'] = False
+        try:
+            for _ in range(4):
+                self.assertEqual(self._login().status_code, 401)
+        finally:
+            app.config['RATE_LIMIT_ENABLED'] = True
+
+class TestPerUserLimits(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        clear_database(db)
+        rate_limiter.store.reset()
+        self.auction_id = str(db.auctions.insert_one({
+            'title': 'Test Auction',
+            'current_bid': 100.0,
+            'end_time': datetime.utcnow() + timedelta(days=1),
+            'bids': []
+        }).inserted_id)
+        self.limits = mock.patch.dict(app.config, {'RATE_LIMITS': {'place_bid': [
+            {'scope': 'user', 'rate': 0.01, 'burst': 2},
+            {'scope': 'auction', 'rate': 0.01, 'burst': 10}
+        ]}})
+        self.limits.start()
+
+    def tearDown(self):
+        self.limits.stop()
+        rate_limiter.store.reset()
+
+    def _bid(self, user_id, amount):
+        with app.app_context():
+            token = create_access_token(identity=user_id)
+        return app.test_client().post(
+            f'/api/auctions/{self.auction_id}/bid',
+            data=json.dumps({'amount': amount}),
+            content_type='application/json',
+            headers={'Authorization': f'Bearer {token}'}
+        )
+
+    def test_user_buckets_use_the_route_token(self):
+        """Test 'user' rules key on the JWT identity, decoded once per request"""
+        first, second = str(ObjectId()), str(ObjectId())
+        decode = mock.patch.object(
+            view_decorators, '_decode_jwt_from_request', wraps=view_decorators._decode_jwt_from_request
+        )
+        with decode as decoded:
+            self.assertEqual(self._bid(first, 110).status_code, 200)
+        self.assertEqual(decoded.call_count, 1)
+
+        self.assertEqual(self._bid(first, 120).status_code, 200)
+        response = self._bid(first, 130)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response.headers)
+        # Same address, different user
+        self.assertEqual(self._bid(second, 130).status_code, 200)
+
+    def test_refused_requests_do_not_drain_shared_buckets(self):
+        """Test a bid refused by its user's limit is not charged to the auction's bucket"""
+        app.config['RATE_LIMITS']['place_bid'][1]['burst'] = 3
+        greedy, other = str(ObjectId()), str(ObjectId())
+        self.assertEqual(self._bid(greedy, 110).status_code, 200)
+        self.assertEqual(self._bid(greedy, 120).status_code, 200)
+        for amount in (130, 140, 150):
+            self.assertEqual(self._bid(greedy, amount).status_code, 429)
+        self.assertEqual(self._bid(other, 130).status_code, 200)
+        # The auction's bucket is empty now, whoever bids
+        self.assertEqual(self._bid(str(ObjectId()), 140).status_code, 429)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from app import app, auction_reads, db
+from bson import ObjectId
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+
+from storage import clear_database
+from utils import APIError, SingleFlight, coalesced, find_auction_by_id, user_auctions_flight, user_bids_flight
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.001)
+
+class TestSingleFlight(unittest.TestCase):
+    def _run_concurrently(self, group, key, func, count):
+        results = [None] * count
+
+        def call(i):
+            try:
+                results[i] = group.do(key, func)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test callers arriving while a call is in flight get its result"""
+        group = SingleFlight('test-share')
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {'value': 42}
+
+        threads, results = self._run_concurrently(group, 'k', fetch, 8)
+        wait_until(lambda: group.coalesced == 7)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(group.stats(), {'executions': 1, 'coalesced': 7, 'in_flight': 0})
+
+    def test_errors_are_shared_and_not_cached(self):
+        """Test followers get the leader's exception and the next call runs again"""
+        group = SingleFlight('test-errors')
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise APIError('Auction not found', 404)
+
+        threads, results = self._run_concurrently(group, 'k', fail, 3)
+        wait_until(lambda: group.coalesced == 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(all(isinstance(result, APIError) for result in results))
+        self.assertEqual(group.do('k', lambda: 'fresh'), 'fresh')
+        self.assertEqual(group.executions, 2)
+
+    def test_forget_starts_a_new_flight(self):
+        """Test a forgotten key is fetched again even while the old flight runs"""
+        group = SingleFlight('test-forget')
+        release = threading.Event()
+        threads, _ = self._run_concurrently(group, 'k', lambda: release.wait(5), 1)
+        wait_until(lambda: group.stats()['in_flight'] == 1)
+
+        group.forget('k')
+        self.assertEqual(group.do('k', lambda: 'after write'), 'after write')
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    def test_forget_scope(self):
+        """Test forgetting a scope drops every variant of the call made for it"""
+        group = SingleFlight('test-scope')
+        release = threading.Event()
+
+        @coalesced(group, scope=0)
+        def listing(user_id, fields=None):
+            release.wait(5)
+            return user_id
+
+        threads = [threading.Thread(target=listing, args=('u1', fields)) for fields in (None, 'title')]
+        threads.append(threading.Thread(target=listing, args=('u2',)))
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: group.stats()['in_flight'] == 3)
+
+        group.forget_scope('u1')
+        self.assertEqual(group.stats()['in_flight'], 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+class TestAuctionReadCoalescing(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.db = db
+        clear_database(self.db)
+        self.auction_id = str(self.db.auctions.insert_one({
+            'title': 'Viral auction',
+            'current_bid': 100.0,
+            'end_time': datetime(2030, 1, 1),
+            'bids': []
+        }).inserted_id)
+
+    def test_concurrent_polls_share_one_fetch(self):
+        """Test simultaneous polls of one auction cause a single database read"""
+        release = threading.Event()
+        fetches = []
+
+        def slow_find(db, auction_id):
+            fetches.append(auction_id)
+            release.wait(5)
+            return find_auction_by_id(db, auction_id)
+
+        responses = []
+        before = auction_reads.stats()
+
+        def poll():
+            responses.append(app.test_client().get(f'/api/auctions/{self.auction_id}'))
+
+        with mock.patch('app.find_auction_by_id', slow_find):
+            threads = [threading.Thread(target=poll) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            wait_until(lambda: auction_reads.coalesced - before['coalesced'] == 9)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual({response.status_code for response in responses}, {200})
+        self.assertEqual(len({response.data for response in responses}), 1)
+        self.assertEqual(responses[0].json['title'], 'Viral auction')
+
+        admin_id = str(self.db.users.insert_one({'email': 'ops@example.com', 'role': 'admin'}).inserted_id)
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {create_access_token(identity=admin_id)}'}
+        metrics = app.test_client().get('/api/metrics', headers=headers).json['single_flight']
+        self.assertGreaterEqual(metrics['get_auction']['coalesced'], 9)
+
+    def test_writes_forget_user_listings(self):
+        """Test a bid forgets the bidder's bids and a new auction the seller's listing"""
+        user_id = str(ObjectId())
+        with app.app_context():
+            headers = {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+        client = app.test_client()
+        with mock.patch.dict(app.config, {'RATE_LIMIT_ENABLED': False}), \
+                mock.patch.object(user_bids_flight, 'forget_scope') as forget_bids, \
+                mock.patch.object(user_auctions_flight, 'forget_scope') as forget_auctions:
+            client.post(f'/api/auctions/{self.auction_id}/bid', json={'amount': 150}, headers=headers)
+            client.post('/api/auctions', json={
+                'title': 'Lens', 'description': 'x', 'startingPrice': 5, 'minimumIncrement': 1,
+                'endTime': '2030-01-01T00:00:00Z', 'category': 1
+            }, headers=headers)
+        forget_bids.assert_called_once_with(user_id)
+        forget_auctions.assert_called_once_with(user_id)
+
+    def test_missing_auction(self):
+        """Test a coalesced read still reports 404 for unknown auctions"""
+        response = app.test_client().get(f'/api/auctions/{ObjectId()}')
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import pytest
+from unittest import mock
+from flask import Flask, json
+from app import app, bid_book
+from bson import ObjectId
+from datetime import datetime, timedelta
+import mongomock
+from flask_jwt_extended import create_access_token
+
+from bidbook import BidBook
+from config import Config
+from summaries import add_summaries
+from utils import APIError, soft_close_deadline
+
+class TestSoftCloseDeadline(unittest.TestCase):
+    def test_extends_inside_window(self):
+        """Test a late bid leaves at least the extension on the clock"""
+        end = datetime(2030, 1, 1, 12, 0, 0)
+        bid_time = end - timedelta(seconds=30)
+        self.assertEqual(soft_close_deadline(end, bid_time, 120, 120), bid_time + timedelta(seconds=120))
+
+    def test_no_extension_outside_window_or_when_disabled(self):
+        """Test early bids and a zero extension leave end_time alone"""
+        end = datetime(2030, 1, 1, 12, 0, 0)
+        self.assertIsNone(soft_close_deadline(end, end - timedelta(minutes=10), 120, 120))
+        self.assertIsNone(soft_close_deadline(end, end - timedelta(seconds=30), 120, 0))
+
+@pytest.mark.usefixtures('app_db')
+class TestSoftCloseRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.config = mock.patch.dict(app.config, {'RATE_LIMIT_ENABLED': False})
+        self.config.start()
+        self.client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity=str(ObjectId()))
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def tearDown(self):
+        self.config.stop()
+
+    def _auction_ending_in(self, seconds):
+        return self.db.auctions.insert_one({
+            'title': 'Test Auction',
+            'current_bid': 100.0,
+            'end_time': datetime.utcnow() + timedelta(seconds=seconds),
+            'bids': []
+        }).inserted_id
+
+    def _bid(self, auction_id, amount):
+        return self.client.post(
+            f'/api/auctions/{auction_id}/bid',
+            data=json.dumps({'amount': amount}),
+            content_type='application/json',
+            headers=self.headers
+        )
+
+    def test_direct_path_extends_atomically(self):
+        """Test a late bid on the direct path extends end_time in the same update"""
+        auction_id = self._auction_ending_in(30)
+        with mock.patch.dict(app.config, {'BIDBOOK_ENABLED': False}):
+            self.assertEqual(self._bid(auction_id, 150).status_code, 200)
+
+        auction = self.db.auctions.find_one({'_id': auction_id})
+        self.assertEqual(auction['current_bid'], 150.0)
+        self.assertGreater(auction['end_time'], datetime.utcnow() + timedelta(seconds=110))
+
+    def test_early_bid_does_not_extend(self):
+        """Test bids outside the window leave end_time unchanged"""
+        auction_id = self._auction_ending_in(3600)
+        end_time = self.db.auctions.find_one({'_id': auction_id})['end_time']
+        self.assertEqual(self._bid(auction_id, 150).status_code, 200)
+        self.assertEqual(self.db.auctions.find_one({'_id': auction_id})['end_time'], end_time)
+
+    def test_bid_book_extension_is_flushed(self):
+        """Test an extension taken in the bid book reaches MongoDB and the listing"""
+        auction_id = self._auction_ending_in(30)
+        self.assertEqual(self._bid(auction_id, 150).status_code, 200)
+        self.assertGreater(bid_book.get(auction_id).end_time, datetime.utcnow() + timedelta(seconds=110))
+
+        bid_book.flush()
+        auction = self.db.auctions.find_one({'_id': auction_id})
+        self.assertGreater(auction['end_time'], datetime.utcnow() + timedelta(seconds=110))
+
+    def test_extension_reorders_ending_soon_listing(self):
+        """Test a hot extension moves the summary's end_time when the bid is flushed"""
+        sniped, other = self._auction_ending_in(30), self._auction_ending_in(60)
+        add_summaries(self.db, self.db.auctions.find())
+        self.assertEqual([a['_id'] for a in self.client.get('/api/auctions?sort=ending').json], [str(sniped), str(other)])
+
+        self.assertEqual(self._bid(sniped, 150).status_code, 200)
+        bid_book.flush()
+        self.assertEqual([a['_id'] for a in self.client.get('/api/auctions?sort=ending').json], [str(other), str(sniped)])
+
+class TestSoftCloseLoad(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = mongomock.MongoClient().auction_system
+        self.app = Flask(__name__)
+        self.app.config.from_object(Config)
+        self.app.config.update(
+            BIDBOOK_WAL_PATH=os.path.join(self.tmp, 'bidbook.wal'),
+            SOFT_CLOSE_WINDOW=2,
+            SOFT_CLOSE_EXTENSION=2
+        )
+        self.book = BidBook(self.app, lambda: self.db)
+        self.extensions = []
+        self.book.deadline_listeners.append(lambda auction_id, end_time: self.extensions.append(end_time))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_concurrent_late_bids(self):
+        """Test concurrent bids inside the window keep extending and never land after close"""
+        auction_id = self.db.auctions.insert_one({
+            'title': 'Sniped',
+            'current_bid': 1.0,
+            'end_time': datetime.utcnow() + timedelta(seconds=1),
+            'bids': []
+        }).inserted_id
+        hot = self.book.promote(self.db.auctions.find_one({'_id': auction_id}))
+        accepted = []
+        lock = threading.Lock()
+
+        def sniper():
+            for _ in range(40):
+                try:
+                    bid = self.book.place(hot, str(ObjectId()), {'amount': hot.current_bid + 1})
+                except APIError:
+                    continue
+                with lock:
+                    accepted.append((bid.amount, datetime.utcnow(), hot.end_time))
+
+        threads = [threading.Thread(target=sniper) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.book.flush()
+
+        auction = self.db.auctions.find_one({'_id': auction_id})
+        amounts = [bid['amount'] for bid in auction['bids']]
+        self.assertEqual(amounts, sorted(set(amounts)))
+        self.assertEqual(auction['current_bid'], amounts[-1])
+        self.assertTrue(self.extensions)
+        # Every accepted bid left at least the extension (minus scheduling slack) on the clock
+        for _, placed_at, end_time in accepted:
+            self.assertGreaterEqual(end_time, placed_at + timedelta(seconds=1.5))
+        # MongoDB stores datetimes with millisecond precision
+        self.assertAlmostEqual(auction['end_time'], max(self.extensions), delta=timedelta(milliseconds=1))
+
+if __name__ == '__main__':
+    unittest.main()
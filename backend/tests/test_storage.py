@@ -0,0 +1,138 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import mongomock
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+import storage
+from storage import MemoryClient, clear_database, connect
+
+class TestStorage(unittest.TestCase):
+    def test_connect(self):
+        """Test the backend is picked from config"""
+        db = connect({'STORAGE_BACKEND': 'memory', 'DATABASE_NAME': 'example'})
+        self.assertEqual(db.name, 'example')
+        db.users.insert_one({'email': 'a@example.com'})
+        clear_database(db)
+        self.assertEqual(db.list_collection_names(), [])
+        with self.assertRaises(ValueError):
+            connect({'STORAGE_BACKEND': 'sqlite', 'DATABASE_NAME': 'example'})
+
+class TestMemoryBackend(unittest.TestCase):
+    """The memory backend answers queries like mongomock, whether or not an index is used"""
+    def setUp(self):
+        self.db = MemoryClient().example
+        self.reference = mongomock.MongoClient().example
+        now = datetime(2030, 1, 1)
+        sellers = [ObjectId() for _ in range(3)]
+        self.bidder = ObjectId()
+        self.docs = [{
+            '_id': ObjectId(),
+            'seller_id': sellers[i % 3],
+            'category': [i % 4, None, 1.0, 'one'][i % 4],
+            'end_time': now + timedelta(hours=i),
+            'bids': [{'user_id': self.bidder, 'amount': float(i)}] if i % 2 else [],
+            'tags': ['a', 'b'] if i % 3 else {'nested': i}
+        } for i in range(30)]
+        for collection in (self.db.auctions, self.reference.auctions):
+            collection.insert_many([dict(doc) for doc in self.docs])
+        for keys in ('seller_id', 'category', 'end_time', 'bids.user_id', 'tags'):
+            self.db.auctions.create_index(keys)
+        self.sellers = sellers
+        self.now = now
+
+    def assertSameResults(self, filter, **kwargs):
+        self.assertEqual(list(self.db.auctions.find(filter, **kwargs)), list(self.reference.auctions.find(filter, **kwargs)), filter)
+
+    def test_queries_match_mongomock(self):
+        """Test indexed, partly indexed and scanned filters return the same documents in the same order"""
+        for filter in [
+            {},
+            {'_id': self.docs[5]['_id']},
+            {'_id': {'$in': [self.docs[7]['_id'], self.docs[2]['_id'], ObjectId()]}},
+            {'seller_id': self.sellers[1]},
+            {'seller_id': {'$in': self.sellers[:2]}, 'category': 2},
+            {'category': 1},
+            {'category': None},
+            {'category': {'$gte': 1}},
+            {'end_time': {'$gt': self.now + timedelta(hours=10), '$lte': self.now + timedelta(hours=20)}},
+            {'end_time': {'$lt': self.now + timedelta(hours=3)}, 'seller_id': self.sellers[0]},
+            {'bids.user_id': self.bidder},
+            {'tags': 'a'},
+            {'tags': {'nested': 3}},
+            {'$and': [{'seller_id': self.sellers[2]}, {'$or': [{'category': 0}, {'category': 'one'}]}]},
+        ]:
+            self.assertSameResults(filter)
+
+        self.assertSameResults({'seller_id': self.sellers[0]}, projection={'bids.amount': 1}, sort=[('end_time', -1)], limit=3)
+        self.assertSameResults({}, projection={'bids': 0, 'tags': 0}, sort=[('category', 1), ('_id', -1)], skip=4)
+
+    def test_indexes_follow_updates(self):
+        """Test updates and deletes move documents between index entries"""
+        moved = self.docs[0]['_id']
+        for db in (self.db, self.reference):
+            db.auctions.update_one({'_id': moved}, {'$set': {'seller_id': self.sellers[2]}, '$max': {'end_time': self.now}})
+            db.auctions.update_many({'category': 1}, {'$inc': {'category': 10}, '$push': {'bids': {'$each': [{'amount': 1.0}]}}})
+            db.auctions.delete_many({'seller_id': self.sellers[1], 'category': {'$lt': 2}})
+        for filter in ({'seller_id': self.sellers[0]}, {'seller_id': self.sellers[2]}, {'category': 11}, {'category': 1}):
+            self.assertSameResults(filter)
+
+    def test_reads_are_copies_with_bson_semantics(self):
+        """Test returned documents can be changed freely and datetimes are stored like MongoDB stores them"""
+        doc = self.db.auctions.find_one({'_id': self.docs[0]['_id']})
+        doc['bids'].append('changed')
+        self.assertEqual(self.db.auctions.find_one({'_id': self.docs[0]['_id']})['bids'], [])
+
+        inserted = self.db.times.insert_one({'at': datetime(2030, 1, 1, 12, 0, 0, 123456)}).inserted_id
+        self.assertEqual(self.db.times.find_one(inserted)['at'], datetime(2030, 1, 1, 12, 0, 0, 123000))
+
+    def test_unique_indexes_and_upserts(self):
+        """Test unique indexes reject duplicates and upserts start from the filter"""
+        watchlists = self.db.watchlists
+        watchlists.create_index([('user_id', 1), ('auction_id', 1)], unique=True)
+        result = watchlists.update_one({'user_id': 1, 'auction_id': 2}, {'$setOnInsert': {'n': 1}}, upsert=True)
+        self.assertIsNotNone(result.upserted_id)
+        self.assertEqual(watchlists.update_one({'user_id': 1, 'auction_id': 2}, {'$setOnInsert': {'n': 2}}, upsert=True).matched_count, 1)
+        self.assertEqual(watchlists.find_one({'user_id': 1}, {'_id': 0}), {'user_id': 1, 'auction_id': 2, 'n': 1})
+        with self.assertRaises(DuplicateKeyError):
+            watchlists.insert_one({'user_id': 1, 'auction_id': 2})
+
+        bucket = self.db.buckets.find_one_and_update(
+            {'_id': 'ip'}, [{'$set': {'tokens': {'$subtract': [{'$ifNull': ['$tokens', 5]}, 1]}}}],
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        self.assertEqual(bucket, {'_id': 'ip', 'tokens': 4})
+
+    def test_bulk_write_reports_errors(self):
+        """Test unordered bulk writes apply what they can and report the rest"""
+        existing = self.docs[0]['_id']
+        with self.assertRaises(BulkWriteError) as raised:
+            self.db.auctions.bulk_write([
+                InsertOne({'_id': existing}),
+                UpdateOne({'_id': existing}, {'$set': {'category': 9}}),
+                DeleteOne({'_id': self.docs[1]['_id']})
+            ], ordered=False)
+        details = raised.exception.details
+        self.assertEqual([error['index'] for error in details['writeErrors']], [0])
+        self.assertEqual((details['nModified'], details['nRemoved']), (1, 1))
+        self.assertEqual(self.db.auctions.count_documents({'category': 9}), 1)
+
+    def test_ttl_and_rename(self):
+        """Test TTL indexes expire documents on their sweep and rename swaps collections"""
+        events = self.db.events
+        events.create_index('created_at', expireAfterSeconds=60)
+        events.insert_many([{'created_at': datetime.utcnow() - timedelta(minutes=5)}, {'created_at': datetime.utcnow()}])
+        with mock.patch.object(storage, 'monotonic', return_value=float('inf')):
+            self.assertEqual(events.count_documents({}), 1)
+
+        scratch = self.db.scratch
+        scratch.insert_one({'_id': 1})
+        scratch.rename('events', dropTarget=True)
+        self.assertEqual(list(self.db.events.find()), [{'_id': 1}])
+        self.assertNotIn('scratch', self.db.list_collection_names())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import base64
+import unittest
+import pytest
+from unittest import mock
+from flask import json
+from app import app, bid_book
+from bson import ObjectId
+from datetime import datetime, timedelta
+import mongomock
+from flask_jwt_extended import create_access_token
+
+import summaries
+from importer import import_auctions
+from summaries import copy_counters, rebuild_summaries, refresh_summaries, summarize
+from sync import next_update_seq, record_tombstone
+
+PNG = b'\x89PNG\r\n\x1a\nfake-image-bytes'
+
+class TestSummaries(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient().auction_system
+        self.seller_id = ObjectId()
+
+    def _auction(self, **overrides):
+        auction = {
+            'title': 'Camera',
+            'description': 'Description ' * 50,
+            'starting_price': 100.0,
+            'current_bid': 120.0,
+            'end_time': datetime(2030, 1, 1),
+            'image_url': 'data:image/png;base64,' + base64.b64encode(PNG).decode(),
+            'seller_id': self.seller_id,
+            'category': 2,
+            'created_at': datetime(2029, 1, 1),
+            'bids': [{'user_id': ObjectId(), 'amount': 120.0, 'time': datetime(2029, 6, 1)}]
+        }
+        auction.update(overrides)
+        return auction
+
+    def test_summary_drops_bids_and_image_data(self):
+        """Test summaries carry counts and a thumbnail reference instead of the heavy fields"""
+        auction_id = self.db.auctions.insert_one(self._auction()).inserted_id
+        rebuild_summaries(self.db)
+
+        summary = self.db.auction_summaries.find_one({'_id': auction_id})
+        self.assertEqual(summary['bid_count'], 1)
+        self.assertEqual(summary['thumbnail_url'], f'/api/auctions/{auction_id}/image')
+        self.assertNotIn('bids', summary)
+        self.assertNotIn('image_url', summary)
+        self.assertNotIn('description', summary)
+        self.assertEqual(summary, summarize(self.db.auctions.find_one({'_id': auction_id})))
+
+    def test_copy_counters_leaves_bids_alone(self):
+        """Test counter flushes only set the counts, so a bid recorded meanwhile is kept"""
+        auction_id = self.db.auctions.insert_one(self._auction()).inserted_id
+        rebuild_summaries(self.db)
+        self.db.auctions.update_one({'_id': auction_id}, {'$inc': {'view_count': 3, 'watcher_count': 1}})
+        # record_bid raised the summary after the auction was read
+        summaries.record_bid(self.db, auction_id, 150.0, next_update_seq())
+
+        copy_counters(self.db, [auction_id])
+        summary = self.db.auction_summaries.find_one({'_id': auction_id})
+        self.assertEqual((summary['view_count'], summary['watcher_count']), (3, 1))
+        self.assertEqual((summary['current_bid'], summary['bid_count']), (150.0, 2))
+
+    def test_refresh_updates_and_removes(self):
+        """Test refresh recomputes changed auctions and drops deleted ones"""
+        kept, deleted = self.db.auctions.insert_many([self._auction(), self._auction(image_url=None)]).inserted_ids
+        rebuild_summaries(self.db)
+        self.db.auctions.update_one({'_id': kept}, {'$set': {'title': 'Lens'}})
+        self.db.auctions.delete_one({'_id': deleted})
+
+        refresh_summaries(self.db, [kept, deleted])
+
+        self.assertEqual(self.db.auction_summaries.find_one({'_id': kept})['title'], 'Lens')
+        self.assertIsNone(self.db.auction_summaries.find_one({'_id': deleted}))
+
+    def test_rebuild_replaces_stale_view(self):
+        """Test a rebuild swaps in a fresh view and removes orphans"""
+        self.db.auction_summaries.insert_one({'_id': ObjectId(), 'title': 'Orphan'})
+        self.db.auctions.insert_many([self._auction(title=f'Item {i}') for i in range(5)])
+
+        self.assertEqual(rebuild_summaries(self.db, batch_size=2), 5)
+        self.assertEqual(self.db.auction_summaries.count_documents({}), 5)
+        self.assertIsNone(self.db.auction_summaries.find_one({'title': 'Orphan'}))
+
+    def test_rebuild_keeps_writes_made_meanwhile(self):
+        """Test writes during a rebuild survive the swap and no scratch collection is left"""
+        changed, deleted = self.db.auctions.insert_many([self._auction(), self._auction()]).inserted_ids
+        scan = summaries._summary_cursor
+        writes = [True]
+
+        def scan_with_writes(db, *args, **kwargs):
+            for summary in scan(db, *args, **kwargs):
+                if writes and writes.pop():
+                    # Another worker edits one auction and deletes the other mid-scan
+                    self.db.auctions.update_one({'_id': changed}, {'$set': {'title': 'Lens', 'update_seq': next_update_seq()}})
+                    self.db.auctions.delete_one({'_id': deleted})
+                    record_tombstone(self.db, {'_id': deleted}, 60)
+                    refresh_summaries(self.db, [changed, deleted])
+                yield summary
+
+        with mock.patch('summaries._summary_cursor', scan_with_writes):
+            rebuild_summaries(self.db)
+
+        self.assertEqual(self.db.auction_summaries.find_one({'_id': changed})['title'], 'Lens')
+        self.assertIsNone(self.db.auction_summaries.find_one({'_id': deleted}))
+        self.assertEqual([name for name in self.db.list_collection_names() if 'rebuild' in name], [])
+
+    def test_import_writes_summaries(self):
+        """Test bulk imports add a summary per inserted auction"""
+        row = {
+            'title': 'Imported', 'description': 'x', 'startingPrice': 5, 'minimumIncrement': 1,
+            'endTime': (datetime.utcnow() + timedelta(days=1)).isoformat() + 'Z', 'category': 1
+        }
+        import_auctions(self.db, [row, dict(row, startingPrice='bad'), row], str(self.seller_id))
+        self.assertEqual(self.db.auction_summaries.count_documents({'seller_id': self.seller_id}), 2)
+
+@pytest.mark.usefixtures('app_db')
+class TestSummaryRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.user_id = str(ObjectId())
+        self.config = mock.patch.dict(app.config, {'RATE_LIMIT_ENABLED': False})
+        self.config.start()
+        self.client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity=self.user_id)
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def tearDown(self):
+        self.config.stop()
+
+    def _create(self, title, category=1):
+        response = self.client.post('/api/auctions', data=json.dumps({
+            'title': title,
+            'description': 'Description',
+            'startingPrice': 100,
+            'minimumIncrement': 5,
+            'endTime': (datetime.utcnow() + timedelta(days=2)).isoformat() + 'Z',
+            'category': category,
+            'imageUrl': 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+        }), content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        return response.json['_id']
+
+    def test_listing_follows_writes(self):
+        """Test created, updated and bid-on auctions show up in the listing"""
+        auction_id = self._create('Vintage camera')
+        self.client.put(f'/api/auctions/{auction_id}', data=json.dumps({'title': 'Vintage lens'}),
+                        content_type='application/json', headers=self.headers)
+        self.client.post(f'/api/auctions/{auction_id}/bid', data=json.dumps({'amount': 150}),
+                         content_type='application/json', headers=self.headers)
+
+        listing = self.client.get('/api/auctions').json
+        self.assertEqual(len(listing), 1)
+        self.assertEqual(listing[0]['title'], 'Vintage lens')
+        self.assertEqual(listing[0]['current_bid'], 150.0)
+        self.assertEqual(listing[0]['bid_count'], 1)
+        self.assertNotIn('bids', listing[0])
+
+    def test_search_category_and_seller(self):
+        """Test title search, category filter and the seller listing read the view"""
+        self._create('Red bicycle', category=1)
+        self._create('Blue bicycle', category=2)
+        self._create('Red lamp', category=4)
+
+        titles = lambda response: sorted(auction['title'] for auction in response.json)
+        self.assertEqual(titles(self.client.get('/api/auctions?q=BICYCLE')), ['Blue bicycle', 'Red bicycle'])
+        self.assertEqual(titles(self.client.get('/api/auctions?q=red&category=4')), ['Red lamp'])
+        self.assertEqual(self.client.get('/api/auctions?category=x').status_code, 422)
+
+        mine = self.client.get(f'/api/users/{self.user_id}/auctions', headers=self.headers)
+        self.assertEqual(len(mine.json), 3)
+
+    def test_bid_book_flush_refreshes_summary(self):
+        """Test bids on hot auctions, and their soft-close extensions, reach the view when the bid book flushes"""
+        end_time = datetime.utcnow() + timedelta(minutes=1)
+        auction_id = self.db.auctions.insert_one({
+            'title': 'Closing', 'current_bid': 100.0, 'starting_price': 100.0,
+            'end_time': end_time, 'seller_id': ObjectId(), 'bids': []
+        }).inserted_id
+        rebuild_summaries(self.db)
+        with mock.patch.object(bid_book, 'flush'):  # keep the flusher thread out of the way
+            for amount in (110, 120):
+                self.client.post(f'/api/auctions/{auction_id}/bid', data=json.dumps({'amount': amount}),
+                                 content_type='application/json', headers=self.headers)
+            # Placing hot bids does not write to the view
+            self.assertEqual(self.db.auction_summaries.find_one({'_id': auction_id})['bid_count'], 0)
+        bid_book.flush()
+
+        summary = self.db.auction_summaries.find_one({'_id': auction_id})
+        self.assertEqual(summary['current_bid'], 120.0)
+        self.assertEqual(summary['bid_count'], 2)
+        self.assertGreater(summary['end_time'], end_time)
+        self.assertEqual(summary['end_time'], self.db.auctions.find_one({'_id': auction_id})['end_time'])
+
+    def test_thumbnail(self):
+        """Test the thumbnail reference serves the decoded image with an ETag"""
+        auction_id = self._create('Camera')
+        thumbnail_url = self.client.get('/api/auctions').json[0]['thumbnail_url']
+
+        response = self.client.get(thumbnail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'image/png')
+        self.assertEqual(response.data, PNG)
+
+        cached = self.client.get(thumbnail_url, headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(self.client.get(f'/api/auctions/{ObjectId()}/image').status_code, 404)
+
+    def test_hosted_image_redirects(self):
+        """Test an http(s) image_url redirects and other non-data URLs are not found"""
+        hosted, other = self.db.auctions.insert_many([
+            {'title': 'Hosted', 'image_url': 'https://cdn.example.com/camera.png'},
+            {'title': 'Other', 'image_url': 'ftp://example.com/camera.png'}
+        ]).inserted_ids
+
+        response = self.client.get(f'/api/auctions/{hosted}/image')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers['Location'], 'https://cdn.example.com/camera.png')
+        self.assertEqual(self.client.get(f'/api/auctions/{other}/image').status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
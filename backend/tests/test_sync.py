@@ -0,0 +1,149 @@
+import time
+import unittest
+import pytest
+from unittest import mock
+from flask import json
+from app import app, summaries
+from bson import ObjectId
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+
+from sync import next_update_seq
+
+class TestUpdateSeq(unittest.TestCase):
+    def test_strictly_increasing(self):
+        """Test sequences never repeat or go backwards within a process"""
+        seqs = [next_update_seq() for _ in range(1000)]
+        self.assertEqual(seqs, sorted(set(seqs)))
+        self.assertAlmostEqual(seqs[-1] / 1e6, time.time(), delta=5)
+
+@pytest.mark.usefixtures('app_db')
+class TestDeltaSync(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.user_id = str(ObjectId())
+        self.config = mock.patch.dict(app.config, {
+            'RATE_LIMIT_ENABLED': False,
+            'SYNC_SETTLE': 0
+        })
+        self.config.start()
+        self.client = app.test_client()
+        self.headers = self._headers(self.user_id)
+
+    def tearDown(self):
+        self.config.stop()
+
+    def _headers(self, user_id):
+        with app.app_context():
+            token = create_access_token(identity=user_id)
+        return {'Authorization': f'Bearer {token}'}
+
+    def _create(self, title):
+        response = self.client.post('/api/auctions', data=json.dumps({
+            'title': title,
+            'description': 'Description',
+            'startingPrice': 100,
+            'minimumIncrement': 5,
+            'endTime': (datetime.utcnow() + timedelta(days=2)).isoformat() + 'Z',
+            'category': 1
+        }), content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        return response.json['_id']
+
+    def _sync(self, path, cursor, headers=None):
+        response = self.client.get(f'{path}?since={cursor}', headers=headers or {})
+        self.assertEqual(response.status_code, 200)
+        return response.json
+
+    def test_listing_delta(self):
+        """Test a poll returns only auctions written after the cursor"""
+        first = self._create('First')
+        cursor = self.client.get('/api/auctions').headers['X-Sync-Cursor']
+        second = self._create('Second')
+
+        delta = self._sync('/api/auctions', cursor)
+        self.assertEqual([auction['_id'] for auction in delta['changes']], [second])
+        self.assertFalse(delta['reset'])
+
+        self.client.post(f'/api/auctions/{first}/bid', data=json.dumps({'amount': 150}),
+                         content_type='application/json', headers=self._headers(str(ObjectId())))
+        delta = self._sync('/api/auctions', delta['cursor'])
+        self.assertEqual([(a['_id'], a['current_bid']) for a in delta['changes']], [(first, 150.0)])
+
+        self.assertEqual(self._sync('/api/auctions', delta['cursor'])['changes'], [])
+
+    def test_settle_window_resends_recent_writes(self):
+        """Test the cursor trails the clock so recent writes are sent again, not skipped"""
+        with mock.patch.dict(app.config, {'SYNC_SETTLE': 60}):
+            cursor = self.client.get('/api/auctions').headers['X-Sync-Cursor']
+            auction_id = self._create('Recent')
+            delta = self._sync('/api/auctions', cursor)
+            again = self._sync('/api/auctions', delta['cursor'])
+        self.assertEqual([a['_id'] for a in again['changes']], [auction_id])
+
+    def test_ended_auctions_are_reported(self):
+        """Test an auction whose end time passed since the cursor shows up without a write"""
+        cursor = self.client.get('/api/auctions').headers['X-Sync-Cursor']
+        time.sleep(0.002)
+        ended = self.db.auctions.insert_one({
+            'title': 'Ended', 'current_bid': 1.0, 'seller_id': ObjectId(), 'bids': [],
+            'end_time': datetime.utcnow(), 'update_seq': 1
+        }).inserted_id
+        self.db.auctions.insert_one({
+            'title': 'Old', 'current_bid': 1.0, 'seller_id': ObjectId(), 'bids': [],
+            'end_time': datetime.utcnow() - timedelta(days=1), 'update_seq': 1
+        })
+        summaries.changed(list(self.db.auctions.distinct('_id')))
+
+        delta = self._sync('/api/auctions', cursor)
+        self.assertEqual([a['_id'] for a in delta['changes']], [str(ended)])
+
+    def test_delete_leaves_tombstone(self):
+        """Test deleted auctions are reported by id on the listing and seller endpoints"""
+        auction_id = self._create('Short lived')
+        cursor = self.client.get('/api/auctions').headers['X-Sync-Cursor']
+
+        other = self.client.delete(f'/api/auctions/{auction_id}', headers=self._headers(str(ObjectId())))
+        self.assertEqual(other.status_code, 403)
+        self.assertEqual(self.client.delete(f'/api/auctions/{auction_id}', headers=self.headers).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/auctions/{auction_id}').status_code, 404)
+
+        for path, headers in (('/api/auctions', None), (f'/api/users/{self.user_id}/auctions', self.headers)):
+            delta = self._sync(path, cursor, headers)
+            self.assertEqual(delta['changes'], [])
+            self.assertEqual(delta['deleted'], [auction_id])
+        self.assertEqual(self._sync(f'/api/users/{ObjectId()}/auctions', cursor, self.headers)['deleted'], [])
+
+    def test_auction_with_bids_cannot_be_deleted(self):
+        """Test deleting is refused once someone has bid"""
+        auction_id = self._create('Popular')
+        self.client.post(f'/api/auctions/{auction_id}/bid', data=json.dumps({'amount': 150}),
+                         content_type='application/json', headers=self._headers(str(ObjectId())))
+        response = self.client.delete(f'/api/auctions/{auction_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_user_bids_delta(self):
+        """Test the per-user bids endpoint only returns auctions that changed"""
+        bidder = str(ObjectId())
+        first, second = self._create('One'), self._create('Two')
+        for auction_id in (first, second):
+            self.client.post(f'/api/auctions/{auction_id}/bid', data=json.dumps({'amount': 150}),
+                             content_type='application/json', headers=self._headers(bidder))
+        cursor = self.client.get(f'/api/users/{bidder}/bids', headers=self.headers).headers['X-Sync-Cursor']
+        self.client.post(f'/api/auctions/{second}/bid', data=json.dumps({'amount': 200}),
+                         content_type='application/json', headers=self._headers(str(ObjectId())))
+
+        delta = self._sync(f'/api/users/{bidder}/bids', cursor, self.headers)
+        self.assertEqual([a['_id'] for a in delta['changes']], [second])
+
+    def test_stale_or_invalid_cursor(self):
+        """Test cursors older than the tombstone TTL reset and garbage is rejected"""
+        self._create('Anything')
+        delta = self._sync('/api/auctions', 0)
+        self.assertTrue(delta['reset'])
+        self.assertEqual(len(delta['changes']), 1)
+        self.assertEqual(self.client.get('/api/auctions?since=yesterday').status_code, 422)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import hashlib
+import http.client
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import pytest
+from unittest import mock
+from flask import json
+from app import app
+from bson import ObjectId
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from werkzeug.datastructures import FileStorage
+from werkzeug.serving import make_server
+from werkzeug.test import encode_multipart
+
+from uploads import ImageSpool, detect_image_type, stored_image_path
+from utils import APIError
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 200
+
+class TestImageSpool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_detect_image_type(self):
+        """Test formats are recognised from their leading bytes"""
+        self.assertEqual(detect_image_type(PNG[:12]), ('image/png', 'png'))
+        self.assertEqual(detect_image_type(b'\xff\xd8\xff\xe0' + b'\x00' * 8), ('image/jpeg', 'jpg'))
+        self.assertEqual(detect_image_type(b'RIFF\x00\x00\x00\x00WEBP'), ('image/webp', 'webp'))
+        self.assertIsNone(detect_image_type(b'<svg xmlns="'))
+
+    def test_hashes_across_small_writes(self):
+        """Test the digest and format are right when the signature is split over writes"""
+        spool = ImageSpool(self.tmp, 1024)
+        for i in range(0, len(PNG), 5):
+            spool.write(PNG[i:i + 5])
+        spool.finish()
+        self.assertEqual(spool.sha256, hashlib.sha256(PNG).hexdigest())
+        self.assertEqual(spool.mimetype, 'image/png')
+        spool.discard()
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_limits(self):
+        """Test oversized and non-image data is rejected as it is written"""
+        spool = ImageSpool(self.tmp, 100)
+        with self.assertRaises(APIError) as error:
+            spool.write(PNG)
+        self.assertEqual(error.exception.status_code, 413)
+        spool.discard()
+
+        spool = ImageSpool(self.tmp, 1024)
+        with self.assertRaises(APIError) as error:
+            spool.write(b'#!/bin/sh\necho hello\n')
+        self.assertEqual(error.exception.status_code, 422)
+        spool.discard()
+
+    def test_stored_image_path_rejects_traversal(self):
+        """Test only `<sha256>.<ext>` names map to files"""
+        name = 'ab' * 32 + '.png'
+        self.assertEqual(stored_image_path(self.tmp, name), os.path.join(self.tmp, 'ab', name))
+        self.assertIsNone(stored_image_path(self.tmp, '../../etc/passwd'))
+        self.assertIsNone(stored_image_path(self.tmp, 'ab' * 32 + '.html'))
+
+@pytest.mark.usefixtures('app_db')
+class TestMultipartCreate(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+        self.tmp = tempfile.mkdtemp()
+        self.uploads = os.path.join(self.tmp, 'uploads')
+        self.config = mock.patch.dict(app.config, {
+            'RATE_LIMIT_ENABLED': False,
+            'UPLOAD_DIR': self.uploads,
+            'UPLOAD_MAX_IMAGE_SIZE': 64 * 1024,
+            'UPLOAD_MAX_METADATA_SIZE': 1024
+        })
+        self.config.start()
+        self.client = app.test_client()
+        with app.app_context():
+            token = create_access_token(identity=str(ObjectId()))
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def tearDown(self):
+        self.config.stop()
+        shutil.rmtree(self.tmp)
+
+    def _metadata(self, **overrides):
+        metadata = {
+            'title': 'Camera',
+            'description': 'Film camera',
+            'startingPrice': 100,
+            'minimumIncrement': 5,
+            'endTime': (datetime.utcnow() + timedelta(days=2)).isoformat() + 'Z',
+            'category': 1
+        }
+        metadata.update(overrides)
+        return json.dumps(metadata)
+
+    def _post(self, metadata, image=None):
+        data = {'metadata': metadata}
+        if image is not None:
+            data['image'] = (io.BytesIO(image), 'camera.png')
+        return self.client.post('/api/auctions', data=data, content_type='multipart/form-data',
+                                headers=self.headers)
+
+    def _spooled_files(self):
+        return [name for _, _, files in os.walk(self.uploads) for name in files if name.startswith('upload-')]
+
+    def test_create_with_image(self):
+        """Test the image is stored by content hash and served from the auction"""
+        response = self._post(self._metadata(), PNG)
+        self.assertEqual(response.status_code, 201)
+        sha256 = hashlib.sha256(PNG).hexdigest()
+        auction = self.db.auctions.find_one()
+        self.assertEqual(auction['image'], {
+            'name': f'{sha256}.png', 'sha256': sha256, 'mimetype': 'image/png', 'size': len(PNG)
+        })
+        self.assertTrue(auction['image_url'].endswith(f'/api/images/{sha256}.png'))
+        self.assertEqual(self._spooled_files(), [])
+
+        for path in (f'/api/images/{sha256}.png', f"/api/auctions/{auction['_id']}/image"):
+            image = self.client.get(path)
+            self.assertEqual(image.status_code, 200)
+            self.assertEqual(image.data, PNG)
+            self.assertEqual(image.mimetype, 'image/png')
+            self.assertEqual(image.headers['ETag'], f'"{sha256}"')
+            image.close()
+            cached = self.client.get(path, headers={'If-None-Match': f'"{sha256}"'})
+            self.assertEqual(cached.status_code, 304)
+            cached.close()
+
+        listing = self.client.get('/api/auctions').json
+        self.assertEqual(listing[0]['thumbnail_url'], f"/api/auctions/{auction['_id']}/image")
+
+    def test_create_without_image(self):
+        """Test a metadata-only upload creates an auction with no image"""
+        response = self._post(self._metadata())
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(self.db.auctions.find_one()['image_url'])
+
+    def test_rejected_uploads_leave_no_files(self):
+        """Test bad images and bad metadata are refused and their spool files removed"""
+        cases = [
+            (self._metadata(), PNG + b'\x00' * 64 * 1024, 413),
+            (self._metadata(), b'GIF' + b'\x00' * 100, 422),
+            (self._metadata(title=''), PNG, 400),
+            ('{not json', PNG, 400),
+            (self._metadata(description='x' * 2048), PNG, 413),
+            (self._metadata(imageUrl='data:image/png;base64,AAAA'), PNG, 400),
+        ]
+        for metadata, image, status in cases:
+            response = self._post(metadata, image)
+            self.assertEqual(response.status_code, status, response.json)
+        self.assertEqual(self._spooled_files(), [])
+        self.assertEqual(self.db.auctions.count_documents({}), 0)
+
+    def test_idempotent_upload_over_a_socket(self):
+        """Test a keyed multipart upload is answered on a real keep-alive connection"""
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        boundary, body = encode_multipart({
+            'metadata': self._metadata(),
+            'image': FileStorage(io.BytesIO(PNG), 'camera.png')
+        })
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=5)
+        try:
+            for _ in range(2):
+                connection.request('POST', '/api/auctions', body, headers=dict(
+                    self.headers,
+                    **{'Content-Type': f'multipart/form-data; boundary={boundary}', 'Idempotency-Key': 'upload-1'}
+                ))
+                response = connection.getresponse()
+                response.read()
+                self.assertEqual(response.status, 201)
+        finally:
+            connection.close()
+            server.shutdown()
+            thread.join()
+        self.assertEqual(response.getheader('Idempotent-Replayed'), 'true')
+        self.assertEqual(self.db.auctions.count_documents({}), 1)
+
+    def test_json_body_still_accepted(self):
+        """Test clients sending a base64 data URL in JSON keep working"""
+        response = self.client.post('/api/auctions', data=self._metadata(imageUrl='data:image/png;base64,iVBORw0KGgo='),
+                                    content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        auction = self.db.auctions.find_one()
+        image = self.client.get(f"/api/auctions/{auction['_id']}/image")
+        self.assertEqual(image.data, b'\x89PNG\r\n\x1a\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+
+from utils import APIError
+
+# Leading bytes of the image formats we accept, and the extension files are stored with
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'GIF87a', 'image/gif', 'gif'),
+    (b'GIF89a', 'image/gif', 'gif'),
+]
+IMAGE_EXTENSIONS = {'png': 'image/png', 'jpg': 'image/jpeg', 'gif': 'image/gif', 'webp': 'image/webp'}
+SIGNATURE_LENGTH = 12
+
+def detect_image_type(header):
+    """Return (mimetype, extension) for the first bytes of an image, or None"""
+    for signature, mimetype, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mimetype, extension
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    return None
+
+class ImageSpool:
+    """Writable file for one uploaded image part
+
+    Bytes are hashed, size-checked and written to a temporary file in the
+    upload directory as the multipart parser hands them over, so an upload
+    never sits in memory. The format is checked against the first bytes.
+    """
+    def __init__(self, directory, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.mimetype = None
+        self.extension = None
+        self._header = b''
+        self._hash = hashlib.sha256()
+        os.makedirs(directory, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix='upload-', delete=False)
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise APIError(f"Image is too large. Maximum size is {self.max_size // (1024 * 1024)}MB", 413)
+        if self.mimetype is None:
+            self._header += data[:SIGNATURE_LENGTH]
+            if len(self._header) >= SIGNATURE_LENGTH:
+                self._check_format()
+        self._hash.update(data)
+        return self.file.write(data)
+
+    def _check_format(self):
+        detected = detect_image_type(self._header)
+        if detected is None:
+            raise APIError("Image must be a PNG, JPEG, GIF or WebP file", 422)
+        self.mimetype, self.extension = detected
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def finish(self):
+        """Validate what was received once the part is complete"""
+        if self.size == 0:
+            raise APIError("Image is empty", 422)
+        if self.mimetype is None:
+            self._check_format()
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.file.name)
+        except FileNotFoundError:
+            pass
+
+def stored_image_path(directory, name):
+    """Path of a stored image named `<sha256>.<ext>`, or None if the name is invalid"""
+    sha256, _, extension = name.partition('.')
+    if len(sha256) != 64 or extension not in IMAGE_EXTENSIONS or not all(c in '0123456789abcdef' for c in sha256):
+        return None
+    return os.path.join(directory, sha256[:2], name)
+
+def store_image(spool, directory):
+    """Move a finished spool to its content-addressed path; returns the image record"""
+    spool.finish()
+    spool.close()
+    name = f"{spool.sha256}.{spool.extension}"
+    path = stored_image_path(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        spool.discard()  # identical image already stored
+    else:
+        os.replace(spool.file.name, path)
+    return {'name': name, 'sha256': spool.sha256, 'mimetype': spool.mimetype, 'size': spool.size}
+
+def parse_auction_upload(environ, config):
+    """Parse a multipart auction upload: a JSON `metadata` field and an `image` file
+
+    Returns (metadata, spool). The spool is None when no image was sent;
+    otherwise the caller must store or discard it.
+    """
+    spools = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        spool = ImageSpool(config['UPLOAD_DIR'], config['UPLOAD_MAX_IMAGE_SIZE'])
+        spools.append(spool)
+        return spool
+
+    try:
+        _, form, files = parse_form_data(
+            environ,
+            stream_factory=stream_factory,
+            max_form_memory_size=config['UPLOAD_MAX_METADATA_SIZE'],
+            max_content_length=config['MAX_CONTENT_LENGTH'],
+            silent=False
+        )
+        if 'metadata' not in form:
+            raise APIError("Missing metadata part", 400)
+        try:
+            metadata = json.loads(form['metadata'])
+        except ValueError:
+            raise APIError("Metadata must be valid JSON", 400)
+        if not isinstance(metadata, dict):
+            raise APIError("Metadata must be a JSON object", 400)
+        if metadata.get('imageUrl'):
+            raise APIError("Send the image as the 'image' file part, not as imageUrl", 400)
+        if set(files) - {'image'} or len(files.getlist('image')) > 1:
+            raise APIError("Only one 'image' file part is allowed", 400)
+
+        image = files.get('image')
+        spool = image.stream if image is not None else None
+        for other in spools:
+            if other is not spool:
+                other.discard()
+        return metadata, spool
+    except RequestEntityTooLarge:
+        for spool in spools:
+            spool.discard()
+        raise APIError("Request is too large", 413)
+    except BaseException:
+        for spool in spools:
+            spool.discard()
+        raise
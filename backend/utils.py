@@ -1,14 +1,17 @@
+import threading
 from functools import wraps
 from flask import jsonify
 from bson import ObjectId
-from datetime import datetime
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta, timezone
 
 class APIError(Exception):
     """Base class for API errors"""
-    def __init__(self, message, status_code=400):
+    def __init__(self, message, status_code=400, headers=None):
         super().__init__()
         self.message = message
         self.status_code = status_code
+        self.headers = headers
 
     def to_dict(self):
         return {'error': self.message}
@@ -17,36 +20,95 @@ def handle_api_error(error):
     """Error handler for APIError exceptions"""
     response = jsonify(error.to_dict())
     response.status_code = error.status_code
+    if error.headers:
+        response.headers.update(error.headers)
     return response
 
-def serialize_mongo_doc(doc):
-    """Serialize MongoDB document to JSON-compatible format"""
+def utc_now(like=None):
+    """Current UTC time, timezone aware only if `like` is
+
+    MongoDB hands back naive UTC datetimes; comparing them with the host's
+    local time would be off by its UTC offset.
+    """
+    if like is not None and like.tzinfo is not None:
+        return datetime.now(timezone.utc)
+    return datetime.utcnow()
+
+def _serialize_datetime(value, epoch=False):
+    # Naive datetimes from MongoDB are UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    if epoch:
+        return int(value.timestamp() * 1000)
+    return value.isoformat()
+
+def serialize_mongo_doc(doc, epoch=False):
+    """Serialize MongoDB document to JSON-compatible format
+
+    With `epoch=True` datetimes become integer milliseconds since the epoch
+    instead of ISO strings.
+    """
     if isinstance(doc, dict):
         for key, value in doc.items():
             if isinstance(value, ObjectId):
                 doc[key] = str(value)
             elif isinstance(value, datetime):
-                # Ensure datetime is timezone aware before serializing
-                if value.tzinfo is None:
-                    value = value.replace(tzinfo=datetime.now().astimezone().tzinfo)
-                doc[key] = value.isoformat()
+                doc[key] = _serialize_datetime(value, epoch)
             elif isinstance(value, list):
-                doc[key] = [serialize_mongo_doc(item) for item in value]
+                doc[key] = [serialize_mongo_doc(item, epoch) for item in value]
             elif isinstance(value, dict):
-                doc[key] = serialize_mongo_doc(value)
+                doc[key] = serialize_mongo_doc(value, epoch)
         return doc
     elif isinstance(doc, list):
-        return [serialize_mongo_doc(item) for item in doc]
+        return [serialize_mongo_doc(item, epoch) for item in doc]
     elif isinstance(doc, ObjectId):
         return str(doc)
     elif isinstance(doc, datetime):
-        return doc.isoformat()
+        return _serialize_datetime(doc, epoch) if epoch else doc.isoformat()
     return doc
 
-def validate_auction_data(data):
-    """Validate auction creation data"""
-    print("Validating auction data:", {k: v for k, v in data.items() if k != 'imageUrl'})
-    
+def parse_compact_args(args):
+    """Parse the opt-in compact representation: `fields=a,b.c` and `ts=epoch`
+
+    Returns (projection, epoch); projection is None when all fields are wanted.
+    """
+    fields = [field.strip() for field in args.get('fields', '').split(',') if field.strip()]
+    for field in fields:
+        if field.startswith('$'):
+            raise APIError(f"Invalid field: {field}", 422)
+    projection = dict.fromkeys(fields, 1) if fields else None
+    timestamps = args.get('ts', 'iso')
+    if timestamps not in ('iso', 'epoch'):
+        raise APIError("ts must be 'iso' or 'epoch'", 422)
+    return projection, timestamps == 'epoch'
+
+def parse_datetime(value):
+    """Parse an ISO 8601 timestamp, accepting a trailing 'Z' for UTC"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def parse_time_range(args):
+    """Parse optional `since`/`until` query args into naive UTC datetimes"""
+    bounds = []
+    for name in ('since', 'until'):
+        value = args.get(name)
+        if not value:
+            bounds.append(None)
+            continue
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            raise APIError(f"Invalid {name} format", 422)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        bounds.append(parsed)
+    return tuple(bounds)
+
+def parse_auction_data(data):
+    """Validate auction creation data and return the parsed model fields
+
+    Every field is converted exactly once; the result can be passed straight
+    to `Auction(seller_id=..., **fields)`.
+    """
     # Check required fields
     required_fields = ['title', 'description', 'startingPrice', 'minimumIncrement', 'endTime', 'category']
     for field in required_fields:
@@ -58,76 +120,104 @@ def validate_auction_data(data):
     # Validate numeric fields
     try:
         starting_price = float(data['startingPrice'])
-        if starting_price <= 0:
-            raise APIError("Starting price must be greater than 0")
     except (ValueError, TypeError):
         raise APIError("Starting price must be a valid number", 422)
+    if starting_price <= 0:
+        raise APIError("Starting price must be greater than 0")
         
     try:
         minimum_increment = float(data['minimumIncrement'])
-        if minimum_increment <= 0:
-            raise APIError("Minimum increment must be greater than 0")
     except (ValueError, TypeError):
         raise APIError("Minimum increment must be a valid number", 422)
+    if minimum_increment <= 0:
+        raise APIError("Minimum increment must be greater than 0")
 
     # Validate endTime
     try:
         # Parse end time and ensure it's timezone aware
-        end_time = datetime.fromisoformat(data['endTime'].replace('Z', '+00:00'))
-        now = datetime.now(end_time.tzinfo)  # Get current time with same timezone
-        if end_time <= now:
-            raise APIError("End time must be in the future")
-    except ValueError:
+        end_time = parse_datetime(data['endTime'])
+    except (ValueError, TypeError, AttributeError):
         raise APIError("Invalid end time format", 422)
+    if end_time <= utc_now(end_time):
+        raise APIError("End time must be in the future")
     
     # Validate category
     try:
         category = int(data['category'])
-        if category < 1 or category > 4:
-            raise APIError("Invalid category value. Must be between 1 and 4")
     except (ValueError, TypeError):
         raise APIError("Category must be a valid number", 422)
+    if category < 1 or category > 4:
+        raise APIError("Invalid category value. Must be between 1 and 4")
         
     # Validate image if provided
-    if data.get('imageUrl'):
-        if not isinstance(data['imageUrl'], str):
+    image_url = data.get('imageUrl') or None
+    if image_url:
+        if not isinstance(image_url, str):
             raise APIError("Image data must be a string", 422)
         
         # Check if it's a valid base64 image
-        try:
-            if not data['imageUrl'].startswith('data:image/'):
-                raise APIError("Invalid image format. Must be a base64 encoded image", 422)
-                
-            # Get the image size (roughly)
-            # Base64 string length * 0.75 = approximate size in bytes
-            image_size = len(data['imageUrl']) * 0.75
+        if not image_url.startswith('data:image/'):
+            raise APIError("Image validation failed: Invalid image format. Must be a base64 encoded image", 422)
             
-            # Check if image is too large (10MB limit)
-            if image_size > 10 * 1024 * 1024:
-                raise APIError("Image size too large. Maximum size is 10MB", 422)
-                
-        except Exception as e:
-            print(f"Image validation error: {str(e)}")
-            raise APIError(f"Image validation failed: {str(e)}", 422)
+        # Get the image size (roughly)
+        # Base64 string length * 0.75 = approximate size in bytes
+        # Check if image is too large (10MB limit)
+        if len(image_url) * 0.75 > 10 * 1024 * 1024:
+            raise APIError("Image validation failed: Image size too large. Maximum size is 10MB", 422)
+
+    return {
+        'title': data['title'],
+        'description': data['description'],
+        'starting_price': starting_price,
+        'minimum_increment': minimum_increment,
+        'end_time': end_time,
+        'image_url': image_url,
+        'category': category
+    }
+
+def validate_auction_data(data):
+    """Validate auction creation data"""
+    print("Validating auction data:", {k: v for k, v in data.items() if k != 'imageUrl'})
+    return parse_auction_data(data)
 
 def validate_bid_data(data, current_bid):
-    """Validate bid data"""
+    """Validate bid data and return the parsed bid amount"""
     if 'amount' not in data:
         raise APIError("Missing bid amount")
     
     try:
         bid_amount = float(data['amount'])
-        
-        # Validate bid amount is a positive number
-        if bid_amount <= 0:
-            raise APIError("Bid amount must be greater than 0")
-        
-        # Validate bid amount is higher than current bid
-        if current_bid and bid_amount <= current_bid:
-            raise APIError(f"Bid must be higher than current bid (${current_bid})")
-            
     except (ValueError, TypeError):
         raise APIError("Bid amount must be a valid number")
+        
+    # Validate bid amount is a positive number
+    if bid_amount <= 0:
+        raise APIError("Bid amount must be greater than 0")
+    
+    # Validate bid amount is higher than current bid
+    if current_bid and bid_amount <= current_bid:
+        raise APIError(f"Bid must be higher than current bid (${current_bid})")
+
+    return bid_amount
+
+def soft_close_deadline(end_time, bid_time, window, extension):
+    """Return the extended end time for a bid placed at `bid_time`, or None
+
+    A bid within `window` seconds of `end_time` pushes the close out so that at
+    least `extension` seconds remain. Repeated late bids therefore keep the
+    auction open without stacking extensions on top of each other.
+    """
+    if extension <= 0 or end_time - bid_time > timedelta(seconds=window):
+        return None
+    new_end_time = bid_time + timedelta(seconds=extension)
+    return new_end_time if new_end_time > end_time else None
+
+def parse_user_id(user_id):
+    """Parse a user ID from a URL into an ObjectId"""
+    clean_user_id = str(user_id).strip()
+    if not ObjectId.is_valid(clean_user_id):
+        raise APIError(f"Invalid user ID format: {clean_user_id}", 422)
+    return ObjectId(clean_user_id)
 
 def validate_user_data(data):
     """Validate user registration data"""
@@ -165,11 +255,135 @@ def with_database(func):
             return func(database, *args, **kwargs)
     return wrapper
 
+class _Flight:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+_single_flight_groups = {}
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait and get the same result (or exception). Nothing is cached:
+    the next call after it finishes starts a new flight. Callers share the
+    result object, so it must not be mutated.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.executions = 0
+        self.coalesced = 0
+        _single_flight_groups[name] = self
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args, **kwargs)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.event.set()
+
+    def forget(self, key):
+        """Make the next caller for `key` start a new flight, e.g. after a write"""
+        with self._lock:
+            self._flights.pop(key, None)
+
+    def forget_scope(self, scope):
+        """Forget every key of a `coalesced(group, scope=...)` call made for `scope`"""
+        scope = str(scope)
+        with self._lock:
+            for key in [key for key in self._flights if isinstance(key, tuple) and key[0] == scope]:
+                del self._flights[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights)
+            }
+
+def single_flight_stats():
+    """Counters of every SingleFlight group, keyed by group name"""
+    return {name: group.stats() for name, group in _single_flight_groups.items()}
+
+def coalesced(group, scope=None):
+    """Decorator: run concurrent calls with equal arguments once through `group`
+
+    `scope` is the index of a positional argument (e.g. a user id) that keys
+    are grouped by, so `group.forget_scope(value)` drops every variant of the
+    call made for that value.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = repr((args, sorted(kwargs.items())))
+            if scope is not None:
+                key = (str(args[scope]).strip(), key)
+            return group.do(key, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+user_auctions_flight = SingleFlight('user_auctions')
+user_bids_flight = SingleFlight('user_bids')
+
+_ensured_indexes = set()
+
+def ensure_index(collection, keys, **kwargs):
+    """Create an index the first time it is needed by this process
+
+    Indexes are created lazily rather than at import time so the app can
+    start (and tests can import it) without a reachable database.
+    """
+    marker = (id(collection.database.client), collection.full_name, repr(keys), repr(sorted(kwargs.items())))
+    if marker not in _ensured_indexes:
+        collection.create_index(keys, **kwargs)
+        _ensured_indexes.add(marker)
+
+def forget_indexes(db):
+    """Make ensure_index create `db`'s indexes again, e.g. after its collections were dropped"""
+    prefix = f"{db.name}."
+    for marker in [m for m in _ensured_indexes if m[0] == id(db.client) and m[1].startswith(prefix)]:
+        _ensured_indexes.discard(marker)
+
 @with_database
 def find_user_by_email(db, email):
     """Find user by email"""
     return db.users.find_one({'email': email})
 
+@with_database
+def is_admin(db, user_id):
+    """Check whether a user may use the operator endpoints (role 'admin')"""
+    if not ObjectId.is_valid(str(user_id)):
+        return False
+    return db.users.find_one({'_id': ObjectId(str(user_id)), 'role': 'admin'}, {'_id': 1}) is not None
+
 @with_database
 def find_auction_by_id(db, auction_id):
     """Find auction by ID"""
@@ -178,30 +392,66 @@ def find_auction_by_id(db, auction_id):
     except:
         raise APIError("Invalid auction ID", 404)
 
+@coalesced(user_auctions_flight, scope=1)
 @with_database
-def get_user_auctions(db, user_id):
-    """Get all auctions for a user"""
+def get_user_auctions(db, user_id, projection=None, epoch=False):
+    """Get the listing summaries of all auctions for a user"""
     try:
         # Clean and validate the user ID format
         try:
             clean_user_id = str(user_id).strip()
             object_id = ObjectId(clean_user_id)
-            auctions = list(db.auctions.find({'seller_id': object_id}))
+            auctions = list(db.auction_summaries.find({'seller_id': object_id}, projection).sort('_id', 1))
         except Exception as e:
             raise APIError(f"Invalid user ID format: {clean_user_id}", 422)
-        return [serialize_mongo_doc(auction) for auction in auctions]
+        return [serialize_mongo_doc(auction, epoch) for auction in auctions]
     except APIError as e:
         raise e
     except Exception as e:
         raise APIError(f"Error retrieving user auctions: {str(e)}", 500)
 
+@coalesced(user_bids_flight, scope=1)
 @with_database
-def get_user_bids(db, user_id):
+def get_user_bids(db, user_id, projection=None, epoch=False):
     """Get all bids for a user"""
     try:
-        auctions = list(db.auctions.find({
+        collection = db.auctions
+        ensure_index(collection, 'bids.user_id')
+        auctions = list(collection.find({
             'bids.user_id': ObjectId(user_id)
-        }))
-        return [serialize_mongo_doc(auction) for auction in auctions]
+        }, projection))
+        return [serialize_mongo_doc(auction, epoch) for auction in auctions]
     except:
-        raise APIError("Error retrieving user bids", 500)
\ No newline at end of file
+        raise APIError("Error retrieving user bids", 500)
+
+def watchlist_collection(db):
+    """The watchlists collection, with its indexes ensured"""
+    collection = db.watchlists
+    ensure_index(collection, [('user_id', 1), ('auction_id', 1)], unique=True)
+    ensure_index(collection, 'auction_id')
+    return collection
+
+@with_database
+def add_to_watchlist(db, user_id, auction_id):
+    """Watch an auction; returns False if the user already watches it"""
+    try:
+        result = watchlist_collection(db).update_one(
+            {'user_id': user_id, 'auction_id': auction_id},
+            {'$setOnInsert': {'created_at': datetime.utcnow()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False  # a concurrent request inserted it first
+    return result.upserted_id is not None
+
+@with_database
+def remove_from_watchlist(db, user_id, auction_id):
+    """Stop watching an auction; returns False if the user was not watching it"""
+    return watchlist_collection(db).delete_one({'user_id': user_id, 'auction_id': auction_id}).deleted_count > 0
+
+@with_database
+def get_user_watchlist(db, user_id, projection=None, epoch=False):
+    """Get the listing summaries of the auctions a user watches"""
+    auction_ids = [entry['auction_id'] for entry in watchlist_collection(db).find({'user_id': user_id}, {'auction_id': 1})]
+    auctions = list(db.auction_summaries.find({'_id': {'$in': auction_ids}}, projection).sort('_id', 1))
+    return [serialize_mongo_doc(auction, epoch) for auction in auctions]
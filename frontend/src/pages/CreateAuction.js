@@ -234,13 +234,22 @@ const CreateAuction = () => {
         });
       }
 
+      // Send the fields as a small JSON part and the image as a file part,
+      // so the server can stream the image to disk instead of parsing base64
+      const { imageUrl, ...metadata } = auctionData;
+      const body = new FormData();
+      body.append('metadata', JSON.stringify(metadata));
+      if (imageUrl) {
+        const image = await (await fetch(imageUrl)).blob();
+        body.append('image', image, 'image');
+      }
+
       const response = await axios.post(
         'http://localhost:5000/api/auctions',
-        auctionData,
+        body,
         {
           headers: {
-            'Authorization': `Bearer ${token}`,
-            'Content-Type': 'application/json'
+            'Authorization': `Bearer ${token}`
           },
           maxContentLength: 10 * 1024 * 1024, // 10MB max
           maxBodyLength: 10 * 1024 * 1024
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { useAuth } from '../contexts/AuthContext';
 import {
@@ -35,6 +35,7 @@ const Home = () => {
   const [selectedCategory, setSelectedCategory] = useState(0);
   const [loading, setLoading] = useState(true);
   const [auctions, setAuctions] = useState([]);
+  const syncCursor = useRef(null);
 
   useEffect(() => {
     fetchAuctions();
@@ -46,15 +47,25 @@ const Home = () => {
   const fetchAuctions = async () => {
     try {
       setLoading(true);
+      // The first request (since=0) returns everything; later polls only
+      // return auctions that changed, ended or were deleted since the cursor
       const response = await axios.get(
         'http://localhost:5000/api/auctions',
         {
+          params: { since: syncCursor.current || 0 },
           headers: token ? {
             'Authorization': `Bearer ${token}`
           } : {}
         }
       );
-      setAuctions(response.data);
+      const { changes, deleted, reset, cursor } = response.data;
+      syncCursor.current = cursor;
+      setAuctions(previous => {
+        const byId = new Map(reset ? [] : previous.map(auction => [auction._id, auction]));
+        changes.forEach(auction => byId.set(auction._id, auction));
+        deleted.forEach(id => byId.delete(id));
+        return Array.from(byId.values());
+      });
     } catch (err) {
       console.error('Failed to fetch auctions:', err);
     } finally {
@@ -100,8 +111,7 @@ const Home = () => {
   };
 
   const filteredAuctions = auctions.filter(auction => {
-    const matchesSearch = auction.title.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      auction.description.toLowerCase().includes(searchQuery.toLowerCase());
+    const matchesSearch = auction.title.toLowerCase().includes(searchQuery.toLowerCase());
     
     const matchesCategory = selectedCategory === 0 || auction.category === selectedCategory;
     
@@ -295,7 +305,7 @@ const Home = () => {
                   <CardMedia
                     component="img"
                     height="240"
-                    image={auction.image_url || 'https://via.placeholder.com/400x300'}
+                    image={auction.thumbnail_url ? `http://localhost:5000${auction.thumbnail_url}` : 'https://via.placeholder.com/400x300'}
                     alt={auction.title}
                     className="auction-image"
                     sx={{
@@ -344,7 +354,7 @@ const Home = () => {
                       minHeight: 40,
                     }}
                   >
-                    {auction.description}
+                    {`${auction.bid_count} bid${auction.bid_count !== 1 ? 's' : ''}`}
                   </Typography>
                   <Box sx={{
                     display: 'flex',
@@ -85,13 +85,13 @@ const MyAuctions = () => {
           title: auction.title,
           endTime: endTime.toISOString(),
           now: now.toISOString(),
-          hasBids: auction.bids && auction.bids.length > 0,
+          hasBids: auction.bid_count > 0,
           isEnded: endTime < now
         });
         
         if (endTime < now) {
           acc.completed.push(auction);
-        } else if (auction.bids && auction.bids.length > 0) {
+        } else if (auction.bid_count > 0) {
           acc.active.push(auction);
         } else {
           acc.pending.push(auction);
@@ -208,15 +208,15 @@ const MyAuctions = () => {
   const defaultPlaceholderImage = 'data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iNDAwIiBoZWlnaHQ9IjMwMCIgeG1sbnM9Imh0dHA6Ly93d3cudzMub3JnLzIwMDAvc3ZnIj4KPHJlY3Qgd2lkdGg9IjQwMCIgaGVpZ2h0PSIzMDAiIGZpbGw9IiNmMGYwZjAiLz4KPHRleHQgeD0iNTAlIiB5PSI1MCUiIGZvbnQtZmFtaWx5PSJBcmlhbCIgZm9udC1zaXplPSIyNCIgZmlsbD0iIzY2NiIgdGV4dC1hbmNob3I9Im1pZGRsZSIgZHk9Ii4zZW0iPk5vIEltYWdlIEF2YWlsYWJsZTwvdGV4dD4KPC9zdmc+';
 
   const renderAuctionCard = (auction) => {
-    const bidsCount = auction.bids?.length || 0;
+    const bidsCount = auction.bid_count || 0;
     const currentBid = auction.current_bid || auction.starting_price;
-    const imageUrl = auction.image_url || defaultPlaceholderImage;
+    const imageUrl = auction.thumbnail_url ? `http://localhost:5000${auction.thumbnail_url}` : defaultPlaceholderImage;
 
     // Debug logging for image URL
     console.log('Auction image URL:', {
       auctionId: auction._id,
       title: auction.title,
-      imageUrl: auction.image_url ? 'Present' : 'Using placeholder'
+      imageUrl: auction.thumbnail_url ? 'Present' : 'Using placeholder'
     });
 
     return (
@@ -252,7 +252,7 @@ const MyAuctions = () => {
             </Box>
             
             <Box sx={{ mt: 2 }}>
-              {auction.bids && auction.bids.length > 0 && (
+              {bidsCount > 0 && (
                 <>
                   <Typography variant="h6" color="primary">
                     ${currentBid}
@@ -286,7 +286,7 @@ const MyAuctions = () => {
                 </>
               )}
               
-              {!auction.bids?.length && new Date(auction.end_time) > new Date() && (
+              {!bidsCount && new Date(auction.end_time) > new Date() && (
                 <>
                   <Typography variant="body2" color="text.secondary">
                     Starting price: ${auction.starting_price}